@@ -1,118 +1,27 @@
 # add_chapter_like.py
 # pip install python-docx
 
-from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from docx import Document
 from docx.text.paragraph import Paragraph
 from docx.enum.section import WD_SECTION_START
 from docx.oxml import OxmlElement
+from outline import Node, BlockIndex, build_outline, iter_nodes
+from docxzip import open_docx, save_docx
+from textnorm import normalize_text, normalize_cached
 import json
 import re
-import unicodedata
 import argparse
 
-# ----------------- Model -----------------
-
-@dataclass
-class Node:
-    title: str
-    level: int
-    start_idx: int
-    content_idxs: List[int] = field(default_factory=list)
-    children: List["Node"] = field(default_factory=list)
-
-# ----------------- Detectors & Normalizers -----------------
-
-def _heading_level(p: Paragraph) -> Optional[int]:
-    name = (p.style.name or "").lower()
-    m = re.search(r'(heading|überschrift)\s*(\d+)$', name)
-    if m:
-        return int(m.group(2))
-    pPr = p._p.pPr
-    if pPr is not None and pPr.outlineLvl is not None:
-        return int(pPr.outlineLvl.val) + 1
-    return None
-
-def has_sectPr(paragraph: Paragraph) -> bool:
-    pPr = paragraph._p.pPr
-    return (pPr is not None) and (pPr.sectPr is not None)
-
-FM_TITLES = {"فهرست مطالب","فهرست جداول","فهرست اشکال","فهرست شکل‌ها",
-             "Table of Contents","List of Tables","List of Figures"}
-
-def normalize(s: str) -> str:
-    if s is None:
-        return ""
-    s = s.replace("\\n", " ")  # literal \n -> space
-    s = unicodedata.normalize("NFKC", s)
-    s = s.translate(str.maketrans({"ي": "ی", "ك": "ک", "ۀ": "ه", "أ": "ا", "إ": "ا", "ٱ": "ا"}))
-    s = s.replace("\u200c", "").replace("\u200f", "").replace("\u200e", "")
-    s = re.sub(r"\s+", " ", s.strip())
-    return s.casefold()
-
-def is_front_matter_title(p: Paragraph) -> bool:
-    t = normalize(p.text)
-    if t in {x.casefold() for x in FM_TITLES}:
-        return True
-    s = (p.style.name or "").lower()
-    if any(k in s for k in ["toc heading","table of contents","list of tables","list of figures"]):
-        return True
-    return False
-
-# ----------------- Tree (section-aware & TOC/LOF/LOT-aware) -----------------
-
-def build_tree(doc: Document) -> List[Node]:
-    roots: List[Node] = []
-    stack: List[Node] = []
-
-    def start_root_node(title: str, idx: int):
-        n = Node(title=title, level=1, start_idx=idx)
-        roots.append(n)
-        stack.clear()
-        stack.append(n)
-
-    for idx, p in enumerate(doc.paragraphs):
-        # Treat TOC/LOF/LOT titles as their own top-level nodes
-        if is_front_matter_title(p):
-            start_root_node(p.text.strip(), idx)
-            continue
-
-        lvl = _heading_level(p)
-        if lvl is not None:
-            node = Node(title=p.text.strip(), level=lvl, start_idx=idx)
-            while stack and stack[-1].level >= lvl:
-                stack.pop()
-            if stack:
-                stack[-1].children.append(node)
-            else:
-                roots.append(node)
-            stack.append(node)
-        else:
-            if stack:
-                stack[-1].content_idxs.append(idx)
-                # stop capturing at section end to avoid spillover
-                if has_sectPr(p):
-                    stack.clear()
-    return roots
-
-def iter_nodes(nodes: List[Node]) -> List[Node]:
-    out = []
-    def walk(n: Node):
-        out.append(n)
-        for c in n.children:
-            walk(c)
-    for r in nodes:
-        walk(r)
-    return out
+import profiling
 
 def find_chapter(tree: List[Node], title: str) -> Optional[Node]:
-    want = normalize(title)
+    want = normalize_text(title)
     cands = [n for n in iter_nodes(tree) if n.level == 1]
-    exact = [n for n in cands if normalize(n.title) == want]
+    exact = [n for n in cands if normalize_cached(n.title) == want]
     if exact:
         return exact[0]
-    partial = [n for n in cands if want and want in normalize(n.title)]
+    partial = [n for n in cands if want and want in normalize_cached(n.title)]
     if len(partial) == 1:
         return partial[0]
     return None
@@ -143,53 +52,55 @@ def add_body_block(doc: Document, text: str, style=None):
                 pass
         p.add_run(blk)
 
-def infer_node_body_style(doc: Document, node: Node):
+def infer_node_body_style(index: BlockIndex, node: Node):
     for i in node.content_idxs:
-        if 0 <= i < len(doc.paragraphs):
-            p = doc.paragraphs[i]
-            if _heading_level(p) is None and p.text.strip():
+        p = index.paragraph(i)
+        if p is not None:
+            if index.level(p._p) is None and p.text.strip():
                 try:
                     return p.style
                 except Exception:
                     pass
     try:
-        return doc.styles["Normal"]
+        return index.doc.styles["Normal"]
     except Exception:
         return None
 
 # ----------------- JSON skeleton (for export mode) -----------------
 
-def collapse_content(doc: Document, par_idxs: List[int]) -> str:
+def collapse_content(index: BlockIndex, par_idxs: List[int]) -> str:
     """Join the node's body paragraphs into a single string with blank-line separators."""
     parts = []
     for i in par_idxs:
-        if 0 <= i < len(doc.paragraphs):
-            txt = doc.paragraphs[i].text
+        elm = index.element(i)
+        if elm is not None:
+            txt = elm.text
             if txt.strip():
                 parts.append(txt)
     return "\n\n".join(parts)
 
-def node_to_json(doc: Document, node: Node, blank_content: bool = False) -> Dict[str, Any]:
-    d: Dict[str, Any] = {"__content__": "" if blank_content else collapse_content(doc, node.content_idxs)}
+def node_to_json(index: BlockIndex, node: Node, blank_content: bool = False) -> Dict[str, Any]:
+    d: Dict[str, Any] = {"__content__": "" if blank_content else collapse_content(index, node.content_idxs)}
     for c in node.children:
-        d[c.title] = node_to_json(doc, c, blank_content=blank_content)
+        d[c.title] = node_to_json(index, c, blank_content=blank_content)
     return d
 
-def export_chapter_skeleton(doc: Document, chapter_node: Node, output_json_path: str, blank_content: bool):
-    data = {chapter_node.title: node_to_json(doc, chapter_node, blank_content=blank_content)}
+def export_chapter_skeleton(index: BlockIndex, chapter_node: Node, output_json_path: str, blank_content: bool):
+    data = {chapter_node.title: node_to_json(index, chapter_node, blank_content=blank_content)}
     with open(output_json_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 # ----------------- Add a new chapter (existing behavior) -----------------
 
 def create_chapter_from_template(
-    doc: Document,
+    index: BlockIndex,
     template_node: Node,
     new_title: str,
     content_spec: Dict[str, Any] = None,
     insert_mode: str = "pagebreak"
 ):
     content_spec = content_spec or {}
+    doc = index.doc
 
     # 1) Page/Section handling (keep headers/footers identical)
     if insert_mode == "section":
@@ -203,7 +114,7 @@ def create_chapter_from_template(
         doc.add_page_break()
 
     # 2) Chapter heading uses EXACT style of the template chapter heading
-    template_heading_style = doc.paragraphs[template_node.start_idx].style
+    template_heading_style = index.heading(template_node).style
     h1 = doc.add_paragraph()
     try:
         h1.style = template_heading_style
@@ -212,7 +123,7 @@ def create_chapter_from_template(
     h1.add_run(new_title)
 
     # 3) Body style under chapter inherits from template chapter's body
-    chapter_body_style = infer_node_body_style(doc, template_node)
+    chapter_body_style = infer_node_body_style(index, template_node)
     if isinstance(content_spec.get("__content__"), str):
         add_body_block(doc, content_spec["__content__"], style=chapter_body_style)
 
@@ -222,11 +133,11 @@ def create_chapter_from_template(
         for k, v in spec.items():
             if k == "__content__":
                 continue
-            provided[normalize(k)] = {"__content__": v} if isinstance(v, str) else v
+            provided[normalize_text(k)] = {"__content__": v} if isinstance(v, str) else v
 
         for child in template_children:
-            c_spec = provided.get(normalize(child.title), {})
-            child_heading_style = doc.paragraphs[child.start_idx].style
+            c_spec = provided.get(normalize_cached(child.title), {})
+            child_heading_style = index.heading(child).style
             new_child_title = c_spec.get("__title__", child.title)
 
             h = doc.add_paragraph()
@@ -236,7 +147,7 @@ def create_chapter_from_template(
                 pass
             h.add_run(new_child_title)
 
-            child_body_style = infer_node_body_style(doc, child)
+            child_body_style = infer_node_body_style(index, child)
             if isinstance(c_spec.get("__content__"), str):
                 add_body_block(doc, c_spec["__content__"], style=child_body_style)
 
@@ -272,10 +183,16 @@ def main():
     ap.add_argument("--template-index", type=int, default=None,
                     help="Pick the template chapter by index from --list-chapters")
 
+    profiling.add_arguments(ap)
     args = ap.parse_args()
-
-    doc = Document(args.input_docx)
-    tree = build_tree(doc)
+    profiling.configure_from_args(args)
+
+    with profiling.span("add_chapter_like.open"):
+        doc = open_docx(args.input_docx)
+    with profiling.span("add_chapter_like.outline"):
+        outline = build_outline(doc)
+        tree = outline.roots
+        index = BlockIndex(doc, outline)
     h1_nodes = [n for n in tree if n.level == 1]
 
     if args.list_chapters:
@@ -299,7 +216,8 @@ def main():
 
     # ------- Export skeleton mode -------
     if args.export_skeleton:
-        export_chapter_skeleton(doc, template, args.export_skeleton, blank_content=args.blank_content)
+        with profiling.span("add_chapter_like.export_skeleton"):
+            export_chapter_skeleton(index, template, args.export_skeleton, blank_content=args.blank_content)
         print(f"Wrote skeleton for '{template.title}' -> {args.export_skeleton}")
         return
 
@@ -312,14 +230,15 @@ def main():
         with open(args.json, "r", encoding="utf-8") as f:
             content_spec = json.load(f)
 
-    create_chapter_from_template(
-        doc,
-        template_node=template,
-        new_title=args.new_chapter_title,
-        content_spec=content_spec,
-        insert_mode=args.insert_mode,
-    )
-    doc.save(args.output_docx)
+    with profiling.span("add_chapter_like.add_chapter", doc=doc):
+        create_chapter_from_template(
+            index,
+            template_node=template,
+            new_title=args.new_chapter_title,
+            content_spec=content_spec,
+            insert_mode=args.insert_mode,
+        )
+    save_docx(doc, args.output_docx)
     print(f"Added '{args.new_chapter_title}' based on '{template.title}'. Saved: {args.output_docx}")
 
 if __name__ == "__main__":
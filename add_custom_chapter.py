@@ -1,11 +1,14 @@
 # add_custom_chapter_strict.py
 # pip install python-docx
 
-from docx import Document
 from docx.enum.section import WD_SECTION_START
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
+import ir
+import outline
+from template_cache import load_template
+from docxzip import open_docx, save_docx
 import argparse, json, re
 
 def add_field(paragraph, instr: str):
@@ -60,29 +63,14 @@ def add_paragraph(doc, text, style=None):
 
 
 
-def _heading_level(p):
-    name = (p.style.name or "").lower()
-    m = re.search(r'(heading|überschrift|عنوان)\s*(\d+)$', name)
-    if m: return int(m.group(2))
-    return None
-
 def build_tree(doc):
-    roots, stack = [], []
-    for idx, p in enumerate(doc.paragraphs):
-        lvl = _heading_level(p)
-        if lvl:
-            n = {"title": p.text.strip(), "level": lvl, "idx": idx, "children": []}
-            while stack and stack[-1]["level"] >= lvl: stack.pop()
-            if stack: stack[-1]["children"].append(n)
-            else: roots.append(n)
-            stack.append(n)
-    return roots
+    return outline.build_tree(doc, front_matter=False, section_aware=False)
 
 def find_chapter_by_title(doc, title: str):
     tree = build_tree(doc)
     want = re.sub(r"\s+", " ", (title or "").strip()).casefold()
     for n in tree:
-        if n["level"] == 1 and re.sub(r"\s+", " ", n["title"]).casefold() == want:
+        if n.level == 1 and re.sub(r"\s+", " ", n.title).casefold() == want:
             return n
     return None
 
@@ -115,15 +103,12 @@ def get_heading_styles(doc, template_node):
     visited_levels = set()
     while queue:
         node = queue.pop(0)
-        lvl = node.get("level")
+        lvl = node.level
         if lvl and lvl not in visited_levels:
-            try:
-                hstyles[lvl] = doc.paragraphs[node["idx"]].style
-                visited_levels.add(lvl)
-            except IndexError: pass
-        
-        if "children" in node:
-            queue.extend(node["children"])
+            hstyles[lvl] = outline.heading_paragraph(doc, node).style
+            visited_levels.add(lvl)
+
+        queue.extend(node.children)
 
     # For any levels not found in the template, fall back to default names
     for lvl in range(1, 7):
@@ -171,20 +156,18 @@ def set_header_footer(sec, header_data, footer_data):
                            "right": WD_ALIGN_PARAGRAPH.RIGHT}.get(page_align, WD_ALIGN_PARAGRAPH.CENTER)
             set_paragraph_rtl(f)
 
-def ensure_paras(x):
-    if x is None: return []
-    if isinstance(x, str): return [x.strip()]
-    if isinstance(x, list): return [str(t).strip() for t in x if str(t).strip()]
-    return []
+ensure_paras = ir.paragraph_texts
+
+def emit_blocks(doc, blocks, hstyles, body_style):
+    """IR blocks -> add_paragraph: headings by level from hstyles, everything else in body_style."""
+    for b in blocks:
+        if type(b) is ir.Heading:
+            add_paragraph(doc, b.text, style=hstyles.get(b.level))
+        else:
+            add_paragraph(doc, b.text, style=body_style)
 
 def add_sections(doc, sections, hstyles, body_style):
-    for s in sections:
-        lvl = int(s.get("level", 2))
-        title = s.get("title", "")
-        content = ensure_paras(s.get("content"))
-        add_paragraph(doc, title, style=hstyles.get(lvl))
-        for para in content: add_paragraph(doc, para, style=body_style)
-        add_sections(doc, s.get("sections", []), hstyles, body_style)
+    emit_blocks(doc, ir.lower_custom_sections(sections), hstyles, body_style)
 
 def build_from_json(doc, data, template_doc, template_node=None, debug=False):
     meta, header, footer, chapter = data["meta"], data["header"], data["footer"], data["chapter"]
@@ -198,14 +181,8 @@ def build_from_json(doc, data, template_doc, template_node=None, debug=False):
     hstyles = get_heading_styles(template_doc, template_node)
     body_style = infer_body_style(doc)
 
-    # H1
-    add_paragraph(doc, chapter["title"], style=hstyles[1])
     if debug: print(f"[ADD] H1: {chapter['title']}")
-
-    for para in ensure_paras(chapter.get("intro")):
-        add_paragraph(doc, para, style=body_style)
-
-    add_sections(doc, chapter.get("sections", []), hstyles, body_style)
+    emit_blocks(doc, ir.lower_custom_chapter(chapter), hstyles, body_style)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -216,7 +193,7 @@ def main():
     ap.add_argument("--debug", action="store_true")
     args = ap.parse_args()
 
-    doc = Document(args.input_docx)
+    doc = open_docx(args.input_docx)
     with open(args.chapter_json, "r", encoding="utf-8") as f:
         data = json.load(f)
 
@@ -227,7 +204,7 @@ def main():
     if "template_document" in data.get("meta", {}):
         template_path = data["meta"]["template_document"]
         try:
-            template_doc = Document(template_path)
+            template_doc = load_template(template_path)   # read-only style source
             if args.inherit_from_title:
                 template_node = find_chapter_by_title(template_doc, args.inherit_from_title)
         except Exception as e:
@@ -236,7 +213,7 @@ def main():
         template_node = find_chapter_by_title(doc, args.inherit_from_title)
 
     build_from_json(doc, data, template_doc, template_node, debug=args.debug)
-    doc.save(args.output_docx)
+    save_docx(doc, args.output_docx)
     print(f"Saved: {args.output_docx}")
 
 if __name__ == "__main__":
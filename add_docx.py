@@ -1,16 +1,52 @@
-from docx import Document
 import json
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 from docx.shared import Pt
-
-
-with open("content/01-chapter-01.json", "r", encoding="utf-8") as f:
-      data = json.load(f)
+from docxzip import open_docx, save_docx
+import profiling
+import images
+import content_spec
+import ir
+import json_stream
+import os
+
+profiling.configure_from_env()   # DOCX_PROFILE=- or DOCX_PROFILE=trace.json
+image_pipeline = images.ImagePipeline(images.settings_from_env())   # DOCX_IMAGE_DPI, DOCX_IMAGE_CACHE
+
+
+# DOCX_STREAM=1: read the chapter JSON as its blocks are emitted instead of loading it
+# whole (CMS exports with embedded figures); the chapter is then checked block by block
+STREAM = os.environ.get("DOCX_STREAM") == "1"
+
+if STREAM:
+    chapter_file = open("content/01-chapter-01.json", "r", encoding="utf-8")
+    data, chapter_blocks = json_stream.stream_add_docx(chapter_file)   # data: the keys before "chapter"
+else:
+    with open("content/01-chapter-01.json", "r", encoding="utf-8") as f:
+          data = json.load(f)
 with open("content/00-frontmatter.json", "r", encoding="utf-8") as f:
     front_json = json.load(f)
 
-doc = Document("template/blank-template.docx")
+# reject bad content (structure, unknown styles) before the template is loaded
+try:
+    template_styles = content_spec.template_styles("template/blank-template.docx")
+    content_spec.require_valid(data, "content/01-chapter-01.json",
+                               content_spec.CHECK_CHAPTER_HEAD if STREAM else content_spec.CHECK_CHAPTER, template_styles)
+    content_spec.require_valid(front_json, "content/00-frontmatter.json", content_spec.CHECK_FRONT_MATTER)
+except content_spec.SpecError as e:
+    raise SystemExit(f"add_docx: {e}")
+
+if not STREAM:
+    chapter_blocks = ir.lower_add_docx(data)
+
+with profiling.span("add_docx.template"):
+    doc = open_docx("template/blank-template.docx")     # opened once per run: no cache or clone
+
+# read/resize every image in the background while the XML below is built
+if STREAM:
+    chapter_blocks = ir.prefetch_ahead(chapter_blocks, image_pipeline.prefetch)
+else:
+    image_pipeline.prefetch(ir.images(chapter_blocks))
 
 #helper
 def add_bottom_border(paragraph):
@@ -63,128 +99,88 @@ def set_page_number_format(section, fmt="decimal", start=None):
 
 # front page replacement
 front = front_json["frontMatter"]
-for p in doc.paragraphs:
-        for key, value in front.items():
-            placeholder = f"{{{{{key}}}}}"   # makes {{key}}
-            if placeholder in p.text:
-                # replace text for the whole paragraph
-                p.text = p.text.replace(placeholder, value)
+with profiling.span("add_docx.front_page"):
+    for p in doc.paragraphs:
+            for key, value in front.items():
+                placeholder = f"{{{{{key}}}}}"   # makes {{key}}
+                if placeholder in p.text:
+                    # replace text for the whole paragraph
+                    p.text = p.text.replace(placeholder, value)
 
 
 # section 1
-section_1  = doc.add_section()
-section_1.header.is_linked_to_previous = False
-section_1.footer.is_linked_to_previous = False
+with profiling.span("add_docx.section_1", doc=doc):
+    section_1  = doc.add_section()
+    section_1.header.is_linked_to_previous = False
+    section_1.footer.is_linked_to_previous = False
+
+
+    # remove borders for this section
+    sectPr = section_1._sectPr
+    pgBorders = sectPr.find(qn('w:pgBorders'))
+    if pgBorders is not None:
+        sectPr.remove(pgBorders)
+
+    # header
+    header_1_text = section_1.header.add_paragraph(
+          data["header"]["text"],
+          style=doc.styles[data["header"]["style"]]
+    )
+    add_bottom_border(header_1_text)
+    header_1_text.paragraph_format.space_after = Pt(12)  #one line break at the bottom of the header 
 
+    # footer
+    footer_section_1 = section_1.footer
+    p = footer_section_1.paragraphs[0]
+    p.add_run()
+    add_page_number(p)
+    set_page_number_format(section_1, fmt="decimal", start=1)
 
-# remove borders for this section
-sectPr = section_1._sectPr
-pgBorders = sectPr.find(qn('w:pgBorders'))
-if pgBorders is not None:
-    sectPr.remove(pgBorders)
 
-# header
-header_1_text = section_1.header.add_paragraph(
-      data["header"]["text"],
-      style=doc.styles[data["header"]["style"]]
-)
-add_bottom_border(header_1_text)
-header_1_text.paragraph_format.space_after = Pt(12)  #one line break at the bottom of the header 
+# intro
+with profiling.span("add_docx.chapter_content", doc=doc):
+    styles = {}   # style name -> style object: one doc.styles lookup per distinct style
+    def style_of(name):
+        st = styles.get(name)
+        if st is None:
+            if name not in template_styles:
+                raise SystemExit(f"add_docx: style {name!r} is not in the template")
+            st = styles[name] = doc.styles[name]
+        return st
+
+    for block in chapter_blocks:
+        if type(block) is ir.Image:
+            p = doc.add_paragraph(style=block.style and style_of(block.style))
+            run = p.add_run()
+            with profiling.span("add_docx.image", image=block.path if isinstance(block.path, str) else "<embedded>"):
+                image_pipeline.add_picture(run, block.path)
+            profiling.count("images")
+        else:
+            doc.add_paragraph(block.text, style=style_of(block.style))
+if STREAM:
+    chapter_file.close()
+image_pipeline.close()     # every figure is in; stop the prefetch threads
 
-# footer
-footer_section_1 = section_1.footer
-p = footer_section_1.paragraphs[0]
-p.add_run()
-add_page_number(p)
-set_page_number_format(section_1, fmt="decimal", start=1)
+# section 2
+with profiling.span("add_docx.section_2", doc=doc):
+    section_2 = doc.add_section()
 
+    section_2.header.is_linked_to_previous = False
+    section_2.footer.is_linked_to_previous = False
 
-# intro
-doc.add_paragraph(
-      data["chapter"]["title"],
-      style=doc.styles[data["chapter"]["style"]]
-)
-for para in data["chapter"]["intro"]:
-    doc.add_paragraph(
-        para["text"],
-        style=doc.styles[para["style"]]
+    header_2_text = section_2.header.add_paragraph(
+          text="1",
+          style=doc.styles[data["header"]["style"]]
     )
-
-#sections for chapter 1
-for section in data["chapter"]["sections"]:
-      doc.add_paragraph(
-            section["title"],
-            style=doc.styles[section["style"]]
-      )
-      #contents of section
-          # Section content
-      for block in section.get("content", []):
-        # Normal paragraph
-        if "text" in block:
-            doc.add_paragraph(
-                block["text"],
-                style=doc.styles[block.get("style")]
-            )
-
-        # List of items
-        if "list" in block:
-            for item in block["list"]:
-                p = doc.add_paragraph(
-                    item["text"],
-                    style=doc.styles[item.get("style")]
-                )
-        if "upload" in block:
-            for upload_item in block["upload"]:
-                if "image" in upload_item:
-                    p = doc.add_paragraph(style=upload_item.get("style"))
-                    run = p.add_run()
-                    run.add_picture(upload_item["image"])
-
-                if "text" in upload_item:
-                    p = doc.add_paragraph(upload_item["text"], style=doc.styles[upload_item.get("style")])
-
-      # --- SUB-SECTIONS ---
-      for sub in section.get("sub_sections", []):
-        # Subsection title
-        doc.add_paragraph(
-            sub["title"],
-            style=doc.styles[sub.get("style")]
-        )
-        # Subsection content
-        for block in sub.get("content", []):
-            if "text" in block:
-                  doc.add_paragraph(
-                  block["text"],
-                  style=doc.styles[block.get("style")]
-                  )
-
-        # List of items
-            elif "list" in block:
-                  for item in block["list"]:
-                        p = doc.add_paragraph(
-                              item["text"],
-                              style=doc.styles[item.get("style")]
-                        )
-
-# section 2
-section_2 = doc.add_section()
-
-section_2.header.is_linked_to_previous = False
-section_2.footer.is_linked_to_previous = False
-
-header_2_text = section_2.header.add_paragraph(
-      text="1",
-      style=doc.styles[data["header"]["style"]]
-)
-add_bottom_border(header_2_text)
-header_2_text.paragraph_format.space_after = Pt(12)
-
-# footer
-footer_section_2 = section_2.footer
-p = footer_section_2.paragraphs[0]
-p.add_run()
-add_page_number(p)
-set_page_number_format(section_2, fmt="decimal")
+    add_bottom_border(header_2_text)
+    header_2_text.paragraph_format.space_after = Pt(12)
+
+    # footer
+    footer_section_2 = section_2.footer
+    p = footer_section_2.paragraphs[0]
+    p.add_run()
+    add_page_number(p)
+    set_page_number_format(section_2, fmt="decimal")
      
 
-doc.save("out-template.docx")
+save_docx(doc, "out-template.docx")
@@ -1,92 +1,21 @@
 # apply_replacements.py
 # pip install python-docx
 
-from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any, Tuple
 from docx import Document
+from docxzip import open_docx, save_docx
 from docx.text.paragraph import Paragraph
 from docx.table import Table
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
-import json, re, unicodedata
+from outline import Node, BlockIndex, TitleIndex, TitleMatch, build_outline, iter_nodes, has_sectPr_elm
+import json, re
 
-@dataclass
-class Node:
-    title: str
-    level: int
-    start_idx: int
-    content_idxs: List[int] = field(default_factory=list)
-    children: List["Node"] = field(default_factory=list)
+import profiling
 
 # ----------------- detectors -----------------
-def _heading_level(p: Paragraph) -> Optional[int]:
-    name = (p.style.name or "").lower()
-    m = re.search(r'(heading|überschrift)\s*(\d+)$', name)
-    if m: return int(m.group(2))
-    pPr = p._p.pPr
-    if pPr is not None and pPr.outlineLvl is not None:
-        return int(pPr.outlineLvl.val) + 1
-    return None
-
 def has_sectPr(p: Paragraph) -> bool:
-    pPr = p._p.pPr
-    return (pPr is not None) and (pPr.sectPr is not None)
-
-FM_TITLES = {"فهرست مطالب","فهرست جداول","فهرست اشکال","فهرست شکل‌ها",
-             "Table of Contents","List of Tables","List of Figures"}
-
-def normalize_text(s: str) -> str:
-    if s is None: return ""
-    s = s.replace("\\n"," ")
-    s = unicodedata.normalize("NFKC", s)
-    s = s.translate(str.maketrans({"ي":"ی","ك":"ک","ۀ":"ه","أ":"ا","إ":"ا","ٱ":"ا"}))
-    s = s.replace("\u200c","").replace("\u200f","").replace("\u200e","")
-    return re.sub(r"\s+"," ",s.strip()).casefold()
-
-def is_front_matter_title(p: Paragraph) -> bool:
-    t = normalize_text(p.text)
-    if t in {x.casefold() for x in FM_TITLES}: return True
-    s = (p.style.name or "").lower()
-    if any(k in s for k in ["toc heading","table of contents","list of tables","list of figures"]):
-        return True
-    return False
-
-# ----------------- tree (section-aware & TOC/LOF/LOT-aware) -----------------
-def build_tree(doc: Document) -> List[Node]:
-    roots: List[Node] = []
-    stack: List[Node] = []
-
-    def start_root_node(title: str, idx: int):
-        n = Node(title=title, level=1, start_idx=idx)
-        roots.append(n)
-        stack.clear(); stack.append(n)
-
-    for idx, p in enumerate(doc.paragraphs):
-        if is_front_matter_title(p):
-            start_root_node(p.text.strip(), idx)
-            continue
-        lvl = _heading_level(p)
-        if lvl is not None:
-            node = Node(title=p.text.strip(), level=lvl, start_idx=idx)
-            while stack and stack[-1].level >= lvl:
-                stack.pop()
-            if stack: stack[-1].children.append(node)
-            else: roots.append(node)
-            stack.append(node)
-        else:
-            if stack:
-                stack[-1].content_idxs.append(idx)
-                if has_sectPr(p):   # stop at section end
-                    stack.clear()
-    return roots
-
-def iter_nodes(nodes: List[Node]) -> List[Node]:
-    out=[]
-    def walk(n: Node):
-        out.append(n)
-        for c in n.children: walk(c)
-    for r in nodes: walk(r)
-    return out
+    return has_sectPr_elm(p._p)
 
 # ----------------- safe ops -----------------
 def clear_paragraph_text(paragraph: Paragraph):
@@ -113,12 +42,13 @@ def table_from_elm(doc: Document, elm) -> Table:
     return Table(elm, doc._body)
 
 # ----------------- body-style inference -----------------
-def infer_body_style(doc: Document, node: Node):
+def infer_body_style(index: BlockIndex, node: Node):
+    doc = index.doc
     for i in node.content_idxs:
-        if 0 <= i < len(doc.paragraphs):
-            p = doc.paragraphs[i]
-            if _heading_level(p) is None and not has_sectPr(p) and p.text.strip():
-                try: return p.style
+        elm = index.element(i)
+        if elm is not None:
+            if index.level(elm) is None and not has_sectPr_elm(elm) and elm.text.strip():
+                try: return para_from_elm(doc, elm).style
                 except Exception: pass
     try: return doc.styles["Normal"]
     except Exception: return None
@@ -134,14 +64,17 @@ def insert_paragraph_after(paragraph: Paragraph, text: str, style=None) -> Parag
     return new_para
 
 # ----------------- core replace (BLOCK-AWARE) -----------------
-def apply_content_to_node(doc: Document, node: Node, new_text: str, body_style=None):
+def apply_content_to_node(index: BlockIndex, node: Node, new_text: str, body_style=None):
     """
     Replace *direct* body under the node's heading (before first subheading or section break).
     Removes paragraphs and tables until a heading (any level) or sectPr paragraph.
     Preserves sectPr so headers/footers & pagination remain.
+    Keeps `index` and node.content_idxs in step with the edited body.
     """
-    heading_p = doc.paragraphs[node.start_idx]
+    doc = index.doc
+    heading_p = index.heading(node)
     cur = heading_p._p.getnext()
+    kept: List[int] = []
 
     # 1) Remove blocks until boundary
     while cur is not None:
@@ -149,11 +82,12 @@ def apply_content_to_node(doc: Document, node: Node, new_text: str, body_style=N
             p = para_from_elm(doc, cur)
             if has_sectPr(p):
                 clear_paragraph_text(p)  # keep section boundary
+                if cur in index.pos: kept.append(index.pos[cur])
                 break
-            if _heading_level(p) is not None:
+            if index.level(cur) is not None:
                 break  # stop at first subheading/next heading
             nxt = cur.getnext()
-            remove_paragraph(p)
+            index.remove(cur)
             cur = nxt
             continue
         elif is_tbl(cur):
@@ -167,43 +101,39 @@ def apply_content_to_node(doc: Document, node: Node, new_text: str, body_style=N
     # 2) Insert new body paragraphs right after the heading
     blocks = [t.strip() for t in re.split(r"\n\s*\n", new_text or "") if t.strip()]
     cursor = heading_p
+    added: List[int] = []
     for b in blocks:
         cursor = insert_paragraph_after(cursor, b, style=body_style)
+        added.append(index.add(cursor._p))
+    node.content_idxs = added + kept
 
 # ----------------- driver -----------------
-def apply_replacements(docx_in: str, json_in: str, docx_out: str, edit_front_matter: bool = False, debug: bool = False):
-    doc = Document(docx_in)
-    tree = build_tree(doc)
-    all_nodes = iter_nodes(tree)
-
-    title_to_nodes: Dict[str, List[Node]] = {}
-    for n in all_nodes:
-        title_to_nodes.setdefault(normalize_text(n.title), []).append(n)
-
-    with open(json_in, "r", encoding="utf-8") as f:
-        spec: Dict[str, Any] = json.load(f)
+def plan_replacements(all_nodes: List[Node], spec: Dict[str, Any], debug: bool = False) -> List[Tuple[Node, str]]:
+    """Resolve spec keys to heading nodes; (node, text) pairs de-duplicated, bottom-up."""
+    titles = TitleIndex(all_nodes)
+    reported = set()
+
+    def resolve(k: str) -> List[Node]:
+        m: TitleMatch = titles.lookup(k)
+        if m.kind == "ambiguous" and k not in reported:
+            reported.add(k)
+            shown = ", ".join(f"'{' '.join(n.title.split())}' (H{n.level})" for n in m.candidates[:5])
+            more = f" and {len(m.candidates) - 5} more" if len(m.candidates) > 5 else ""
+            print(f"[ambiguous] key '{k}' is part of {len(m.candidates)} headings: {shown}{more}")
+        return m.nodes
 
     replacements: List[Tuple[Node, str]] = []
 
     # top-level keys like {"Chapter X": {"__content__": "..."}}
     for k, v in spec.items():
         if isinstance(v, dict) and "__content__" in v:
-            nodes = title_to_nodes.get(normalize_text(k), [])
-            if not nodes:
-                want = normalize_text(k)
-                partial = [n for t, ns in title_to_nodes.items() for n in ns if want and want in t]
-                if len(partial) == 1: nodes = partial
-            for node in nodes:
+            for node in resolve(k):
                 replacements.append((node, v["__content__"]))
 
     def collect(d: Dict[str, Any]):
         for k, v in d.items():
             if k == "__content__": continue
-            nodes = title_to_nodes.get(normalize_text(k), [])
-            if not nodes:
-                want = normalize_text(k)
-                partial = [n for t, ns in title_to_nodes.items() for n in ns if want and want in t]
-                if len(partial) == 1: nodes = partial
+            nodes = resolve(k)
             if not nodes: 
                 if debug: print(f"[skip] key not matched: {k}")
                 continue
@@ -215,7 +145,7 @@ def apply_replacements(docx_in: str, json_in: str, docx_out: str, edit_front_mat
                 for node in nodes: replacements.append((node, v))
     collect(spec)
 
-    # de-dupe & apply bottom-up
+    # de-dupe & order bottom-up
     seen=set(); uniq=[]
     for node, text in replacements:
         key=(id(node), text)
@@ -227,16 +157,32 @@ def apply_replacements(docx_in: str, json_in: str, docx_out: str, edit_front_mat
         print("Will apply to:")
         for node, _ in uniq:
             print(f" - {node.title} (H{node.level}) at {node.start_idx}")
+    return uniq
 
-    for node, text in uniq:
-        # skip front-matter by default
-        if is_front_matter_title(doc.paragraphs[node.start_idx]) and not edit_front_matter:
-            if debug: print(f"[skip front-matter] {node.title}")
-            continue
-        style = infer_body_style(doc, node)
-        apply_content_to_node(doc, node, text, body_style=style)
+def apply_replacements(docx_in: str, json_in: str, docx_out: str, edit_front_matter: bool = False, debug: bool = False,
+                       compresslevel: Optional[int] = None):
+    with profiling.span("apply_replacements.open"):
+        doc = open_docx(docx_in)
+    with profiling.span("apply_replacements.outline"):
+        outline = build_outline(doc)
+        index = BlockIndex(doc, outline)
+
+    with open(json_in, "r", encoding="utf-8") as f:
+        spec: Dict[str, Any] = json.load(f)
+
+    with profiling.span("apply_replacements.plan"):
+        uniq = plan_replacements(iter_nodes(outline.roots), spec, debug=debug)
+
+    with profiling.span("apply_replacements.apply", doc=doc):
+        for node, text in uniq:
+            # skip front-matter by default
+            if node.front_matter and not edit_front_matter:
+                if debug: print(f"[skip front-matter] {node.title}")
+                continue
+            style = infer_body_style(index, node)
+            apply_content_to_node(index, node, text, body_style=style)
 
-    doc.save(docx_out)
+    save_docx(doc, docx_out, compresslevel=compresslevel)
 
 if __name__ == "__main__":
     import argparse
@@ -246,7 +192,20 @@ if __name__ == "__main__":
     ap.add_argument("output_docx")
     ap.add_argument("--edit-front-matter", action="store_true")
     ap.add_argument("--debug", action="store_true")
+    ap.add_argument("--stream", action="store_true",
+                    help="Stream word/document.xml (bounded memory for very large files); other parts are copied as-is")
+    ap.add_argument("--compress-level", type=int, default=None, choices=range(10), metavar="0-9",
+                    help="zlib level for rewritten parts (unchanged parts are copied without recompression)")
+    profiling.add_arguments(ap)
     args = ap.parse_args()
-    apply_replacements(args.input_docx, args.input_json, args.output_docx,
-                       edit_front_matter=args.edit_front_matter, debug=args.debug)
+    profiling.configure_from_args(args)
+    if args.stream:
+        from stream_replace import stream_apply_replacements
+        stream_apply_replacements(args.input_docx, args.input_json, args.output_docx,
+                                  edit_front_matter=args.edit_front_matter, debug=args.debug,
+                                  compresslevel=args.compress_level)
+    else:
+        apply_replacements(args.input_docx, args.input_json, args.output_docx,
+                           edit_front_matter=args.edit_front_matter, debug=args.debug,
+                           compresslevel=args.compress_level)
     print(f"Saved updated document to {args.output_docx}")
@@ -0,0 +1,256 @@
+# batch_build.py
+# pip install python-docx
+#
+# Render many content JSONs in one process. The template is opened and the style
+# spec applied once; every job then works on an in-memory clone of that prepared
+# document, so per-document cost is just content emission and save.
+
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional, Dict, Iterator
+from copy import deepcopy
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from docx import Document
+import argparse, json, logging, os, time, traceback
+
+import build_docx
+import content_spec
+import add_custom_chapter
+import logconfig
+from template_cache import open_template, load_template
+from docxzip import save_docx
+
+log = logging.getLogger("batch_build")
+
+KINDS = ("build", "chapter")
+
+@dataclass
+class Job:
+    content: str
+    output: str
+    kind: str = "build"   # build: build_docx.write_section; chapter: add_custom_chapter.build_from_json
+
+@dataclass
+class JobResult:
+    content: str
+    output: str
+    ok: bool
+    seconds: float
+    error: Optional[str] = None
+
+# ----------------- job sources -----------------
+
+def load_manifest(path: str, default_kind: str = "build") -> Dict:
+    """
+    Manifest: {"template": ..., "styles": ..., "jobs": [{"content": ..., "output": ..., "kind": ...}]}
+    or just the jobs list. Relative paths are resolved against the manifest's directory.
+    """
+    base = Path(path).parent
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"jobs": data}
+
+    def rel(p):
+        return None if p is None else str(base / p)
+
+    jobs = [Job(content=rel(j["content"]), output=rel(j["output"]), kind=j.get("kind", default_kind))
+            for j in data.get("jobs", [])]
+    return {"template": rel(data.get("template")), "styles": rel(data.get("styles")), "jobs": jobs}
+
+def jobs_from_dir(content_dir: str, out_dir: str, kind: str = "build") -> List[Job]:
+    return [Job(content=str(p), output=str(Path(out_dir) / (p.stem + ".docx")), kind=kind)
+            for p in sorted(Path(content_dir).glob("*.json"))]
+
+# ----------------- session -----------------
+
+class TemplateSession:
+    """Template + style spec loaded once per process; jobs get deep-copied documents."""
+
+    def __init__(self, template_path: Optional[str] = None, styles_path: Optional[str] = None,
+                 fast: bool = False, strict_styles: bool = False):
+        t0 = time.perf_counter()
+        self.template_path = template_path
+        self.fast = fast
+        self.strict_styles = strict_styles
+        self._style_names = None
+        self.base = open_template(template_path) if template_path else Document()
+        if styles_path:
+            build_docx.load_styles(Path(styles_path))
+            build_docx.apply_styles_from_json(self.base)
+            build_docx.ensure_numbering_rtl(self.base)
+        log.info("Template ready in %.3fs (%s)", time.perf_counter() - t0, template_path or "python-docx default")
+
+    def style_names(self) -> frozenset:
+        """Every name build_docx resolves to a style of the prepared template."""
+        if self._style_names is None:
+            self._style_names = frozenset(build_docx.style_table(self.base).by_key)
+        return self._style_names
+
+    def new_document(self) -> Document:
+        return deepcopy(self.base)
+
+    def style_document(self, path: str) -> Document:
+        """External style-source documents (chapter meta.template_document), read-only."""
+        return load_template(path)
+
+def render(session: TemplateSession, job: Job):
+    with open(job.content, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if job.kind == "build":
+        # fails the job before the template is cloned
+        content_spec.require_valid(data, job.content, content_spec.CHECK_BUILD,
+                                   session.style_names() if session.strict_styles else None)
+    doc = session.new_document()
+    if job.kind == "chapter":
+        tmpl = data.get("meta", {}).get("template_document")
+        template_doc = session.style_document(tmpl) if tmpl else doc
+        add_custom_chapter.build_from_json(doc, data, template_doc)
+    elif job.kind == "build":
+        emitter = build_docx.FastEmitter(doc) if session.fast else None
+        build_docx.write_section(doc, data.get("meta", {}), data, emitter=emitter)
+    else:
+        raise ValueError(f"Unknown job kind: {job.kind!r} (expected one of {KINDS})")
+    Path(job.output).parent.mkdir(parents=True, exist_ok=True)
+    save_docx(doc, job.output)
+
+def run_job(session: TemplateSession, job: Job) -> JobResult:
+    t0 = time.perf_counter()
+    try:
+        render(session, job)
+    except Exception as e:
+        log.debug("Job %s failed:\n%s", job.content, traceback.format_exc())
+        return JobResult(job.content, job.output, False, time.perf_counter() - t0, f"{type(e).__name__}: {e}")
+    return JobResult(job.content, job.output, True, time.perf_counter() - t0)
+
+def run_batch(session: TemplateSession, jobs: List[Job]) -> Iterator[JobResult]:
+    """Render jobs in order; a failing job is reported and the batch carries on."""
+    for job in jobs:
+        yield run_job(session, job)
+
+# ----------------- process pool -----------------
+# Each worker builds its TemplateSession once in the pool initializer, so jobs
+# only pay for content emission and save. Jobs travel in chunks to cut IPC.
+# Workers log through the parent (logconfig.WorkerLogs), which alone writes --log-json.
+
+_WORKER_SESSION: Optional[TemplateSession] = None
+
+def _init_worker(template_path, styles_path, fast, strict_styles, worker_logs):
+    global _WORKER_SESSION
+    if worker_logs is not None:
+        logconfig.configure_worker(*worker_logs)
+    _WORKER_SESSION = TemplateSession(template_path, styles_path, fast=fast, strict_styles=strict_styles)
+
+def _run_chunk(jobs: List[Job]) -> List[JobResult]:
+    return [run_job(_WORKER_SESSION, job) for job in jobs]
+
+def run_parallel(jobs: List[Job], template_path: Optional[str] = None, styles_path: Optional[str] = None,
+                 fast: bool = False, workers: Optional[int] = None, chunksize: int = 1,
+                 ordered: bool = True, log_settings=None, strict_styles: bool = False) -> Iterator[JobResult]:
+    """
+    Spread jobs over a ProcessPoolExecutor with pre-warmed workers.
+    Results stream as chunks finish: in job order when `ordered`, else as completed.
+    If the pool breaks (a worker's initializer raised, or a worker died), every job
+    that has no result yet is reported as failed. `log_settings` is (level, json_path,
+    modules) as for logconfig.configure; worker records go to this process's handlers.
+    """
+    if workers is not None and workers < 0:
+        raise ValueError(f"workers must be >= 0 (0 = one per CPU), got {workers}")
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, chunksize)
+    chunks = [jobs[i:i + chunksize] for i in range(0, len(jobs), chunksize)]
+    logs = logconfig.WorkerLogs(log_settings[0], log_settings[2]) if log_settings is not None else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(template_path, styles_path, fast, strict_styles,
+                                           logs and logs.settings)) as ex:
+            futures = {}
+            for c in chunks:
+                try:
+                    futures[ex.submit(_run_chunk, c)] = c
+                except BrokenProcessPool as e:
+                    futures[_broken(e)] = c
+            for fut in (futures if ordered else as_completed(futures)):
+                try:
+                    yield from fut.result()
+                except BrokenProcessPool as e:
+                    log.debug("Worker pool broke", exc_info=True)
+                    yield from (JobResult(job.content, job.output, False, 0.0, f"{type(e).__name__}: {e}")
+                                for job in futures[fut])
+    finally:
+        if logs is not None:
+            logs.close()
+
+def _broken(e: BrokenProcessPool) -> Future:
+    fut: Future = Future()
+    fut.set_exception(e)
+    return fut
+
+# ----------------- CLI -----------------
+
+def report_results(results: Iterator[JobResult], report_path: Optional[str] = None) -> List[JobResult]:
+    done: List[JobResult] = []
+    for r in results:
+        done.append(r)
+        if r.ok:
+            print(f"[ok]   {r.seconds:7.3f}s  {r.output}")
+        else:
+            print(f"[FAIL] {r.seconds:7.3f}s  {r.content}: {r.error}")
+    failed = sum(1 for r in done if not r.ok)
+    total = sum(r.seconds for r in done)
+    print(f"{len(done) - failed}/{len(done)} documents written, {failed} failed, {total:.3f}s in jobs")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in done], f, ensure_ascii=False, indent=2)
+    return done
+
+def add_source_arguments(ap):
+    ap.add_argument("source", help="Manifest .json or a directory of content JSONs")
+    ap.add_argument("--out-dir", default="out", help="Output directory when SOURCE is a directory")
+    ap.add_argument("--template", default=None, help="Template .docx (default: manifest's, else python-docx default)")
+    ap.add_argument("--styles", default=None, help="Style spec JSON applied once to the template")
+    ap.add_argument("--kind", choices=KINDS, default="build", help="Job kind for directory sources / manifest default")
+    ap.add_argument("--fast", action="store_true", help="Use build_docx's FastEmitter for build jobs")
+    ap.add_argument("--strict-styles", action="store_true",
+                    help="Fail build jobs that name a style the template lacks, instead of falling back to Normal")
+    ap.add_argument("--report", default=None, metavar="PATH", help="Write per-job results as JSON")
+    ap.add_argument("-j", "--workers", type=int, default=1,
+                    help="Worker processes (1 = in-process, 0 = one per CPU)")
+    ap.add_argument("--chunksize", type=int, default=1, help="Jobs sent to a worker at a time")
+    ap.add_argument("--unordered", action="store_true", help="Report results as they finish, not in job order")
+
+def resolve_source(args) -> Dict:
+    if Path(args.source).is_dir():
+        src = {"template": None, "styles": None, "jobs": jobs_from_dir(args.source, args.out_dir, args.kind)}
+    else:
+        src = load_manifest(args.source, default_kind=args.kind)
+    src["template"] = args.template or src["template"]
+    src["styles"] = args.styles or src["styles"]
+    return src
+
+def main():
+    ap = argparse.ArgumentParser(description="Render many content JSONs with one template load.")
+    add_source_arguments(ap)
+    logconfig.add_arguments(ap)
+    args = ap.parse_args()
+    if args.workers < 0:
+        ap.error("-j/--workers must be >= 0")
+    logconfig.configure_from_args(args)
+
+    src = resolve_source(args)
+    if args.workers == 1:
+        session = TemplateSession(src["template"], src["styles"], fast=args.fast, strict_styles=args.strict_styles)
+        results = run_batch(session, src["jobs"])
+    else:
+        results = run_parallel(src["jobs"], src["template"], src["styles"], fast=args.fast,
+                               workers=args.workers or None, chunksize=args.chunksize,
+                               ordered=not args.unordered,
+                               log_settings=(args.log_level, args.log_json, logconfig.parse_modules(args.trace)),
+                               strict_styles=args.strict_styles)
+    done = report_results(results, args.report)
+    if any(not r.ok for r in done):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
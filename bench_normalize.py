@@ -0,0 +1,61 @@
+# bench_normalize.py
+# pip install python-docx
+#
+# Per-call cost of textnorm.normalize_text on realistic Persian headings, against the
+# per-call maketrans/regex implementation it replaced and the memoized variant.
+#
+#   python bench_normalize.py [template/persian-thesis.docx] [--number 20000]
+
+from docx import Document
+import argparse, re, timeit, unicodedata
+
+import textnorm
+
+def legacy_normalize(s: str) -> str:
+    """apply_replacements.normalize_text as it was before textnorm, copied verbatim."""
+    if s is None: return ""
+    s = s.replace("\\n"," ")
+    s = unicodedata.normalize("NFKC", s)
+    s = s.translate(str.maketrans({"ي":"ی","ك":"ک","ۀ":"ه","أ":"ا","إ":"ا","ٱ":"ا"}))
+    s = s.replace("\u200c","").replace("\u200f","").replace("\u200e","")
+    return re.sub(r"\s+"," ",s.strip()).casefold()
+
+SAMPLES = [
+    "فصل اول: مقدمه",
+    "فصل دوم\nمشخصات یک پایان نامه و گزارش علمی",
+    "ارجاع به‌موقع و صحیح به منابع دیگر",
+    "رعایت نكات دستوري و نشانه‌گذاري",          # Arabic kaf/yeh variants
+    "  فهرست   شکل‌ها  ",
+    "سربرگ و ته‌برگ (Header and Footer)",
+    "Table of Contents",
+    "فصل سوم\\nروش تحقیق",                         # literal backslash-n from JSON keys
+    "\u200fنتیجه\u200cگیری\u200e",
+    "ﻓﺼﻞ چهارم",                                    # presentation forms (NFKC)
+]
+
+def headings(path: str):
+    doc = Document(path)
+    return [p.text for p in doc.paragraphs if p.text.strip() and p.style.name.lower().startswith("heading")]
+
+def main():
+    ap = argparse.ArgumentParser(description="Microbenchmark the shared text normalizer.")
+    ap.add_argument("docx", nargs="?", default="template/persian-thesis.docx", help="Source of real headings")
+    ap.add_argument("--number", type=int, default=20000, help="Calls per measurement")
+    args = ap.parse_args()
+
+    texts = SAMPLES + headings(args.docx)
+    assert all(legacy_normalize(t) == textnorm.normalize_text(t) for t in texts)
+    print(f"{len(texts)} headings, {args.number} calls per measurement")
+
+    for name, fn in (("legacy (maketrans + regex per call)", legacy_normalize),
+                     ("textnorm.normalize_text", textnorm.normalize_text),
+                     ("textnorm.normalize_cached (warm)", textnorm.normalize_cached)):
+        i = 0
+        def call():
+            nonlocal i
+            fn(texts[i % len(texts)]); i += 1
+        best = min(timeit.repeat(call, number=args.number, repeat=5))
+        print(f"{name:38s} {best / args.number * 1e9:8.0f} ns/call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench_pagination.py
+# pip install python-docx
+#
+# Accuracy and speed of pagination.estimate_pages against documents last laid out
+# by Word. The reference is what Word rendered into each PAGEREF result (TOC, LOF,
+# LOT entries); errors are in displayed page numbers. Use documents whose fields
+# were updated right before saving, or stale results will count as errors.
+#
+# FONT_METRICS were tuned on the documents in pagination.TUNED_ON (the bundled
+# thesis), so their scores are in-sample and say little about other documents.
+# They are marked as such and pooled apart from held-out documents.
+#
+#   python bench_pagination.py template/persian-thesis.docx refs/ --repeat 5 --json bench.json
+
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import List, Dict, Optional
+from docx import Document
+import argparse, hashlib, json, statistics, time
+
+import pagination
+
+@dataclass
+class Score:
+    n: int = 0
+    exact: int = 0
+    within1: int = 0
+    abs_err: int = 0
+    errors: List[int] = field(default_factory=list, repr=False)
+
+    def add(self, est: Optional[int], ref: Optional[int]):
+        if est is None or ref is None: return
+        e = est - ref
+        self.n += 1
+        self.exact += e == 0
+        self.within1 += abs(e) <= 1
+        self.abs_err += abs(e)
+        self.errors.append(e)
+
+    def merge(self, other: "Score"):
+        self.n += other.n
+        self.exact += other.exact
+        self.within1 += other.within1
+        self.abs_err += other.abs_err
+        self.errors.extend(other.errors)
+
+    def summary(self) -> Dict:
+        n = max(self.n, 1)
+        return {"n": self.n, "exact": round(self.exact / n, 3), "within1": round(self.within1 / n, 3),
+                "mae": round(self.abs_err / n, 3), "max_err": max(map(abs, self.errors), default=0)}
+
+@dataclass
+class DocResult:
+    path: str
+    pages: int
+    ms: float
+    pagerefs: Dict
+    in_sample: bool = False        # FONT_METRICS were tuned on this document
+    score: Score = field(default_factory=Score, repr=False)
+
+def bench_document(path: str, repeat: int = 1) -> DocResult:
+    with open(path, "rb") as f:
+        in_sample = hashlib.sha256(f.read()).hexdigest() in pagination.TUNED_ON
+    doc = Document(path)
+    times = []
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        pm = pagination.estimate_pages(doc)
+        times.append(time.perf_counter() - t0)
+
+    refs = Score()
+    targets = pagination.bookmark_paragraphs(doc)
+    for name, label in pagination.recorded_pagerefs(doc).items():
+        p = targets.get(name)
+        if p is not None:
+            refs.add(pm.number(p), pagination.parse_page_number(label))
+
+    return DocResult(path=path, pages=pm.page_count, ms=round(statistics.median(times) * 1000, 2),
+                     pagerefs=refs.summary(), in_sample=in_sample, score=refs)
+
+def collect(paths: List[str]) -> List[str]:
+    out = []
+    for p in paths:
+        pp = Path(p)
+        out.extend(sorted(str(x) for x in pp.glob("*.docx")) if pp.is_dir() else [p])
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark estimated pagination against Word-rendered references.")
+    ap.add_argument("docs", nargs="*", default=["template"], help=".docx files or directories (default: template/)")
+    ap.add_argument("--repeat", type=int, default=3, help="Timing runs per document (median reported)")
+    ap.add_argument("--json", default=None, metavar="PATH", help="Write per-document results as JSON")
+    args = ap.parse_args()
+
+    results = []
+    for path in collect(args.docs):
+        r = bench_document(path, args.repeat)
+        results.append(r)
+        pr = r.pagerefs
+        print(f"{path}: {r.pages} pages, {r.ms:.1f} ms | pagerefs n={pr['n']} exact={pr['exact']:.0%} "
+              f"±1={pr['within1']:.0%} mae={pr['mae']:.2f} max={pr['max_err']}"
+              + (" (in-sample: FONT_METRICS were tuned on it)" if r.in_sample else ""))
+    if results:
+        total_ms = sum(r.ms for r in results)
+        print(f"{len(results)} documents, {total_ms:.1f} ms total, {1000 * len(results) / max(total_ms, 1e-9):.1f} docs/s")
+        for label, in_sample in (("held-out", False), ("in-sample", True)):
+            pooled = Score()
+            for r in results:
+                if r.in_sample == in_sample:
+                    pooled.merge(r.score)
+            s = pooled.summary()
+            if s["n"]:
+                print(f"{label} pagerefs: n={s['n']} exact={s['exact']:.0%} ±1={s['within1']:.0%} mae={s['mae']:.2f}")
+            elif not in_sample:
+                print("held-out pagerefs: none (add Word-laid-out documents to measure accuracy out of sample)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in asdict(r).items() if k != "score"} for r in results],
+                      f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# bench_suite.py
+# pip install python-docx
+#
+# End-to-end benchmarks of the scripts on a synthetic thesis (synth_thesis.py).
+#
+#   python bench_suite.py --chapters 12 --images 4 --repeat 3 --json bench/$(git rev-parse --short HEAD).json
+#   python bench_suite.py --json new.json --compare old.json
+#
+# Phases (each run in a fresh process):
+#   build           build_docx: prepare styles/numbering, write_section per chapter, save
+#   build_fast      the same through build_docx.FastEmitter
+#   replace         apply_replacements: open, outline, plan, apply, save
+#   replace_stream  stream_replace.stream_apply_replacements (one step)
+#   add_chapter     add_chapter_like: open, outline, add a chapter from chapter 1, save
+#   skeleton        add_chapter_like --export-skeleton for chapter 1
+#   extract         extract_structure: open, outline tree + style list, write JSON
+#   compose         compose.py: the chapters as separate .docx files appended to one
+#                   another (open, append, save)
+#
+# Reported per phase: median wall time, median per-step breakdown, and peak RSS
+# (with the interpreter-plus-imports baseline, so the phase's own share is visible).
+# On Linux the peak is VmHWM, reset through /proc/self/clear_refs once the imports
+# are done. ru_maxrss is no use there: a spawned child starts with its parent's
+# value, i.e. the generator's. Elsewhere ru_maxrss is reported and may include it.
+# Results are JSON with the commit, Python version and generator config, for
+# comparison across commits (--compare).
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse, json, multiprocessing, os, platform, statistics, subprocess, sys, tempfile, time
+
+try:
+    import resource
+except ImportError:           # not on Windows; RSS is then not reported
+    resource = None
+
+import synth_thesis
+
+# ----------------- phase timing -----------------
+
+class Steps:
+    """Named step timer: `with steps("save"): ...` accumulates into steps.times."""
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - t0
+
+def _maxrss_mb() -> Optional[float]:
+    if resource is None: return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _proc_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss() -> bool:
+    """Set VmHWM back to the current RSS (Linux); False when that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _proc_status_mb("VmHWM") is not None
+    except OSError:
+        return False
+
+# ----------------- phases -----------------
+
+def _load_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def phase_build(inputs: Dict, work: str, steps: Steps, fast: bool = False):
+    from docx import Document
+    import build_docx
+    with steps("prepare"):
+        build_docx.load_styles(Path(inputs["styles"]))
+        doc = Document()
+        build_docx.apply_styles_from_json(doc)
+        build_docx.ensure_numbering_rtl(doc)
+    chapters = [_load_json(p) for p in inputs["chapters"]]
+    with steps("emit"):
+        emitter = build_docx.FastEmitter(doc) if fast else None
+        for ch in chapters:
+            build_docx.write_section(doc, ch.get("meta", {}), ch, emitter=emitter)
+    with steps("save"):
+        doc.save(os.path.join(work, "build.docx"))
+
+def phase_build_fast(inputs: Dict, work: str, steps: Steps):
+    phase_build(inputs, work, steps, fast=True)
+
+def phase_replace(inputs: Dict, work: str, steps: Steps):
+    from docxzip import open_docx, save_docx
+    from outline import BlockIndex, build_outline, iter_nodes
+    import apply_replacements as ar
+    with steps("open"):
+        doc = open_docx(inputs["thesis"])
+    with steps("outline"):
+        outline = build_outline(doc)
+        index = BlockIndex(doc, outline)
+    spec = _load_json(inputs["replacements"])
+    with steps("plan"):
+        plan = ar.plan_replacements(iter_nodes(outline.roots), spec)
+    with steps("apply"):
+        for node, text in plan:
+            if node.front_matter: continue
+            ar.apply_content_to_node(index, node, text, body_style=ar.infer_body_style(index, node))
+    with steps("save"):
+        save_docx(doc, os.path.join(work, "replace.docx"))
+
+def phase_replace_stream(inputs: Dict, work: str, steps: Steps):
+    from stream_replace import stream_apply_replacements
+    with steps("stream"):
+        stream_apply_replacements(inputs["thesis"], inputs["replacements"], os.path.join(work, "replace_stream.docx"))
+
+def _first_chapter(tree):
+    return next(n for n in tree if n.level == 1)
+
+def phase_add_chapter(inputs: Dict, work: str, steps: Steps):
+    from docxzip import open_docx, save_docx
+    from outline import BlockIndex, build_outline
+    import add_chapter_like as acl
+    with steps("open"):
+        doc = open_docx(inputs["thesis"])
+    with steps("outline"):
+        outline = build_outline(doc)
+        index = BlockIndex(doc, outline)
+    spec = _load_json(inputs["new_chapter"])
+    with steps("add"):
+        acl.create_chapter_from_template(index, _first_chapter(outline.roots), "فصل جدید", spec)
+    with steps("save"):
+        save_docx(doc, os.path.join(work, "add_chapter.docx"))
+
+def phase_skeleton(inputs: Dict, work: str, steps: Steps):
+    from docx import Document
+    from outline import BlockIndex, build_outline
+    import add_chapter_like as acl
+    with steps("open"):
+        doc = Document(inputs["thesis"])
+    with steps("outline"):
+        outline = build_outline(doc)
+        index = BlockIndex(doc, outline)
+    with steps("export"):
+        acl.export_chapter_skeleton(index, _first_chapter(outline.roots), os.path.join(work, "skeleton.json"), False)
+
+def phase_extract(inputs: Dict, work: str, steps: Steps):
+    from docx import Document
+    import extract_structure
+    with steps("open"):
+        doc = Document(inputs["thesis"])
+    with steps("extract"):
+        structure = {"styles": [s.name for s in doc.styles], "chapters": extract_structure.build_tree(doc)}
+    with steps("write"):
+        with open(os.path.join(work, "structure.json"), "w", encoding="utf-8") as f:
+            json.dump(structure, f, ensure_ascii=False, indent=2)
+
+def phase_compose(inputs: Dict, work: str, steps: Steps):
+    from docx import Document
+    from docxzip import open_docx, save_docx
+    import compose
+    first, *rest = inputs["chapter_docs"]
+    with steps("open"):
+        master = open_docx(first)
+        docs = [Document(p) for p in rest]
+    with steps("append"):
+        composer = compose.Composer(master)
+        for d in docs:
+            composer.append(d)
+    with steps("save"):
+        save_docx(master, os.path.join(work, "compose.docx"))
+
+PHASES: Dict[str, Callable] = {
+    "build": phase_build,
+    "build_fast": phase_build_fast,
+    "replace": phase_replace,
+    "replace_stream": phase_replace_stream,
+    "add_chapter": phase_add_chapter,
+    "skeleton": phase_skeleton,
+    "extract": phase_extract,
+    "compose": phase_compose,
+}
+
+def _run_phase(name: str, inputs: Dict, work: str) -> Dict:
+    """Runs in a fresh worker process."""
+    fn = PHASES[name]
+    import docx, lxml.etree, outline, build_docx    # imports count toward the baseline, not the phase
+    hwm = _reset_peak_rss()
+    baseline = _proc_status_mb("VmRSS") if hwm else _maxrss_mb()
+    steps = Steps()
+    t0 = time.perf_counter()
+    fn(inputs, work, steps)
+    wall = time.perf_counter() - t0
+    peak = _proc_status_mb("VmHWM") if hwm else _maxrss_mb()
+    return {"wall_s": wall, "steps": steps.times, "peak_rss_mb": peak, "baseline_rss_mb": baseline}
+
+def run_phase(name: str, inputs: Dict, work: str, repeat: int) -> Dict:
+    runs = []
+    ctx = multiprocessing.get_context("spawn")
+    for _ in range(max(repeat, 1)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            runs.append(ex.submit(_run_phase, name, inputs, work).result())
+    step_names = list(runs[0]["steps"])
+    rss = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+    return {
+        "wall_s": round(statistics.median(r["wall_s"] for r in runs), 4),
+        "wall_runs": [round(r["wall_s"], 4) for r in runs],
+        "steps": {k: round(statistics.median(r["steps"].get(k, 0.0) for r in runs), 4) for k in step_names},
+        "peak_rss_mb": max(rss) if rss else None,
+        "baseline_rss_mb": runs[0]["baseline_rss_mb"],
+    }
+
+# ----------------- reporting -----------------
+
+def git_revision() -> Optional[str]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def input_sizes(inputs: Dict) -> Dict:
+    return {"thesis_bytes": os.path.getsize(inputs["thesis"]),
+            "chapter_json_bytes": sum(os.path.getsize(p) for p in inputs["chapters"])}
+
+def print_table(results: Dict, baseline: Optional[Dict] = None):
+    old = (baseline or {}).get("phases", {})
+    for name, r in results["phases"].items():
+        steps = "  ".join(f"{k} {v:.3f}" for k, v in r["steps"].items())
+        rss = f"{r['peak_rss_mb']:.0f} MB (base {r['baseline_rss_mb']:.0f})" if r["peak_rss_mb"] is not None else "n/a"
+        line = f"{name:15s} {r['wall_s']:8.3f}s  rss {rss:22s} {steps}"
+        if name in old:
+            o = old[name]
+            line += f"   | was {o['wall_s']:.3f}s ({r['wall_s'] / max(o['wall_s'], 1e-9):.2f}x)"
+            if o.get("peak_rss_mb") and r["peak_rss_mb"]:
+                line += f", {o['peak_rss_mb']:.0f} MB"
+        print(line)
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark build/replace/add-chapter/skeleton/extract/compose on a synthetic thesis.")
+    synth_thesis.add_config_arguments(ap)
+    ap.add_argument("--phases", default=",".join(PHASES), help=f"Comma-separated subset of: {', '.join(PHASES)}")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per phase (median reported)")
+    ap.add_argument("--work", default=None, help="Directory for inputs and outputs (default: a temp dir)")
+    ap.add_argument("--json", default=None, metavar="PATH", help="Write results as JSON")
+    ap.add_argument("--compare", default=None, metavar="PATH", help="Earlier results JSON to compare against")
+    args = ap.parse_args()
+
+    names = [n.strip() for n in args.phases.split(",") if n.strip()]
+    unknown = [n for n in names if n not in PHASES]
+    if unknown:
+        raise SystemExit(f"bench_suite: unknown phase(s) {unknown}; choose from {list(PHASES)}")
+
+    cfg = synth_thesis.config_from_args(args)
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        work = args.work or tmp
+        t0 = time.perf_counter()
+        inputs = synth_thesis.generate(os.path.join(work, "inputs"), cfg, chapter_docs="compose" in names)
+        sizes = input_sizes(inputs)
+        print(f"Generated {cfg.chapters} chapters ({sizes['thesis_bytes'] / 1e6:.1f} MB .docx) "
+              f"in {time.perf_counter() - t0:.1f}s")
+
+        results = {
+            "meta": {"revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+                     "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat},
+            "config": synth_thesis.asdict(cfg),
+            "inputs": sizes,
+            "phases": {},
+        }
+        for name in names:
+            results["phases"][name] = run_phase(name, inputs, work, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparing with {args.compare} (revision {baseline.get('meta', {}).get('revision')})")
+    print_table(results, baseline)
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
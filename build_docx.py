@@ -1,50 +1,133 @@
 import json
-import sys
 from pathlib import Path
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.section import WD_SECTION
+from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
+from docx.styles import BabelFish
+from docx.text.paragraph import Paragraph
+from copy import deepcopy
 from typing import cast
+import argparse
+import logging
+import weakref
+import ir
+import logconfig
+import profiling
+
+# Debug output is level-gated: call sites pass %-style arguments (e.g. %.30a for a
+# text preview) so nothing is formatted or sliced unless DEBUG is on for this module.
+log = logging.getLogger("build_docx")
 
 # ---------- Load style spec ----------
 STYLE_SPEC = {}
 
 def load_styles(style_path: Path):
-    print(f"[DEBUG] Entering load_styles with style_path: {style_path}")
+    log.debug("Entering load_styles with style_path: %s", style_path)
     global STYLE_SPEC
     STYLE_SPEC = json.loads(style_path.read_text(encoding="utf-8"))
-    print(f"[DEBUG] STYLE_SPEC loaded with {len(STYLE_SPEC)} styles.")
+    log.debug("STYLE_SPEC loaded with %s styles.", len(STYLE_SPEC))
 
 # ---------- Utilities ----------
 
+# ---------- Resolved style table (one per Document) ----------
+# doc.styles[name] scans every w:style element and signals "missing" with a
+# KeyError; the helpers below resolve names through a dict built once per Document.
+_STYLE_TABLES = weakref.WeakKeyDictionary()
+
+class StyleTable:
+    """Display name / style ID / content-JSON alias -> style object, plus the
+    STYLE_SPEC alignment per style. Rebuilt only when styles are added."""
+
+    def __init__(self, doc: Document):
+        self.doc = doc
+        self.styles_el = doc.styles.element
+        self.build()
+
+    def build(self):
+        log.debug("Building style table.")
+        self.count = len(self.styles_el)
+        self.by_key = {}
+        self.first = None
+        default = self.doc.styles.default(WD_STYLE_TYPE.PARAGRAPH)
+        self.default_id = default.style_id if default is not None else None
+        ids, aliases = {}, {}
+        for st in self.doc.styles:
+            if self.first is None:
+                self.first = st
+            name = st.name
+            if name:
+                self.by_key.setdefault(name, st)
+                self.by_key.setdefault(BabelFish.ui2internal(name), st)
+                # content JSON refers to e.g. "Bulet*" / "HeaderRight*" with or without the star
+                if name.endswith("*"):
+                    aliases.setdefault(name.rstrip("*").strip(), st)
+            if st.style_id:
+                ids.setdefault(st.style_id, st)
+        for key, st in list(ids.items()) + list(aliases.items()):
+            self.by_key.setdefault(key, st)
+        self.spec = None
+        self.align = {}
+        log.debug("Style table has %s keys.", len(self.by_key))
+
+    def get(self, name: str):
+        st = self.by_key.get(name)
+        if st is None and len(self.styles_el) != self.count:
+            self.build()   # a style was added since the last build
+            st = self.by_key.get(name)
+        return st
+
+    def alignment(self, st):
+        """Alignment parsed from STYLE_SPEC for `st`, cached until STYLE_SPEC is reloaded."""
+        if self.spec is not STYLE_SPEC:
+            self.spec = STYLE_SPEC
+            self.align = {}
+        key = st.style_id
+        if key not in self.align:
+            json_style = STYLE_SPEC.get(st.name) or STYLE_SPEC.get(st.style_id) or {}
+            self.align[key] = parse_alignment(json_style.get("alignment"))
+        return self.align[key]
+
+def style_table(doc: Document) -> StyleTable:
+    table = _STYLE_TABLES.get(doc.part)
+    if table is None:
+        table = _STYLE_TABLES[doc.part] = StyleTable(doc)
+    return table
+
 # if style does not exist it falls back to the normal style
 def style_exists(doc: Document, name: str) -> bool:
-    print(f"[DEBUG] Entering style_exists for style: '{name}'")
-    try:
-        _ = doc.styles[name]
-        print(f"[DEBUG] Style '{name}' exists.")
-        return True
-    except KeyError:
-        print(f"[DEBUG] Style '{name}' does NOT exist.")
-        return False
+    log.debug("Entering style_exists for style: '%s'", name)
+    exists = style_table(doc).get(name) is not None
+    log.debug("Style '%s' %s.", name, 'exists' if exists else 'does NOT exist')
+    return exists
+
+def resolve_style(doc: Document, name: str, fallback="Normal"):
+    """Style object for `name`, else `fallback`, else the document's first style."""
+    table = style_table(doc)
+    st = table.get(name)
+    if st is None:
+        st = table.get(fallback) or table.first
+    return st
 
 def safe_style(doc: Document, name: str, fallback="Normal") -> str:
-    print(f"[DEBUG] Entering safe_style for name: '{name}', fallback: '{fallback}'")
-    exists = style_exists(doc, name)
-    if exists:
-        print(f"[DEBUG] safe_style returning original: '{name}'")
+    log.debug("Entering safe_style for name: '%s', fallback: '%s'", name, fallback)
+    table = style_table(doc)
+    if table.get(name) is not None:
+        log.debug("safe_style returning original: '%s'", name)
         return name
-    else:
-        fallback_exists = style_exists(doc, fallback)
-        if fallback_exists:
-            print(f"[DEBUG] safe_style returning fallback: '{fallback}'")
-            return fallback
-        else:
-            default_style = doc.styles[0].name
-            print(f"[DEBUG] safe_style returning document default: '{default_style}'")
-            return default_style
+    if table.get(fallback) is not None:
+        log.debug("safe_style returning fallback: '%s'", fallback)
+        return fallback
+    default_style = table.first.name
+    log.debug("safe_style returning document default: '%s'", default_style)
+    return default_style
+
+def set_style(doc: Document, p, st):
+    """Point the paragraph at an already-resolved style without another name lookup."""
+    # like python-docx, the default paragraph style is implied rather than written
+    p._p.style = None if st.style_id == style_table(doc).default_id else st.style_id
 
 ALIGN_MAP = {
     "LEFT (0)": WD_ALIGN_PARAGRAPH.LEFT,
@@ -64,95 +147,98 @@ ALIGN_MAP = {
 
 # converts name or numbers to actual ALIGN values 
 def parse_alignment(val):
-    print(f"[DEBUG] Entering parse_alignment with value: {val} (type: {type(val)})")
+    log.debug("Entering parse_alignment with value: %s (type: %s)", val, type(val))
     if val is None:
-        print("[DEBUG] parse_alignment returning None for None input.")
+        log.debug("parse_alignment returning None for None input.")
         return None
     if isinstance(val, int):
         # python-docx enums are ints under the hood; accept 0,1,2,3
         try:
             result = WD_ALIGN_PARAGRAPH(val)
-            print(f"[DEBUG] parse_alignment returning {result} for integer input.")
+            log.debug("parse_alignment returning %s for integer input.", result)
             return result
         except Exception as e:
-            print(f"[DEBUG] parse_alignment failed for integer {val}: {e}")
+            log.debug("parse_alignment failed for integer %s: %s", val, e)
             return None
     if isinstance(val, str):
         result = ALIGN_MAP.get(val.strip(), None)
-        print(f"[DEBUG] parse_alignment returning {result} for string input '{val}'.")
+        log.debug("parse_alignment returning %s for string input '%s'.", result, val)
         return result
-    print("[DEBUG] parse_alignment returning None for unhandled type.")
+    log.debug("parse_alignment returning None for unhandled type.")
     return None
 
 def set_paragraph_rtl(p, align: WD_ALIGN_PARAGRAPH = None):
-    print(f"[DEBUG] Entering set_paragraph_rtl for paragraph with text: {ascii(p.text[:30])}...")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Entering set_paragraph_rtl for paragraph with text: %.30a...", p.text)
     # force RTL
     pPr = p._p.get_or_add_pPr()
     bidi = pPr.find(qn("w:bidi"))
     if bidi is None:
-        print("[DEBUG] Adding w:bidi element.")
+        log.debug("Adding w:bidi element.")
         bidi = OxmlElement("w:bidi")
         pPr.append(bidi)
     bidi.set(qn("w:val"), "1")
-    print("[DEBUG] Set w:bidi to 1.")
+    log.debug("Set w:bidi to 1.")
     # alignment
     if align is not None:
-        print(f"[DEBUG] Setting alignment to {align}.")
+        log.debug("Setting alignment to %s.", align)
         p.alignment = align
     else:
         # Safe default for Persian body text
-        if p.alignment is None:
-            print("[DEBUG] Alignment is None, setting to JUSTIFY as default.")
+        current = p.alignment
+        if current is None:
+            log.debug("Alignment is None, setting to JUSTIFY as default.")
             p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
         else:
-            print(f"[DEBUG] Alignment already set to {p.alignment}, not changing.")
+            log.debug("Alignment already set to %s, not changing.", current)
 
 def set_run_lang(run, locale="fa-IR"):
-    print(f"[DEBUG] Entering set_run_lang for run with text: {ascii(run.text[:30])}..., locale: {locale}")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Entering set_run_lang for run with text: %.30a..., locale: %s", run.text, locale)
     rPr = run._r.get_or_add_rPr()
     lang = rPr.find(qn("w:lang"))
     if lang is None:
-        print("[DEBUG] Adding w:lang element.")
+        log.debug("Adding w:lang element.")
         lang = OxmlElement("w:lang")
         rPr.append(lang)
     lang.set(qn("w:bidi"), locale)
     lang.set(qn("w:val"), locale)
-    print(f"[DEBUG] Set w:lang bidi and val to '{locale}'.")
+    log.debug("Set w:lang bidi and val to '%s'.", locale)
 
 def add_field_simple(paragraph, instr_text):
-    print(f"[DEBUG] Entering add_field_simple with instr_text: '{instr_text}'")
+    log.debug("Entering add_field_simple with instr_text: '%s'", instr_text)
     # PAGE field will inherit paragraph/run formatting and language
     fld = OxmlElement("w:fldSimple")
     fld.set(qn("w:instr"), instr_text)
     paragraph._p.append(fld)
-    print("[DEBUG] Appended w:fldSimple element.")
+    log.debug("Appended w:fldSimple element.")
 
 # ---------- Apply JSON -> document styles (key subset we care about) ----------
 # this manages styles 
 def set_style_bidi_and_alignment(doc: Document, style_name: str, style_json: dict):
-    print(f"[DEBUG] Entering set_style_bidi_and_alignment for style: '{style_name}'")
-    if not style_exists(doc, style_name):
-        print(f"[DEBUG] Style '{style_name}' not found in document, skipping.")
+    log.debug("Entering set_style_bidi_and_alignment for style: '%s'", style_name)
+    st = style_table(doc).get(style_name)
+    if st is None:
+        log.debug("Style '%s' not found in document, skipping.", style_name)
         return
-    st = doc.styles[style_name]
     # paragraph styles only; skip character/table
     if getattr(st, "type", None) and getattr(st.type, "value", None) != 1:
-        print(f"[DEBUG] Style '{style_name}' is not a paragraph style (type: {getattr(st, 'type', None)}), skipping.")
+        log.debug("Style '%s' is not a paragraph style (type: %s), skipping.", style_name, getattr(st, 'type', None))
         return
 
     # Paragraph-level alignment from JSON, fallback: RIGHT for headings, JUSTIFY for body
     desired_align = parse_alignment(style_json.get("alignment"))
     if desired_align is None:
-        print(f"[DEBUG] No alignment in JSON for '{style_name}'. Falling back.")
+        log.debug("No alignment in JSON for '%s'. Falling back.", style_name)
         if style_name.startswith("Heading"):
             desired_align = WD_ALIGN_PARAGRAPH.RIGHT
-            print("[DEBUG] Fallback for Heading: RIGHT.")
+            log.debug("Fallback for Heading: RIGHT.")
         else:
             # "Normal" etc.
             desired_align = WD_ALIGN_PARAGRAPH.JUSTIFY
-            print("[DEBUG] Fallback for Body/Other: JUSTIFY.")
+            log.debug("Fallback for Body/Other: JUSTIFY.")
     st.paragraph_format.alignment = desired_align
-    print(f"[DEBUG] Set style '{style_name}' alignment to {desired_align}.")
+    log.debug("Set style '%s' alignment to %s.", style_name, desired_align)
 
     # Ensure RTL on the style (w:pPr/w:bidi)
     pPr = st.element.get_or_add_pPr()
@@ -161,7 +247,7 @@ def set_style_bidi_and_alignment(doc: Document, style_name: str, style_json: dic
         bidi = OxmlElement("w:bidi")
         pPr.append(bidi)
     bidi.set(qn("w:val"), "1")
-    print(f"[DEBUG] Ensured RTL (w:bidi=1) for style '{style_name}'.")
+    log.debug("Ensured RTL (w:bidi=1) for style '%s'.", style_name)
 
     # Ensure run language fa-IR on style rPr
     rPr = st.element.get_or_add_rPr()
@@ -171,33 +257,35 @@ def set_style_bidi_and_alignment(doc: Document, style_name: str, style_json: dic
         rPr.append(lang)
     lang.set(qn("w:bidi"), "fa-IR")
     lang.set(qn("w:val"), "fa-IR")
-    print(f"[DEBUG] Ensured language fa-IR for style '{style_name}'.")
+    log.debug("Ensured language fa-IR for style '%s'.", style_name)
 
+@profiling.traced("build_docx.apply_styles_from_json")
 def apply_styles_from_json(doc: Document):
-    print("[DEBUG] Entering apply_styles_from_json.")
+    log.debug("Entering apply_styles_from_json.")
     # Apply to Normal + Headings + common styles if present in STYLE_SPEC
     targets = set(["Normal", "List Paragraph", "Header", "Footer"])
     targets.update([f"Heading {i}" for i in range(1, 10)])
-    print(f"[DEBUG] Target styles to process: {targets}")
+    log.debug("Target styles to process: %s", targets)
     for name in targets:
         spec = STYLE_SPEC.get(name, {})
-        print(f"[DEBUG] Processing target style '{name}' with spec from JSON: {spec != {}}")
+        log.debug("Processing target style '%s' with spec from JSON: %s", name, spec != {})
         set_style_bidi_and_alignment(doc, name, spec)
-    print("[DEBUG] Finished apply_styles_from_json.")
+    log.debug("Finished apply_styles_from_json.")
 
 # ---------- Numbering: force RTL & fa-IR at levels ----------
+@profiling.traced("build_docx.ensure_numbering_rtl")
 def ensure_numbering_rtl(doc: Document):
-    print("[DEBUG] Entering ensure_numbering_rtl.")
+    log.debug("Entering ensure_numbering_rtl.")
     numpart = getattr(doc.part, "numbering_part", None)
     if numpart is None:
-        print("[DEBUG] No numbering part found in document. Skipping.")
+        log.debug("No numbering part found in document. Skipping.")
         return
     root = numpart.element
     # For each level, set pPr/jc=right and rPr/lang bidi=fa-IR
     levels_found = root.findall(".//w:lvl", namespaces=root.nsmap)
-    print(f"[DEBUG] Found {len(levels_found)} numbering levels to process.")
+    log.debug("Found %s numbering levels to process.", len(levels_found))
     for i, lvl in enumerate(levels_found):
-        print(f"[DEBUG] Processing level {i+1}...")
+        log.debug("Processing level %s...", i+1)
         # pPr/jc
         pPr = lvl.find("./w:pPr", namespaces=root.nsmap)
         if pPr is None:
@@ -208,7 +296,7 @@ def ensure_numbering_rtl(doc: Document):
             jc = OxmlElement("w:jc")
             pPr.append(jc)
         jc.set(qn("w:val"), "right")
-        print("[DEBUG] Set numbering level alignment to 'right'.")
+        log.debug("Set numbering level alignment to 'right'.")
 
         # rPr/lang
         rPr = lvl.find("./w:rPr", namespaces=root.nsmap)
@@ -221,232 +309,344 @@ def ensure_numbering_rtl(doc: Document):
             rPr.append(lang)
         lang.set(qn("w:bidi"), "fa-IR")
         lang.set(qn("w:val"), "fa-IR")
-        print("[DEBUG] Set numbering level language to 'fa-IR'.")
-    print("[DEBUG] Finished ensure_numbering_rtl.")
+        log.debug("Set numbering level language to 'fa-IR'.")
+    log.debug("Finished ensure_numbering_rtl.")
 
 # ---------- Content helpers (use document styles, not JSON names) ----------
 
-def add_para(doc, text, style_name="Normal"):
-    print(f"[DEBUG] Entering add_para with style '{style_name}', text: {ascii(text[:50])}...")
-    final_style_name = safe_style(doc, style_name)
-    print(f"[DEBUG] Resolved style for add_para: '{final_style_name}'")
-    p = doc.add_paragraph(text, style=final_style_name)
+def para_style(doc, style_name="Normal"):
+    st = resolve_style(doc, style_name)
+    log.debug("Resolved style for add_para: '%s'", st.name)
     # Use the style's alignment unless JSON dictates otherwise
-    json_style = STYLE_SPEC.get(final_style_name, {})
-    align = parse_alignment(json_style.get("alignment"))
-    set_paragraph_rtl(p, align)
-    for r in p.runs:
-        set_run_lang(r)
-    return p
+    return st, style_table(doc).alignment(st)
 
-def add_heading(doc, text, level=1):
-    print(f"[DEBUG] Entering add_heading with level {level}, text: {ascii(text[:50])}...")
-    style_name = f"Heading {level}"
-    final_style_name = safe_style(doc, style_name)
-    print(f"[DEBUG] Resolved style for add_heading: '{final_style_name}'")
-    p = doc.add_paragraph(text, style=final_style_name)
+def heading_style(doc, level=1, style_name=None):
+    st = resolve_style(doc, style_name or f"Heading {level}")
+    log.debug("Resolved style for add_heading: '%s'", st.name)
     # Headings default to RIGHT unless JSON says otherwise
-    json_style = STYLE_SPEC.get(final_style_name, {})
-    align = parse_alignment(json_style.get("alignment")) or WD_ALIGN_PARAGRAPH.RIGHT
-    print(f"[DEBUG] Alignment for heading: {align}")
-    set_paragraph_rtl(p, align)
-    for r in p.runs:
-        set_run_lang(r)
-    return p
+    align = style_table(doc).alignment(st) or WD_ALIGN_PARAGRAPH.RIGHT
+    log.debug("Alignment for heading: %s", align)
+    return st, align
 
-def add_list_item(doc, text, list_type="ol", meta=None):
-    print(f"[DEBUG] Entering add_list_item for type '{list_type}', text: {ascii(text[:50])}...")
-    style_map = (meta or {}).get("listStyleMap", {})
-    desired = style_map.get(list_type)
-    print(f"[DEBUG] Desired list style from map: '{desired}'")
+def list_style(doc, list_type="ol", meta=None, desired=None):
+    desired = desired or (meta or {}).get("listStyleMap", {}).get(list_type)
+    log.debug("Desired list style from map: '%s'", desired)
 
     # fallbacks if style not mapped or missing in template
     if not desired:
         desired = "List Paragraph" if list_type == "ol" else "Bulet"
-        print(f"[DEBUG] No desired style, falling back to '{desired}'")
-
-    style_name = desired if style_exists(doc, desired) else (
-        "List Paragraph" if style_exists(doc, "List Paragraph") else safe_style(doc, "Normal")
-    )
-    print(f"[DEBUG] Final resolved list style: '{style_name}'")
-
-    p = doc.add_paragraph(text, style=style_name)
+        log.debug("No desired style, falling back to '%s'", desired)
 
+    table = style_table(doc)
+    st = table.get(desired) or table.get("List Paragraph") or resolve_style(doc, "Normal")
+    log.debug("Final resolved list style: '%s'", st.name)
     # alignment from JSON (if any), else leave style's alignment
-    json_style = STYLE_SPEC.get(style_name, {}) if "STYLE_SPEC" in globals() else {}
-    align = parse_alignment(json_style.get("alignment"))
-    set_paragraph_rtl(p, align)
+    return st, table.alignment(st)
 
+def _add_styled(doc, text, st, align):
+    p = doc.add_paragraph(text)
+    set_style(doc, p, st)
+    set_paragraph_rtl(p, align)
     for r in p.runs:
         set_run_lang(r)
     return p
+
+def add_para(doc, text, style_name="Normal"):
+    log.debug("Entering add_para with style '%s', text: %.50a...", style_name, text)
+    return _add_styled(doc, text, *para_style(doc, style_name))
+
+def add_heading(doc, text, level=1, style_name=None):
+    log.debug("Entering add_heading with level %s, text: %.50a...", level, text)
+    return _add_styled(doc, text, *heading_style(doc, level, style_name))
+
+def add_list_item(doc, text, list_type="ol", meta=None, style_name=None):
+    log.debug("Entering add_list_item for type '%s', text: %.50a...", list_type, text)
+    return _add_styled(doc, text, *list_style(doc, list_type, meta, style_name))
+
+# ---------- Emitters: how write_section / write_subsection put paragraphs in the body ----------
+
+class DocEmitter:
+    """Default emitter: one python-docx paragraph at a time (add_para & co)."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.image_pipeline = None
+
+    def para(self, text, style_name="Normal"):
+        return add_para(self.doc, text, style_name=style_name)
+
+    def heading(self, text, level=1, style_name=None):
+        return add_heading(self.doc, text, level=level, style_name=style_name)
+
+    def list_item(self, text, list_type="ol", meta=None, style_name=None):
+        return add_list_item(self.doc, text, list_type=list_type, meta=meta, style_name=style_name)
+
+    def image(self, path, style_name=None):
+        self.flush()
+        if self.image_pipeline is None:
+            import images
+            self.image_pipeline = images.ImagePipeline()
+        p = add_para(self.doc, "", style_name=style_name or "Normal")
+        self.image_pipeline.add_picture(p.add_run(), path)
+        return p
+
+    def section_break(self, start="oddPage", header=None, footer=None):
+        self.flush()
+        start_type = WD_SECTION.ODD_PAGE if start == "oddPage" else WD_SECTION.NEW_PAGE
+        log.debug("Adding new section with break type: %s (%s)", start, start_type)
+        section = self.doc.add_section(start_type=start_type)
+        if header:
+            log.debug("Applying header configuration.")
+            apply_header_footer_specific(self.doc, section, header, is_header=True)
+        if footer:
+            log.debug("Applying footer configuration.")
+            apply_header_footer_specific(self.doc, section, footer, is_header=False)
+        return section
+
+    def emit(self, blocks):
+        """Put IR blocks (ir.py) into the document; a style of None takes the block's default."""
+        for b in blocks:
+            t = type(b)
+            if t is ir.Para or t is ir.Caption:
+                self.para(b.text, style_name=b.style or "Normal")
+            elif t is ir.Heading:
+                self.heading(b.text, level=b.level, style_name=b.style)
+            elif t is ir.ListItem:
+                self.list_item(b.text, list_type=b.kind or "ol", style_name=b.style)
+            elif t is ir.Image:
+                self.image(b.path, style_name=b.style)
+            elif t is ir.SectionBreak:
+                self.section_break(b.start, b.header, b.footer)
+            else:
+                raise TypeError(f"Unknown block {b!r}")
+
+    def flush(self):
+        pass
+
+class FastEmitter(DocEmitter):
+    """
+    Builds finished w:p subtrees directly. The pPr (pStyle, bidi, jc) and the run's
+    rPr (lang fa-IR) are produced once per (style, alignment) by the regular helpers
+    on a detached paragraph, then deep-copied per paragraph. Paragraphs are queued
+    and appended to the body in batches, ahead of the body's final sectPr.
+
+    Output is the same XML add_para/add_heading/add_list_item produce. Call flush()
+    before touching the document through python-docx again (add_section, save, ...).
+    """
+
+    def __init__(self, doc, batch_size=512):
+        super().__init__(doc)
+        self.batch_size = batch_size
+        self.pending = []
+        self.templates = {}
+
+    def _template(self, st, align):
+        key = (st.style_id, align)
+        tpl = self.templates.get(key)
+        if tpl is None:
+            p = Paragraph(OxmlElement("w:p"), self.doc._body)
+            set_style(self.doc, p, st)
+            set_paragraph_rtl(p, align)
+            bare = deepcopy(p._p)                 # empty text -> no run, as in add_paragraph("")
+            set_run_lang(p.add_run())
+            tpl = self.templates[key] = (bare, p._p)
+        return tpl
+
+    def _emit(self, text, st, align):
+        bare, with_run = self._template(st, align)
+        if not text:
+            p = deepcopy(bare)
+        else:
+            p = deepcopy(with_run)
+            r = p[-1]
+            if _RUN_SPECIAL_CHARS.isdisjoint(text):
+                r.add_t(text)
+            else:
+                r.text = text                     # tabs / line breaks -> w:tab / w:br
+        self.pending.append(p)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return p
+
+    def para(self, text, style_name="Normal"):
+        return self._emit(text, *para_style(self.doc, style_name))
+
+    def heading(self, text, level=1, style_name=None):
+        return self._emit(text, *heading_style(self.doc, level, style_name))
+
+    def list_item(self, text, list_type="ol", meta=None, style_name=None):
+        return self._emit(text, *list_style(self.doc, list_type, meta, style_name))
+
+    def flush(self):
+        if not self.pending:
+            return
+        body = self.doc.element.body
+        sectPr = body.find(qn("w:sectPr"))
+        if sectPr is None:
+            body.extend(self.pending)
+        else:
+            for p in self.pending:
+                sectPr.addprevious(p)
+        log.debug("Flushed %s paragraphs to the body.", len(self.pending))
+        self.pending = []
+
+_RUN_SPECIAL_CHARS = frozenset("\t\n\r")
+
 def clear_paragraphs(container):
-    print(f"[DEBUG] Entering clear_paragraphs for a container (e.g., header/footer).")
+    log.debug("Entering clear_paragraphs for a container (e.g., header/footer).")
     # Remove all existing paragraphs from header/footer to avoid mixed formatting
-    num_paras = len(list(container.paragraphs))
-    for p in list(container.paragraphs):
+    paras = list(container.paragraphs)
+    for p in paras:
         p._element.getparent().remove(p._element)
-    print(f"[DEBUG] Removed {num_paras} paragraphs.")
+    log.debug("Removed %s paragraphs.", len(paras))
 
 def apply_header_footer(doc, section, cfg):
-    print("[DEBUG] Entering apply_header_footer.")
+    log.debug("Entering apply_header_footer.")
     # header
     if cfg.get("enabled"):
-        print("[DEBUG] Header is enabled.")
+        log.debug("Header is enabled.")
         hdr = section.header
         clear_paragraphs(hdr)
         desired_align = parse_alignment(cfg.get("align")) or WD_ALIGN_PARAGRAPH.RIGHT
-        print(f"[DEBUG] Header alignment: {desired_align}")
+        log.debug("Header alignment: %s", desired_align)
         for i, rn in enumerate(cfg.get("runs", [])):
-            print(f"[DEBUG] Processing header run {i+1}...")
-            p = hdr.add_paragraph(style=safe_style(doc, rn.get("style", "Header")))
+            log.debug("Processing header run %s...", i+1)
+            p = hdr.add_paragraph()
+            set_style(doc, p, resolve_style(doc, rn.get("style", "Header")))
             set_paragraph_rtl(p, desired_align)
             if "text" in rn:
-                print(f"[DEBUG] Adding header text: {ascii(rn['text'])}")
+                log.debug("Adding header text: %a", rn['text'])
                 set_run_lang(p.add_run(rn["text"]))
             if rn.get("field") == "pageNumber":
-                print("[DEBUG] Adding page number field to header.")
+                log.debug("Adding page number field to header.")
                 add_field_simple(p, "PAGE")
 
     # footer
     if cfg.get("enabled"):
-        print("[DEBUG] Footer is enabled.")
+        log.debug("Footer is enabled.")
         ftr = section.footer
         clear_paragraphs(ftr)
         desired_align = parse_alignment(cfg.get("align")) or WD_ALIGN_PARAGRAPH.RIGHT
-        print(f"[DEBUG] Footer alignment: {desired_align}")
+        log.debug("Footer alignment: %s", desired_align)
         for i, rn in enumerate(cfg.get("runs", [])):
-            print(f"[DEBUG] Processing footer run {i+1}...")
-            p = ftr.add_paragraph(style=safe_style(doc, rn.get("style", "Footer")))
+            log.debug("Processing footer run %s...", i+1)
+            p = ftr.add_paragraph()
+            set_style(doc, p, resolve_style(doc, rn.get("style", "Footer")))
             set_paragraph_rtl(p, desired_align)
             if "text" in rn:
-                print(f"[DEBUG] Adding footer text: {ascii(rn['text'])}")
+                log.debug("Adding footer text: %a", rn['text'])
                 set_run_lang(p.add_run(rn["text"]))
             if rn.get("field") == "pageNumber":
-                print("[DEBUG] Adding page number field to footer.")
+                log.debug("Adding page number field to footer.")
                 add_field_simple(p, "PAGE")
 
-def write_section(doc, meta, node):
-    print("[DEBUG] Entering write_section.")
-    sect_cfg = node.get("section") or {}
-    break_kind = sect_cfg.get("break", "oddPage")
-    start_type = WD_SECTION.ODD_PAGE if break_kind == "oddPage" else WD_SECTION.NEW_PAGE
-    print(f"[DEBUG] Adding new section with break type: {break_kind} ({start_type})")
-    section = doc.add_section(start_type=start_type)
-
-    # Note: The original code had a bug applying header config to footer. Correcting it.
-    header_cfg = node.get("header", {})
-    if header_cfg:
-        print("[DEBUG] Applying header configuration.")
-        apply_header_footer_specific(doc, section, header_cfg, is_header=True)
-
-    footer_cfg = node.get("footer", {})
-    if footer_cfg:
-        print("[DEBUG] Applying footer configuration.")
-        apply_header_footer_specific(doc, section, footer_cfg, is_header=False)
-
-
-    ch = node.get("chapter")
-    if ch:
-        print(f"[DEBUG] Writing chapter: {ascii(ch.get('title', 'Untitled'))}")
-        add_heading(doc, ch["title"], level=1)
-        for i, par in enumerate(ch.get("intro", [])):
-            print(f"[DEBUG] Writing intro paragraph {i+1}.")
-            # allow both {"text": "..."} or plain strings in your content JSON
-            text = par.get("text") if isinstance(par, dict) else str(par)
-            add_para(doc, text, style_name=meta.get("defaultParagraphStyle", "Normal"))
-        for i, sec in enumerate(ch.get("sections", [])):
-            print(f"[DEBUG] Writing chapter subsection {i+1}.")
-            write_subsection(doc, meta, sec)
-    print("[DEBUG] Finished write_section.")
+@profiling.traced("build_docx.write_section")
+def write_section(doc, meta, node, emitter=None):
+    log.debug("Entering write_section.")
+    out = emitter or DocEmitter(doc)
+    blocks = ir.lower_section(node, meta)
+    log.debug("Lowered section to %s blocks.", len(blocks))
+    out.emit(blocks)
+    out.flush()
+    log.debug("Finished write_section.")
+
+def write_section_stream(doc, fp, emitter=None):
+    """write_section for a content JSON read incrementally from `fp` (json_stream)."""
+    import json_stream
+    out = emitter or DocEmitter(doc)
+    out.emit(json_stream.stream_section(fp))
+    out.flush()
 
 def apply_header_footer_specific(doc, section, cfg, is_header):
     """A corrected helper to apply config to either header or footer."""
-    print(f"[DEBUG] Entering apply_header_footer_specific for {'header' if is_header else 'footer'}.")
+    log.debug("Entering apply_header_footer_specific for %s.", 'header' if is_header else 'footer')
     if cfg.get("enabled"):
         container = section.header if is_header else section.footer
         default_style = "Header" if is_header else "Footer"
-        print(f"[DEBUG] {'Header' if is_header else 'Footer'} is enabled.")
+        log.debug("%s is enabled.", 'Header' if is_header else 'Footer')
         clear_paragraphs(container)
         desired_align = parse_alignment(cfg.get("align")) or WD_ALIGN_PARAGRAPH.RIGHT
-        print(f"[DEBUG] Alignment: {desired_align}")
+        log.debug("Alignment: %s", desired_align)
         for i, rn in enumerate(cfg.get("runs", [])):
-            print(f"[DEBUG] Processing run {i+1}...")
-            p = container.add_paragraph(style=safe_style(doc, rn.get("style", default_style)))
+            log.debug("Processing run %s...", i+1)
+            p = container.add_paragraph()
+            set_style(doc, p, resolve_style(doc, rn.get("style", default_style)))
             set_paragraph_rtl(p, desired_align)
             if "text" in rn:
-                print(f"[DEBUG] Adding text: {ascii(rn['text'])}")
+                log.debug("Adding text: %a", rn['text'])
                 set_run_lang(p.add_run(rn["text"]))
             if rn.get("field") == "pageNumber":
-                print("[DEBUG] Adding page number field.")
+                log.debug("Adding page number field.")
                 add_field_simple(p, "PAGE")
 
-def write_subsection(doc, meta, sec):
-    level = sec.get("level", 2)
-    print(f"[DEBUG] Entering write_subsection for level {level}, title: {ascii(sec.get('title', 'Untitled'))}")
-    add_heading(doc, sec["title"], level=level)
-    for i, node in enumerate(sec.get("content", [])):
-        print(f"[DEBUG] Processing content node {i+1} in subsection.")
-        if isinstance(node, dict) and "text" in node:
-            print("[DEBUG] Content node is a paragraph.")
-            add_para(doc, node["text"], style_name=meta.get("defaultParagraphStyle", "Normal"))
-        elif isinstance(node, dict) and "list" in node:
-            print("[DEBUG] Content node is a list.")
-            for j, item in enumerate(node["list"].get("items", [])):
-                print(f"[DEBUG] Adding list item {j+1}.")
-                itxt = item.get("text") if isinstance(item, dict) else str(item)
-                add_list_item(doc, itxt, list_type=node["list"].get("type", "ol"), meta=meta)
-        elif isinstance(node, str):
-            print("[DEBUG] Content node is a plain string paragraph.")
-            add_para(doc, node, style_name=meta.get("defaultParagraphStyle", "Normal"))
-    for i, sub in enumerate(sec.get("sections", [])):
-        print(f"[DEBUG] Writing nested subsection {i+1}.")
-        write_subsection(doc, meta, sub)
-    print("[DEBUG] Finished write_subsection.")
+def write_subsection(doc, meta, sec, emitter=None):
+    log.debug("Entering write_subsection for level %s, title: %a", sec.get("level", 2), sec.get('title', 'Untitled'))
+    (emitter or DocEmitter(doc)).emit(ir.lower_subsection(sec, meta))
 
 # ---------- Main ----------
 
 if __name__ == "__main__":
-    print("[DEBUG] Script started.")
-    if len(sys.argv) < 4:
-        print("Usage: python build_docx.py <styles.json> <content.json> <out.docx>")
-        sys.exit(1)
-
-    style_path = Path(sys.argv[1])
-    content_path = Path(sys.argv[2])
-    out_path = Path(sys.argv[3])
-    print(f"[DEBUG] Style path: {style_path}")
-    print(f"[DEBUG] Content path: {content_path}")
-    print(f"[DEBUG] Output path: {out_path}")
-
-    load_styles(style_path)
-    print("[DEBUG] Loading content JSON...")
-    spec = json.loads(content_path.read_text(encoding="utf-8"))
-    print("[DEBUG] Content JSON loaded.")
+    ap = argparse.ArgumentParser(description="Build a Persian (RTL) .docx from a style spec and a content JSON.")
+    ap.add_argument("styles_json")
+    ap.add_argument("content_json")
+    ap.add_argument("output_docx")
+    ap.add_argument("--fast", action="store_true",
+                    help="Emit body paragraphs from prebuilt XML templates in batches (same output, less overhead)")
+    ap.add_argument("--stream", action="store_true",
+                    help="Read the content JSON incrementally instead of loading it whole (for very large files)")
+    logconfig.add_arguments(ap)
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+    logconfig.configure_from_args(args)
+    profiling.configure_from_args(args)
+    log.debug("Script started.")
+
+    style_path = Path(args.styles_json)
+    content_path = Path(args.content_json)
+    out_path = Path(args.output_docx)
+    log.debug("Style path: %s", style_path)
+    log.debug("Content path: %s", content_path)
+    log.debug("Output path: %s", out_path)
+
+    with profiling.span("build_docx.load_inputs"):
+        load_styles(style_path)
+        if not args.stream:
+            log.debug("Loading content JSON...")
+            spec = json.loads(content_path.read_text(encoding="utf-8"))
+            log.debug("Content JSON loaded.")
 
     # Open a seed docx if provided (recommended: a .docx saved from your .dotx)
     # tmpl = spec.get("meta", {}).get("template")
     # if tmpl and Path(tmpl).is_file():
-    #     print(f"[DEBUG] Loading the Template Document from: {tmpl}")
+    #     log.debug("Loading the Template Document from: %s", tmpl)
     #     doc = Document(tmpl)
     # else:
-    print("[DEBUG] Creating new blank Document.")
-    doc = Document()
+    log.debug("Creating new blank Document.")
+    with profiling.span("build_docx.template"):
+        doc = Document()
 
     # Apply JSON style intentions to the actual document styles
-    print("[DEBUG] Starting to apply styles from JSON to document.")
+    log.debug("Starting to apply styles from JSON to document.")
     apply_styles_from_json(doc)
 
     # Make multilevel numbering RTL + fa-IR at all levels
-    print("[DEBUG] Starting to ensure numbering is RTL.")
+    log.debug("Starting to ensure numbering is RTL.")
     ensure_numbering_rtl(doc)
 
     # Build content
-    print("[DEBUG] Starting to build content from spec.")
+    log.debug("Starting to build content from spec.")
     # The root of the spec is treated as the first section's content
-    write_section(doc, spec.get("meta", {}), spec)
+    emitter = FastEmitter(doc) if args.fast else None
+    with profiling.span("build_docx.emit", doc=doc):
+        if args.stream:
+            with open(content_path, "r", encoding="utf-8") as f:
+                write_section_stream(doc, f, emitter=emitter)
+        else:
+            write_section(doc, spec.get("meta", {}), spec, emitter=emitter)
 
-    print(f"[DEBUG] Saving document to {out_path}...")
-    doc.save(out_path)
+    log.debug("Saving document to %s...", out_path)
+    with profiling.span("build_docx.save"):
+        doc.save(out_path)
+    profiling.record_file(str(out_path))
     print(f"Wrote {out_path}")
-    print("[DEBUG] Script finished.")
+    log.debug("Script finished.")
@@ -0,0 +1,412 @@
+# compose.py
+# pip install python-docx
+#
+# Append whole documents (front matter, chapters, appendices) to a base document:
+#
+#   python compose.py thesis.docx front.docx ch01.docx ch02.docx ... appendix.docx
+#
+#   master = open_docx("front.docx")
+#   composer = Composer(master)
+#   composer.append("ch01.docx")          # a path, or a Document (whose body is moved)
+#   save_docx(master, "thesis.docx")
+#
+# An appended document keeps its sections. The master's last section is closed by a
+# section break, the appended blocks follow, and the appended document's final
+# w:sectPr closes them. The header/footer parts its sections reference come along.
+# A header or footer type that a section does not define is inherited from the
+# section before it, as in Word.
+#
+# What the appended XML refers to is brought into the master:
+#   styles     by style ID: an ID the master has is used as it is, so the master's
+#              definition wins. A style whose ID the master lacks but whose name it
+#              has (localized Word IDs) maps to the master's style. Any other style
+#              is copied, with its basedOn / next / link chain.
+#   numbering  each w:num used (body, copied styles, headers, footers, notes) gets a
+#              new numId; its w:abstractNum is copied once under a new id and nsid.
+#              Lists stay separate instances, as they were in the source. A master
+#              without word/numbering.xml gets an empty one first.
+#   relations  images are stored once per package (by content hash); headers,
+#              footers and other parts are copied under fresh part names; every
+#              r:id / r:embed / ... is rewritten.
+#   notes      footnotes and endnotes are appended to the master's with new ids.
+#   ids        bookmark ids, clashing bookmark names and drawing ids (BodyIds).
+# Comments are dropped (their anchors are removed); document defaults, theme,
+# settings and fonts are the master's.
+
+from copy import deepcopy
+from typing import Dict, List, Optional, Union
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.part import Part, PartFactory, XmlPart
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, nsmap, qn
+from docx.parts.image import ImagePart
+from docx.parts.numbering import NumberingPart
+from lxml import etree
+import argparse, re, time, zlib
+
+import profiling
+from docxzip import open_docx, save_docx
+
+_W_VAL, _W_ID, _W_NAME = qn("w:val"), qn("w:id"), qn("w:name")
+_W_STYLE, _W_STYLE_ID = qn("w:style"), qn("w:styleId")
+_W_NUM, _W_NUM_ID = qn("w:num"), qn("w:numId")
+_W_ABSTRACT, _W_ABSTRACT_ID = qn("w:abstractNum"), qn("w:abstractNumId")
+_W_SECTPR = qn("w:sectPr")
+_W_BOOKMARKS = (qn("w:bookmarkStart"), qn("w:bookmarkEnd"))
+_STYLE_REFS = (qn("w:pStyle"), qn("w:rStyle"), qn("w:tblStyle"))
+_STYLE_LINKS = (qn("w:basedOn"), qn("w:next"), qn("w:link"))
+_NUM_STYLE_REFS = (qn("w:pStyle"), qn("w:numStyleLink"), qn("w:styleLink"))
+_COMMENT_TAGS = (qn("w:commentRangeStart"), qn("w:commentRangeEnd"), qn("w:commentReference"))
+_NOTES = ((RT.FOOTNOTES, qn("w:footnote"), qn("w:footnoteReference")),
+          (RT.ENDNOTES, qn("w:endnote"), qn("w:endnoteReference")))
+_R_ATTRS = etree.XPath(".//@r:*", namespaces={"r": nsmap["r"]})
+
+# ----------------- shared with incremental_build -----------------
+
+def partname_template(partname: str) -> str:
+    """/word/header3.xml -> /word/header%d.xml (for OpcPackage.next_partname)."""
+    return re.sub(r"\d*(\.\w+)$", r"%d\1", partname)
+
+def append_section(body, blocks: List, sect_pr=None):
+    """
+    Close `body`'s last section with a section break and append `blocks` after it;
+    `sect_pr`, the appended content's final w:sectPr, then governs the last of them.
+    """
+    sentinel = body.add_section_break()
+    for el in blocks:
+        sentinel.addprevious(el)
+    if sect_pr is not None:
+        body.replace(sentinel, sect_pr)
+
+class BodyIds:
+    """Bookmark ids and names and drawing ids in use in a body; renumbers appended content into it."""
+
+    def __init__(self, body):
+        self.bookmark = max(map(int, body.xpath(".//w:bookmarkStart/@w:id")), default=-1) + 1
+        self.names = set(body.xpath(".//w:bookmarkStart/@w:name"))
+        self.drawing = max(map(int, body.xpath(".//wp:docPr/@id")), default=0) + 1
+
+    def renumber(self, container):
+        ids: Dict[str, str] = {}
+        renamed: Dict[str, str] = {}
+        for el in container.iter(*_W_BOOKMARKS):
+            old = el.get(_W_ID)
+            new = ids.get(old)
+            if new is None:
+                new = ids[old] = str(self.bookmark)
+                self.bookmark += 1
+            el.set(_W_ID, new)
+            name = el.get(_W_NAME)
+            if name is None:
+                continue
+            if name in self.names:
+                n = 2
+                while f"{name}_{n}" in self.names: n += 1
+                renamed[name] = f"{name}_{n}"
+                el.set(_W_NAME, renamed[name])
+            self.names.add(el.get(_W_NAME))
+        if renamed:
+            # links and REF/PAGEREF fields in the appended content point at its own bookmarks
+            for el in container.iter(qn("w:hyperlink")):
+                anchor = el.get(qn("w:anchor"))
+                if anchor in renamed:
+                    el.set(qn("w:anchor"), renamed[anchor])
+            for el in container.iter(qn("w:instrText")):
+                if el.text:
+                    el.text = " ".join(renamed.get(t, t) for t in el.text.split(" "))
+        for el in container.iter(qn("wp:docPr")):
+            el.set("id", str(self.drawing))
+            self.drawing += 1
+
+# ----------------- parts -----------------
+
+def related_part(part, reltype: str) -> Optional[Part]:
+    """The part `part` relates to by `reltype`, without creating one (unlike python-docx's accessors)."""
+    try:
+        return part.part_related_by(reltype)
+    except KeyError:
+        return None
+
+def numbering_part(doc: DocumentObject) -> NumberingPart:
+    """The document's numbering part, added empty if it has none (python-docx cannot create one)."""
+    part = related_part(doc.part, RT.NUMBERING)
+    if part is None:
+        package = doc.part.package
+        taken = {str(p.partname) for p in package.iter_parts()}
+        partname = "/word/numbering.xml"
+        if partname in taken:
+            partname = str(package.next_partname("/word/numbering%d.xml"))
+        part = NumberingPart(PackURI(partname), CT.WML_NUMBERING,
+                             parse_xml(f"<w:numbering {nsdecls('w')}/>"), package)
+        doc.part.relate_to(part, RT.NUMBERING)
+    return part
+
+def part_xml(part):
+    """The root element of an XML part; python-docx keeps some (notes, charts) as a blob only."""
+    return part.element if isinstance(part, XmlPart) else parse_xml(part.blob)
+
+def store_xml(part, root):
+    if not isinstance(part, XmlPart):
+        part._blob = serialize_part_xml(root)
+
+# ----------------- one appended document -----------------
+
+class _Import:
+    """Maps for one source document: its style IDs, numIds and parts, as they are in the master."""
+
+    def __init__(self, composer: "Composer", source: DocumentObject):
+        self.composer = composer
+        self.source = source
+        self.package = composer.doc.part.package
+        self.styles: Dict[str, str] = {}
+        self.nums: Dict[str, str] = {}
+        self.abstracts: Dict[str, str] = {}
+        self.parts: Dict[int, Part] = {}
+        styles_part = related_part(source.part, RT.STYLES)
+        self.src_styles = ({s.get(_W_STYLE_ID): s for s in styles_part.element.iterchildren(_W_STYLE)}
+                           if styles_part is not None else {})
+        numbering_part = related_part(source.part, RT.NUMBERING)
+        numbering = numbering_part.element if numbering_part is not None else None
+        self.src_nums = {n.get(_W_NUM_ID): n for n in numbering.iterchildren(_W_NUM)} if numbering is not None else {}
+        self.src_abstracts = ({a.get(_W_ABSTRACT_ID): a for a in numbering.iterchildren(_W_ABSTRACT)}
+                              if numbering is not None else {})
+        self.next_num = self.next_abstract = None
+
+    # ----- styles -----
+
+    def style(self, sid: str) -> str:
+        hit = self.styles.get(sid)
+        if hit is not None:
+            return hit
+        c = self.composer
+        src = self.src_styles.get(sid)
+        if sid in c.style_ids or src is None:
+            self.styles[sid] = sid
+            return sid
+        name = src.find(_W_NAME)
+        same = c.style_names.get(name.get(_W_VAL)) if name is not None else None
+        if same is not None:
+            self.styles[sid] = same
+            return same
+        self.styles[sid] = sid      # before following basedOn/next, which may lead back here
+        el = deepcopy(src)
+        c.styles_element.append(el)
+        c.style_ids[sid] = el
+        if name is not None:
+            c.style_names[name.get(_W_VAL)] = sid
+        for link in el.iter(*_STYLE_LINKS):
+            link.set(_W_VAL, self.style(link.get(_W_VAL)))
+        for num in el.iter(_W_NUM_ID):
+            num.set(_W_VAL, self.num(num.get(_W_VAL)))
+        return sid
+
+    # ----- numbering -----
+
+    def _numbering(self):
+        el = numbering_part(self.composer.doc).element
+        if self.next_num is None:
+            self.next_num = max((int(n.get(_W_NUM_ID)) for n in el.iterchildren(_W_NUM)), default=0) + 1
+            self.next_abstract = max((int(a.get(_W_ABSTRACT_ID)) for a in el.iterchildren(_W_ABSTRACT)),
+                                     default=-1) + 1
+        return el
+
+    def num(self, num_id: str) -> str:
+        hit = self.nums.get(num_id)
+        if hit is not None:
+            return hit
+        src = self.src_nums.get(num_id)
+        if src is None:        # "0" (numbering removed) or a dangling reference
+            self.nums[num_id] = num_id
+            return num_id
+        numbering = self._numbering()
+        new = self.nums[num_id] = str(self.next_num)
+        self.next_num += 1
+        el = deepcopy(src)
+        el.set(_W_NUM_ID, new)
+        ref = el.find(_W_ABSTRACT_ID)
+        if ref is not None:
+            ref.set(_W_VAL, self.abstract(ref.get(_W_VAL)))
+        numbering.append(el)
+        return new
+
+    def abstract(self, abstract_id: str) -> str:
+        hit = self.abstracts.get(abstract_id)
+        if hit is not None:
+            return hit
+        src = self.src_abstracts.get(abstract_id)
+        if src is None:
+            self.abstracts[abstract_id] = abstract_id
+            return abstract_id
+        numbering = self._numbering()
+        new = self.abstracts[abstract_id] = str(self.next_abstract)
+        self.next_abstract += 1
+        el = deepcopy(src)
+        el.set(_W_ABSTRACT_ID, new)
+        nsid = el.find(qn("w:nsid"))
+        if nsid is not None:
+            # Word treats abstractNums sharing an nsid as one list
+            nsid.set(_W_VAL, f"{zlib.crc32(f'{nsid.get(_W_VAL)}|{new}'.encode()):08X}")
+        for ref in el.iter(*_NUM_STYLE_REFS):
+            ref.set(_W_VAL, self.style(ref.get(_W_VAL)))
+        first_num = numbering.find(_W_NUM)     # every w:abstractNum precedes the w:nums
+        if first_num is not None:
+            first_num.addprevious(el)
+        else:
+            numbering.append(el)
+        return new
+
+    # ----- relationships -----
+
+    def copy_part(self, src: Part) -> Part:
+        part = self.parts.get(id(src))
+        if part is not None:
+            return part
+        if isinstance(src, ImagePart):
+            part = self.parts[id(src)] = self.composer.image_part(src)
+            return part
+        partname = self.package.next_partname(partname_template(str(src.partname)))
+        if isinstance(src, XmlPart):
+            part = type(src)(partname, src.content_type, deepcopy(src.element), self.package)
+        else:
+            part = PartFactory(partname, src.content_type, "", src.blob, self.package)
+        self.parts[id(src)] = part
+        if isinstance(src, XmlPart) or src.content_type.endswith("xml"):
+            root = part_xml(part)
+            self.import_xml(root, src, part)
+            store_xml(part, root)
+        else:
+            for rId, rel in src.rels.items():
+                target = rel.target_ref if rel.is_external else self.copy_part(rel.target_part)
+                part.rels.add_relationship(rel.reltype, target, rId, rel.is_external)
+        return part
+
+    def import_xml(self, root, src_part: Part, dst_part: Part):
+        """Rewrite `root` (content of `src_part`) in place for its new home in `dst_part`."""
+        for el in root.iter(*_STYLE_REFS):
+            el.set(_W_VAL, self.style(el.get(_W_VAL)))
+        for el in root.iter(_W_NUM_ID):
+            el.set(_W_VAL, self.num(el.get(_W_VAL)))
+        rids: Dict[str, str] = {}
+        for attr in _R_ATTRS(root):
+            old = str(attr)
+            new = rids.get(old)
+            if new is None:
+                rel = src_part.rels.get(old)
+                if rel is None:
+                    continue
+                target = rel.target_ref if rel.is_external else self.copy_part(rel.target_part)
+                new = rids[old] = dst_part.relate_to(target, rel.reltype, is_external=rel.is_external)
+            attr.getparent().set(attr.attrname, new)
+
+    # ----- notes -----
+
+    def import_notes(self, body):
+        c = self.composer
+        for reltype, note_tag, ref_tag in _NOTES:
+            refs = list(body.iter(ref_tag))
+            src_part = related_part(self.source.part, reltype) if refs else None
+            if src_part is None:
+                continue
+            dst_part = related_part(c.doc.part, reltype)
+            if dst_part is None:
+                # the master has no notes of this kind: take the source's part as a whole, ids and all
+                c.doc.part.relate_to(self.copy_part(src_part), reltype)
+                continue
+            src_root = part_xml(src_part)
+            dst_root = c.notes.get(reltype)
+            if dst_root is None:
+                dst_root = c.notes[reltype] = part_xml(dst_part)
+            src_notes = {n.get(_W_ID): n for n in src_root.iterchildren(note_tag)}
+            next_id = max((int(n.get(_W_ID)) for n in dst_root.iterchildren(note_tag)), default=0) + 1
+            ids: Dict[str, str] = {}
+            for ref in refs:
+                old = ref.get(_W_ID)
+                new = ids.get(old)
+                if new is None and old in src_notes:
+                    note = deepcopy(src_notes[old])
+                    self.import_xml(note, src_part, dst_part)
+                    new = ids[old] = str(next_id)
+                    note.set(_W_ID, new)
+                    next_id += 1
+                    dst_root.append(note)
+                if new is not None:
+                    ref.set(_W_ID, new)
+            store_xml(dst_part, dst_root)
+
+# ----------------- composer -----------------
+
+class Composer:
+    """Appends documents to `doc` in place; keeps the master's style and id tables between appends."""
+
+    def __init__(self, doc: DocumentObject):
+        self.doc = doc
+        self.styles_element = doc.styles.element
+        self.style_ids = {s.get(_W_STYLE_ID): s for s in self.styles_element.iterchildren(_W_STYLE)}
+        self.style_names = {}
+        for sid, s in self.style_ids.items():
+            name = s.find(_W_NAME)
+            if name is not None:
+                self.style_names.setdefault(name.get(_W_VAL), sid)
+        self.body_ids = BodyIds(doc.element.body)
+        self.notes: Dict[str, object] = {}      # reltype -> parsed root of a blob-only notes part
+        self.images: Optional[Dict[str, ImagePart]] = None
+
+    def image_part(self, src: ImagePart) -> ImagePart:
+        """The master's part holding `src`'s bytes, created on first use."""
+        # package.get_or_add_image_part hashes every image in the package on each call, and
+        # parses the header, which fails for formats python-docx does not know (WMF, EMF)
+        if self.images is None:
+            self.images = {p.sha1: p for p in self.doc.part.package.iter_parts() if isinstance(p, ImagePart)}
+        sha = src.sha1
+        part = self.images.get(sha)
+        if part is None:
+            partname = self.doc.part.package.next_partname(f"/word/media/image%d.{src.partname.ext}")
+            part = self.images[sha] = ImagePart(partname, src.content_type, src.blob)
+        return part
+
+    def append(self, source: Union[str, DocumentObject]):
+        """Append `source` (a path, or a Document whose body is moved, not copied) as new section(s)."""
+        if isinstance(source, str):
+            source = Document(source)
+        body = source.element.body
+        for el in list(body.iter(*_COMMENT_TAGS)):
+            el.getparent().remove(el)
+        imp = _Import(self, source)
+        imp.import_xml(body, source.part, self.doc.part)
+        imp.import_notes(body)
+        self.body_ids.renumber(body)
+        blocks = list(body)
+        sect_pr = blocks.pop() if blocks and blocks[-1].tag == _W_SECTPR else None
+        append_section(self.doc.element.body, blocks, sect_pr)
+
+def compose(paths: List[str], output: str):
+    """The first document with every following one appended, saved to `output`."""
+    with profiling.span("compose.open"):
+        master = open_docx(paths[0])
+    composer = Composer(master)
+    for path in paths[1:]:
+        with profiling.span("compose.append", path=path):
+            composer.append(path)
+    with profiling.span("compose.save"):
+        save_docx(master, output)
+
+# ----------------- CLI -----------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Append whole .docx files (chapters, appendices) to a base document.")
+    ap.add_argument("output_docx")
+    ap.add_argument("inputs", nargs="+", help="Base document, then the documents to append, in order")
+    profiling.add_arguments(ap)
+    args = ap.parse_args()
+    profiling.configure_from_args(args)
+
+    t0 = time.perf_counter()
+    compose(args.inputs, args.output_docx)
+    print(f"Wrote {args.output_docx}: {len(args.inputs)} documents in {time.perf_counter() - t0:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,546 @@
+# content_spec.py
+# pip install python-docx
+#
+# Up-front validation of content JSON, before any document work starts.
+#
+#   check = compile_schema(schema)          # once; the schema is walked only here
+#   issues = check(data)                    # list of "path: message" strings, [] when valid
+#   issues += check_styles(data, template_styles("template/blank-template.docx"))
+#
+# compile_schema turns a JSON Schema (draft 2020-12) into nested closures, so checking
+# a document is one pass of plain isinstance/dict lookups with no keyword dispatch.
+# Supported keywords: type, enum, const, properties, required, additionalProperties,
+# patternProperties, dependentRequired, items, prefixItems, minItems, maxItems,
+# minLength, maxLength, pattern, minimum, maximum, exclusiveMinimum, exclusiveMaximum,
+# allOf, anyOf, oneOf, not, and local $ref ("#/$defs/..."). Any other assertion keyword
+# raises SchemaError at compile time rather than being silently skipped.
+#
+# Schemas:
+#   doc_spec()         content/persian-doc-spec-1.json (document-level options; --schema spec)
+#   CHECK_CHAPTER      add_docx.py chapter JSON (content/01-chapter-01.json)
+#   CHECK_FRONT_MATTER add_docx.py front matter (content/00-frontmatter.json)
+#   CHECK_BUILD        build_docx.py content (write_section; batch_build checks every build job)
+#
+#   python content_spec.py content/01-chapter-01.json --schema chapter --template template/blank-template.docx
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+from docx.styles import BabelFish
+from lxml import etree
+import argparse, json, os, re, sys, zipfile
+
+import docxzip
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "persian-doc-spec-1.json")
+
+class SchemaError(ValueError):
+    """The schema itself uses something compile_schema does not support."""
+
+class SpecError(ValueError):
+    """Content failed validation; .issues holds one "path: message" per problem."""
+
+    def __init__(self, source: str, issues: List[str]):
+        self.source, self.issues = source, issues
+        shown = "\n  ".join(issues[:20]) + (f"\n  ... {len(issues) - 20} more" if len(issues) > 20 else "")
+        super().__init__(f"{source}: {len(issues)} problem(s)\n  {shown}")
+
+# ----------------- schema compiler -----------------
+
+Check = Callable[[Any, Tuple, List[str]], None]
+
+ANNOTATIONS = {"$schema", "$id", "$defs", "$comment", "title", "description", "default", "examples",
+               "deprecated", "readOnly", "writeOnly"}
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+TYPE_TESTS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+    "number": _is_number,
+    "integer": lambda v: _is_number(v) and (isinstance(v, int) or v.is_integer()),
+}
+
+def _json_key(v):
+    """Hashable key with JSON equality (True != 1, 1 == 1.0)."""
+    if isinstance(v, bool) or v is None:
+        return ("lit", v)
+    if _is_number(v):
+        return ("num", v)
+    if isinstance(v, str):
+        return ("str", v)
+    return ("json", json.dumps(v, sort_keys=True))
+
+def format_path(path: Tuple) -> str:
+    return "$" + "".join(f"[{p}]" if isinstance(p, int) else f".{p}" for p in path)
+
+def _fail(errs: List[str], path: Tuple, msg: str):
+    errs.append(f"{format_path(path)}: {msg}")
+
+class _Compiler:
+    def __init__(self, root):
+        self.root = root
+        self.refs: Dict[str, Check] = {}
+
+    def ref(self, pointer: str) -> Check:
+        if pointer in self.refs:
+            return self.refs[pointer]
+        if not pointer.startswith("#"):
+            raise SchemaError(f"only local $ref is supported, got {pointer!r}")
+        cell: List[Check] = []
+        self.refs[pointer] = lambda v, p, e: cell[0](v, p, e)    # resolved below; allows recursion
+        target = self.root
+        for part in filter(None, pointer[1:].split("/")):
+            part = part.replace("~1", "/").replace("~0", "~")
+            try:
+                target = target[int(part)] if isinstance(target, list) else target[part]
+            except (KeyError, IndexError, ValueError):
+                raise SchemaError(f"unresolvable $ref {pointer!r}") from None
+        cell.append(self.compile(target))
+        return self.refs[pointer]
+
+    def compile(self, schema) -> Check:
+        if schema is True or schema == {}:
+            return lambda v, p, e: None
+        if schema is False:
+            return lambda v, p, e: _fail(e, p, "no value is allowed here")
+        if not isinstance(schema, dict):
+            raise SchemaError(f"schema must be an object or boolean, got {schema!r}")
+        unknown = set(schema) - ANNOTATIONS - set(self.HANDLERS) - {"additionalProperties", "patternProperties"}
+        if unknown:
+            raise SchemaError(f"unsupported keyword(s): {sorted(unknown)}")
+        checks = [getattr(self, method)(schema[kw], schema) for kw, method in self.HANDLERS.items() if kw in schema]
+        if "properties" not in schema and ("additionalProperties" in schema or "patternProperties" in schema):
+            checks.append(self.k_properties({}, schema))
+        if not checks:
+            return lambda v, p, e: None
+        if len(checks) == 1:
+            return checks[0]
+        def check(v, p, e):
+            for c in checks:
+                c(v, p, e)
+        return check
+
+    # ---- keywords ----
+
+    def k_type(self, types, schema) -> Check:
+        names = [types] if isinstance(types, str) else list(types)
+        tests = []
+        for t in names:
+            if t not in TYPE_TESTS:
+                raise SchemaError(f"unknown type {t!r}")
+            tests.append(TYPE_TESTS[t])
+        want = " or ".join(names)
+        def check(v, p, e):
+            for t in tests:
+                if t(v): return
+            _fail(e, p, f"expected {want}, got {type(v).__name__}")
+        return check
+
+    def k_enum(self, values, schema) -> Check:
+        allowed = frozenset(_json_key(x) for x in values)
+        def check(v, p, e):
+            if _json_key(v) not in allowed:
+                _fail(e, p, f"{v!r} is not one of {values!r}")
+        return check
+
+    def k_const(self, value, schema) -> Check:
+        key = _json_key(value)
+        def check(v, p, e):
+            if _json_key(v) != key:
+                _fail(e, p, f"must be {value!r}")
+        return check
+
+    def k_properties(self, props, schema) -> Check:
+        compiled = {k: self.compile(s) for k, s in props.items()}
+        patterns = [(re.compile(rx), self.compile(s)) for rx, s in schema.get("patternProperties", {}).items()]
+        extra = schema.get("additionalProperties", True)
+        extra_check = None if extra is True else self.compile(extra)
+        closed = extra is False
+        def check(v, p, e):
+            if not isinstance(v, dict): return
+            for k, item in v.items():
+                c = compiled.get(k)
+                matched = c is not None
+                if matched:
+                    c(item, p + (k,), e)
+                for rx, pc in patterns:
+                    if rx.search(k):
+                        matched = True
+                        pc(item, p + (k,), e)
+                if not matched and extra_check is not None:
+                    if closed:
+                        _fail(e, p, f"unexpected property {k!r}")
+                    else:
+                        extra_check(item, p + (k,), e)
+        return check
+
+    def k_required(self, names, schema) -> Check:
+        def check(v, p, e):
+            if isinstance(v, dict):
+                for k in names:
+                    if k not in v:
+                        _fail(e, p, f"missing required property {k!r}")
+        return check
+
+    def k_dependent_required(self, deps, schema) -> Check:
+        def check(v, p, e):
+            if isinstance(v, dict):
+                for k, needed in deps.items():
+                    if k in v:
+                        for n in needed:
+                            if n not in v:
+                                _fail(e, p, f"{k!r} requires {n!r}")
+        return check
+
+    def k_items(self, items, schema) -> Check:
+        start = len(schema.get("prefixItems", ()))
+        c = self.compile(items)
+        def check(v, p, e):
+            if isinstance(v, list):
+                for i in range(start, len(v)):
+                    c(v[i], p + (i,), e)
+        return check
+
+    def k_prefix_items(self, items, schema) -> Check:
+        cs = [self.compile(s) for s in items]
+        def check(v, p, e):
+            if isinstance(v, list):
+                for i, (c, item) in enumerate(zip(cs, v)):
+                    c(item, p + (i,), e)
+        return check
+
+    def _bound(self, kind, test, msg) -> Check:
+        def check(v, p, e):
+            if kind(v) and not test(v):
+                _fail(e, p, msg(v))
+        return check
+
+    def k_min_items(self, n, schema):
+        return self._bound(lambda v: isinstance(v, list), lambda v: len(v) >= n, lambda v: f"needs at least {n} item(s)")
+
+    def k_max_items(self, n, schema):
+        return self._bound(lambda v: isinstance(v, list), lambda v: len(v) <= n, lambda v: f"allows at most {n} item(s)")
+
+    def k_min_length(self, n, schema):
+        return self._bound(lambda v: isinstance(v, str), lambda v: len(v) >= n, lambda v: f"needs at least {n} character(s)")
+
+    def k_max_length(self, n, schema):
+        return self._bound(lambda v: isinstance(v, str), lambda v: len(v) <= n, lambda v: f"allows at most {n} character(s)")
+
+    def k_pattern(self, rx, schema):
+        r = re.compile(rx)
+        return self._bound(lambda v: isinstance(v, str), lambda v: r.search(v) is not None,
+                           lambda v: f"{v!r} does not match {rx!r}")
+
+    def k_minimum(self, n, schema):
+        return self._bound(_is_number, lambda v: v >= n, lambda v: f"{v} is below the minimum {n}")
+
+    def k_maximum(self, n, schema):
+        return self._bound(_is_number, lambda v: v <= n, lambda v: f"{v} is above the maximum {n}")
+
+    def k_exclusive_minimum(self, n, schema):
+        return self._bound(_is_number, lambda v: v > n, lambda v: f"{v} must be greater than {n}")
+
+    def k_exclusive_maximum(self, n, schema):
+        return self._bound(_is_number, lambda v: v < n, lambda v: f"{v} must be less than {n}")
+
+    def k_ref(self, pointer, schema) -> Check:
+        return self.ref(pointer)
+
+    def k_all_of(self, schemas, schema) -> Check:
+        cs = [self.compile(s) for s in schemas]
+        def check(v, p, e):
+            for c in cs:
+                c(v, p, e)
+        return check
+
+    def _count_valid(self, cs, v, p) -> Tuple[int, List[str]]:
+        n, first = 0, []
+        for c in cs:
+            errs: List[str] = []
+            c(v, p, errs)
+            if errs:
+                first = first or errs
+            else:
+                n += 1
+        return n, first
+
+    def k_any_of(self, schemas, schema) -> Check:
+        cs = [self.compile(s) for s in schemas]
+        def check(v, p, e):
+            n, first = self._count_valid(cs, v, p)
+            if n == 0:
+                _fail(e, p, f"matches none of the anyOf alternatives (first: {first[0]})")
+        return check
+
+    def k_one_of(self, schemas, schema) -> Check:
+        cs = [self.compile(s) for s in schemas]
+        def check(v, p, e):
+            n, first = self._count_valid(cs, v, p)
+            if n != 1:
+                _fail(e, p, f"matches {n} of the oneOf alternatives, expected exactly 1"
+                            + (f" (first: {first[0]})" if n == 0 else ""))
+        return check
+
+    def k_not(self, sub, schema) -> Check:
+        c = self.compile(sub)
+        def check(v, p, e):
+            errs: List[str] = []
+            c(v, p, errs)
+            if not errs:
+                _fail(e, p, "must not match the 'not' schema")
+        return check
+
+    HANDLERS = {
+        "$ref": "k_ref", "type": "k_type", "enum": "k_enum", "const": "k_const",
+        "required": "k_required", "properties": "k_properties", "dependentRequired": "k_dependent_required",
+        "prefixItems": "k_prefix_items", "items": "k_items", "minItems": "k_min_items", "maxItems": "k_max_items",
+        "minLength": "k_min_length", "maxLength": "k_max_length", "pattern": "k_pattern",
+        "minimum": "k_minimum", "maximum": "k_maximum",
+        "exclusiveMinimum": "k_exclusive_minimum", "exclusiveMaximum": "k_exclusive_maximum",
+        "allOf": "k_all_of", "anyOf": "k_any_of", "oneOf": "k_one_of", "not": "k_not",
+    }
+
+def compile_schema(schema) -> Callable[[Any], List[str]]:
+    """Validator for `schema`: data -> list of problems (empty when valid)."""
+    check = _Compiler(schema).compile(schema)
+    def validate(data) -> List[str]:
+        errs: List[str] = []
+        check(data, (), errs)
+        return errs
+    return validate
+
+@lru_cache(maxsize=None)
+def load_schema(path: str) -> Callable[[Any], List[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_schema(json.load(f))
+
+def doc_spec() -> Callable[[Any], List[str]]:
+    return load_schema(SPEC_PATH)
+
+# ----------------- add_docx.py content -----------------
+
+_STR = {"type": "string"}
+_STYLED_TEXT = {"type": "object", "required": ["text", "style"], "properties": {"text": _STR, "style": _STR}}
+
+CHAPTER_SCHEMA = {
+    "$defs": {
+        "block": {
+            "type": "object",
+            "dependentRequired": {"text": ["style"]},
+            "properties": {
+                "text": _STR,
+                "style": _STR,
+                "list": {"type": "array", "items": _STYLED_TEXT},
+                "upload": {"type": "array", "items": {
+                    "type": "object",
+                    "anyOf": [{"required": ["image"]}, {"required": ["text"]}],
+                    "dependentRequired": {"text": ["style"]},
+                    "properties": {"image": _STR, "text": _STR, "style": {"type": ["string", "null"]}},
+                }},
+            },
+        },
+        "blocks": {"type": "array", "items": {"$ref": "#/$defs/block"}},
+        "section": {
+            "type": "object",
+            "required": ["title", "style"],
+            "properties": {
+                "title": _STR,
+                "style": _STR,
+                "content": {"$ref": "#/$defs/blocks"},
+                "sub_sections": {"type": "array", "items": {
+                    "type": "object",
+                    "required": ["title", "style"],
+                    "properties": {"title": _STR, "style": _STR, "content": {"$ref": "#/$defs/blocks"}},
+                }},
+            },
+        },
+    },
+    "type": "object",
+    "required": ["header", "chapter"],
+    "properties": {
+        "section": {"type": "object"},
+        "header": _STYLED_TEXT,
+        "footer": {"type": "object"},
+        "chapter": {
+            "type": "object",
+            "required": ["title", "style", "intro", "sections"],
+            "properties": {
+                "title": _STR,
+                "style": _STR,
+                "intro": {"type": "array", "items": _STYLED_TEXT},
+                "sections": {"type": "array", "items": {"$ref": "#/$defs/section"}},
+            },
+        },
+    },
+}
+
+FRONT_MATTER_SCHEMA = {
+    "type": "object",
+    "required": ["frontMatter"],
+    "properties": {"frontMatter": {"type": "object", "additionalProperties": _STR}},
+}
+
+# ----------------- build_docx.py content -----------------
+
+_TEXT = {"anyOf": [_STR, {"type": "object", "required": ["text"], "properties": {"text": _STR}}]}
+_HEADER_FOOTER = {
+    "type": "object",
+    "properties": {
+        "enabled": {"type": "boolean"},
+        "align": {"type": ["string", "integer", "null"]},
+        "runs": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"text": _STR, "style": _STR, "field": _STR},
+        }},
+    },
+}
+
+BUILD_SCHEMA = {
+    "$defs": {
+        "node": {"anyOf": [
+            _STR,
+            {"type": "object", "required": ["text"], "properties": {"text": _STR}},
+            {"type": "object", "required": ["list"], "properties": {"list": {
+                "type": "object",
+                "properties": {"type": _STR, "items": {"type": "array", "items": _TEXT}},
+            }}},
+        ]},
+        "section": {
+            "type": "object",
+            "required": ["title"],
+            "properties": {
+                "title": _STR,
+                "level": {"type": "integer", "minimum": 1, "maximum": 9},
+                "content": {"type": "array", "items": {"$ref": "#/$defs/node"}},
+                "sections": {"type": "array", "items": {"$ref": "#/$defs/section"}},
+            },
+        },
+    },
+    "type": "object",
+    "required": ["chapter"],
+    "additionalProperties": False,
+    "properties": {
+        "meta": {
+            "type": "object",
+            "properties": {
+                "defaultParagraphStyle": _STR,
+                "listStyleMap": {"type": "object", "additionalProperties": _STR},
+            },
+        },
+        "section": {"type": "object", "properties": {"break": _STR}},
+        "header": _HEADER_FOOTER,
+        "footer": _HEADER_FOOTER,
+        "chapter": {
+            "type": "object",
+            "required": ["title"],
+            "properties": {
+                "title": _STR,
+                "intro": {"type": "array", "items": _TEXT},
+                "sections": {"type": "array", "items": {"$ref": "#/$defs/section"}},
+            },
+        },
+    },
+}
+
+CHECK_CHAPTER = compile_schema(CHAPTER_SCHEMA)
+CHECK_CHAPTER_HEAD = compile_schema({**CHAPTER_SCHEMA, "required": ["header"]})    # keys before a streamed "chapter"
+CHECK_FRONT_MATTER = compile_schema(FRONT_MATTER_SCHEMA)
+CHECK_BUILD = compile_schema(BUILD_SCHEMA)
+
+# ----------------- style references -----------------
+
+def style_refs(content, path: Tuple = ()) -> Iterator[Tuple[Tuple, str]]:
+    """(path, style name) for every style a content JSON names: "style" and
+    "defaultParagraphStyle" values and listStyleMap entries, at any depth."""
+    if isinstance(content, dict):
+        for k, v in content.items():
+            if k in ("style", "defaultParagraphStyle") and isinstance(v, str):
+                yield path + (k,), v
+            elif k == "listStyleMap" and isinstance(v, dict):
+                yield from ((path + (k, kind), name) for kind, name in v.items() if isinstance(name, str))
+            else:
+                yield from style_refs(v, path + (k,))
+    elif isinstance(content, list):
+        for i, v in enumerate(content):
+            yield from style_refs(v, path + (i,))
+
+def check_styles(content, styles: FrozenSet[str]) -> List[str]:
+    return [f"{format_path(p)}: style {name!r} is not in the template" for p, name in style_refs(content)
+            if name not in styles]
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_STYLE_CACHE: Dict[str, Tuple[Tuple[int, int], FrozenSet[str]]] = {}
+
+def template_styles(path: str) -> FrozenSet[str]:
+    """
+    Names doc.styles[...] accepts for the .docx at `path` (UI and internal names,
+    style IDs), read from the styles part without opening the document.
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _STYLE_CACHE.get(path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    with zipfile.ZipFile(path) as z:
+        part = docxzip.styles_part(z, docxzip.main_document_part(z))
+        root = etree.fromstring(z.read(part)) if part else None
+    names = set()
+    for el in (root.iter(f"{_W}style") if root is not None else ()):
+        sid = el.get(f"{_W}styleId")
+        if sid:
+            names.add(sid)
+        name_el = el.find(f"{_W}name")
+        name = name_el.get(f"{_W}val") if name_el is not None else None
+        if name:
+            names.update((name, BabelFish.internal2ui(name)))
+    _STYLE_CACHE[path] = (stamp, frozenset(names))
+    return _STYLE_CACHE[path][1]
+
+# ----------------- entry points -----------------
+
+def validate(content, check: Optional[Callable[[Any], List[str]]] = None,
+             styles: Optional[FrozenSet[str]] = None) -> List[str]:
+    issues = check(content) if check is not None else []
+    if styles is not None:
+        issues += check_styles(content, styles)
+    return issues
+
+def require_valid(content, source: str, check: Optional[Callable[[Any], List[str]]] = None,
+                  styles: Optional[FrozenSet[str]] = None):
+    """Raise SpecError listing every problem in `content` (named `source` in the message)."""
+    issues = validate(content, check, styles)
+    if issues:
+        raise SpecError(source, issues)
+
+SCHEMAS = {"spec": doc_spec, "chapter": lambda: CHECK_CHAPTER, "frontmatter": lambda: CHECK_FRONT_MATTER,
+           "build": lambda: CHECK_BUILD}
+
+def main():
+    ap = argparse.ArgumentParser(description="Validate content JSON files before building.")
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("--schema", default="chapter",
+                    help=f"One of {', '.join(SCHEMAS)}, or a path to a JSON Schema file")
+    ap.add_argument("--template", default=None, help="Also check style references against this .docx")
+    args = ap.parse_args()
+
+    check = SCHEMAS[args.schema]() if args.schema in SCHEMAS else load_schema(args.schema)
+    styles = template_styles(args.template) if args.template else None
+    bad = 0
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            issues = validate(json.load(f), check, styles)
+        if issues:
+            bad += 1
+            print(SpecError(path, issues), file=sys.stderr)
+        else:
+            print(f"{path}: ok")
+    if bad:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
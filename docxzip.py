@@ -0,0 +1,346 @@
+# docxzip.py
+# Zip-level helpers for .docx packages: locate parts through the relationship files,
+# copy entries between archives without decompressing them, and save a python-docx
+# Document rewriting only the parts that changed (save_docx).
+#
+# zipfile has no public API for writing an already-compressed member, so archives
+# are written by ZipWriter: local headers, central directory and (when sizes or
+# offsets need it) the ZIP64 records, per APPNOTE. Copied members are streamed in
+# chunks, so a 100 MB image costs one buffer, not its size.
+
+from dataclasses import dataclass
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+import logging, os, posixpath, struct, time, zlib
+from docx import Document
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.part import XmlPart
+from docx.opc.pkgwriter import _ContentTypesItem
+from lxml import etree
+
+import profiling
+
+log = logging.getLogger("docxzip")
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")   # signature ... name length, extra length
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_RECORD64 = struct.Struct("<4sQ2H2L4Q")
+_END_LOCATOR64 = struct.Struct("<4sLQL")
+_U32 = 0xFFFFFFFF
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+RT_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+RT_STYLES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+CHUNK = 1 << 20
+# formats that are compressed already: deflating them again costs time and saves ~nothing
+STORED_TYPES = frozenset(("image/png", "image/jpeg", "image/gif"))
+
+def rels_path(part: str) -> str:
+    d, name = posixpath.split(part)
+    return posixpath.join(d, "_rels", name + ".rels")
+
+def part_targets(zin: ZipFile, part: str = "") -> Dict[str, str]:
+    """Relationship type -> target part name for `part` ("" = the package)."""
+    path = "_rels/.rels" if not part else rels_path(part)
+    try:
+        root = etree.fromstring(zin.read(path))
+    except KeyError:
+        return {}
+    base = posixpath.dirname(part)
+    out: Dict[str, str] = {}
+    for rel in root.iter(_REL_NS):
+        if rel.get("TargetMode") == "External": continue
+        target = rel.get("Target", "")
+        name = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+        out.setdefault(rel.get("Type"), name)
+    return out
+
+def main_document_part(zin: ZipFile) -> str:
+    return part_targets(zin).get(RT_OFFICE_DOCUMENT, "word/document.xml")
+
+def styles_part(zin: ZipFile, document_part: str) -> Optional[str]:
+    return part_targets(zin, document_part).get(RT_STYLES)
+
+def raw_data_offset(fp, info: ZipInfo) -> int:
+    fp.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(fp.read(_LOCAL_HEADER.size))
+    name_len, extra_len = header[-2], header[-1]
+    return info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+def _dos_time(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    y, mo, d, h, mi, s = date_time[:6]
+    return h << 11 | mi << 5 | s // 2, max(y - 1980, 0) << 9 | mo << 5 | d
+
+@dataclass
+class _Member:
+    name: bytes
+    flags: int
+    method: int
+    date_time: Tuple[int, ...]
+    crc: int
+    compress_size: int
+    file_size: int
+    offset: int
+    external_attr: int
+    zip64: bool = False
+
+class ZipWriter:
+    """
+    Write-only zip archive: deflated or stored members, members streamed through
+    open(), and members copied from another archive still compressed (copy_raw).
+    Members go into a seekable file; sizes are patched into local headers, so no
+    data descriptors are written.
+    """
+
+    def __init__(self, path: str, compresslevel: Optional[int] = None):
+        self.fp: BinaryIO = open(path, "wb")
+        self.level = -1 if compresslevel is None else compresslevel
+        self.members: List[_Member] = []
+        self.names = set()
+
+    def __enter__(self) -> "ZipWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.fp.close()
+
+    def _begin(self, name: str, method: int, flags: int = 0, date_time=None, external_attr: int = 0o600 << 16,
+               zip64: bool = False) -> _Member:
+        if name in self.names:
+            raise ValueError(f"Duplicate zip member {name!r}")
+        self.names.add(name)
+        raw = name.encode("utf-8")
+        if not name.isascii():
+            flags |= 0x800      # UTF-8 names
+        m = _Member(raw, flags & ~0x08, method, tuple(date_time or time.localtime()[:6]), 0, 0, 0,
+                    self.fp.tell(), external_attr, zip64)
+        self._local_header(m)
+        return m
+
+    def _local_header(self, m: _Member):
+        t, d = _dos_time(m.date_time)
+        extra = struct.pack("<2H2Q", 1, 16, m.file_size, m.compress_size) if m.zip64 else b""
+        sizes = (_U32, _U32) if m.zip64 else (m.compress_size, m.file_size)
+        self.fp.write(_LOCAL_HEADER.pack(b"PK\x03\x04", 45 if m.zip64 else 20, 0, m.flags, m.method, t, d,
+                                         m.crc, *sizes, len(m.name), len(extra)))
+        self.fp.write(m.name)
+        self.fp.write(extra)
+
+    def _finish(self, m: _Member):
+        if not m.zip64 and (m.file_size > _U32 or m.compress_size > _U32):
+            raise ValueError(f"Zip member {m.name.decode()} needs ZIP64; open it with zip64=True")
+        end = self.fp.tell()
+        self.fp.seek(m.offset)
+        self._local_header(m)
+        self.fp.seek(end)
+        self.members.append(m)
+
+    def writestr(self, name: str, data: bytes, compress_type: int = ZIP_DEFLATED):
+        with self.open(name, compress_type, zip64=len(data) > _U32 // 2) as f:
+            f.write(data)
+
+    @contextmanager
+    def open(self, name: str, compress_type: int = ZIP_DEFLATED, zip64: bool = False) -> Iterator["_MemberWriter"]:
+        """A writer for a new member; pass zip64 when it may exceed 4 GB."""
+        m = self._begin(name, compress_type, zip64=zip64)
+        w = _MemberWriter(self.fp, m, self.level)
+        yield w
+        w.flush()
+        self._finish(m)
+
+    def copy_raw(self, src_fp: BinaryIO, info: ZipInfo):
+        """Copy member `info` of the archive open as `src_fp`, as its compressed bytes."""
+        m = self._begin(info.filename, info.compress_type, info.flag_bits, info.date_time, info.external_attr,
+                        zip64=info.file_size > _U32 or info.compress_size > _U32)
+        m.crc, m.compress_size, m.file_size = info.CRC, info.compress_size, info.file_size
+        src_fp.seek(raw_data_offset(src_fp, info))
+        remaining = info.compress_size
+        while remaining:
+            chunk = src_fp.read(min(CHUNK, remaining))
+            if not chunk:
+                raise EOFError(f"Truncated zip member {info.filename}")
+            self.fp.write(chunk)
+            remaining -= len(chunk)
+        self._finish(m)
+
+    def close(self):
+        start = self.fp.tell()
+        for m in self.members:
+            extra = b""
+            csize, usize, offset = m.compress_size, m.file_size, m.offset
+            if usize > _U32: extra += struct.pack("<Q", usize); usize = _U32
+            if csize > _U32: extra += struct.pack("<Q", csize); csize = _U32
+            if offset > _U32: extra += struct.pack("<Q", offset); offset = _U32
+            if extra: extra = struct.pack("<2H", 1, len(extra)) + extra
+            version = 45 if extra or m.zip64 else 20
+            t, d = _dos_time(m.date_time)
+            self.fp.write(_CENTRAL_HEADER.pack(b"PK\x01\x02", version, 3, version, 0, m.flags, m.method, t, d,
+                                               m.crc, csize, usize, len(m.name), len(extra), 0, 0, 0,
+                                               m.external_attr, offset))
+            self.fp.write(m.name)
+            self.fp.write(extra)
+        end = self.fp.tell()
+        count, size = len(self.members), end - start
+        if count > 0xFFFF or start > _U32 or size > _U32:
+            self.fp.write(_END_RECORD64.pack(b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, size, start))
+            self.fp.write(_END_LOCATOR64.pack(b"PK\x06\x07", 0, end, 1))
+            count, size, start = min(count, 0xFFFF), min(size, _U32), min(start, _U32)
+        self.fp.write(_END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+        self.fp.close()
+
+class _MemberWriter:
+    def __init__(self, fp: BinaryIO, member: _Member, level: int):
+        self.fp, self.m = fp, member
+        self.z = zlib.compressobj(level, zlib.DEFLATED, -15) if member.method == ZIP_DEFLATED else None
+
+    def write(self, data: bytes) -> int:
+        m = self.m
+        m.crc = zlib.crc32(data, m.crc)
+        m.file_size += len(data)
+        out = self.z.compress(data) if self.z is not None else data
+        self.fp.write(out)
+        m.compress_size += len(out)
+        return len(data)
+
+    def flush(self):
+        if self.z is not None:
+            out = self.z.flush()
+            self.fp.write(out)
+            self.m.compress_size += len(out)
+
+# ----------------- dirty-part save -----------------
+#
+# doc.save() re-serializes and re-deflates every part, media included. save_docx
+# writes only what changed since the document was opened: a part whose content is
+# the one loaded from the source archive is copied as that archive's compressed
+# bytes. Binary parts are clean while they still hold the loaded blob object; XML
+# parts are clean while they serialize to what they did at open time.
+#
+# That test is not free: every XML part is serialized (and CRC'd) once at open and
+# once at save, about 4 ms per MB of XML. lxml gives no cheaper way to know that a
+# tree is unchanged. What it saves is deflate, several times that cost per MB, and
+# the media, which is copied without being read into memory.
+
+@dataclass
+class SourceSnapshot:
+    path: str
+    size: int
+    mtime_ns: int
+    entries: Dict[str, int]        # member name -> CRC in the source archive
+    blobs: Dict[str, bytes]        # binary parts: member name -> loaded blob (identity test)
+    xml_crc: Dict[str, int]        # XML parts: member name -> CRC of their serialization at open
+
+    def unchanged_on_disk(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (self.size, self.mtime_ns)
+
+@dataclass
+class SaveStats:
+    copied: int = 0
+    written: int = 0
+    copied_bytes: int = 0
+    written_bytes: int = 0
+
+def _part_bytes(part) -> Tuple[bytes, bool]:
+    """(content, is_xml) of a python-docx part as doc.save would write it."""
+    if isinstance(part, XmlPart):
+        return serialize_part_xml(part.element), True
+    return part.blob, False
+
+def track_source(doc, path: str) -> SourceSnapshot:
+    """Remember which archive `doc` was opened from, so save_docx can copy its clean parts."""
+    p = os.path.abspath(path)
+    st = os.stat(p)
+    with ZipFile(p) as zin:
+        entries = {i.filename: i.CRC for i in zin.infolist()}
+    blobs: Dict[str, bytes] = {}
+    xml_crc: Dict[str, int] = {}
+    for part in doc.part.package.iter_parts():
+        name = part.partname.membername
+        if name not in entries: continue
+        if isinstance(part, XmlPart):
+            xml_crc[name] = zlib.crc32(serialize_part_xml(part.element))
+        else:
+            blobs[name] = part.blob
+    snap = SourceSnapshot(p, st.st_size, st.st_mtime_ns, entries, blobs, xml_crc)
+    doc.part.package._docxzip_source = snap
+    return snap
+
+def open_docx(path: str):
+    """Document(path), tracked for save_docx."""
+    doc = Document(path)
+    track_source(doc, path)
+    return doc
+
+def _is_clean(snap: SourceSnapshot, name: str, data: bytes, is_xml: bool) -> bool:
+    if is_xml:
+        return snap.xml_crc.get(name) == zlib.crc32(data)
+    return snap.blobs.get(name) is data
+
+@contextmanager
+def _source_archive(snap: Optional[SourceSnapshot]):
+    """(raw file, ZipFile) of the tracked source, or (None, None)."""
+    if snap is None:
+        yield None, None
+        return
+    with open(snap.path, "rb") as src, ZipFile(src) as src_zip:
+        yield src, src_zip
+
+@profiling.traced("docxzip.save_docx")
+def save_docx(doc, path: str, compresslevel: Optional[int] = None) -> SaveStats:
+    """
+    doc.save(path), except that parts unchanged since open_docx/track_source are copied
+    raw from the source archive. `compresslevel` (0-9, zlib) applies to rewritten parts.
+    Untracked documents (Document(), or a changed source file) are written in full.
+    """
+    pkg = doc.part.package
+    snap: Optional[SourceSnapshot] = getattr(pkg, "_docxzip_source", None)
+    if snap is not None and not snap.unchanged_on_disk():
+        log.debug("Source %s changed since it was opened; writing every part", snap.path)
+        snap = None
+
+    # written next to the output and renamed over it: the source may be the output,
+    # and a failed save leaves neither a truncated file nor a stray .tmp
+    out = os.path.abspath(path)
+    tmp = out + ".tmp"
+
+    for part in pkg.parts:
+        part.before_marshal()
+    parts = pkg.parts
+    stats = SaveStats()
+    try:
+        with _source_archive(snap) as (src, src_zip), ZipWriter(tmp, compresslevel) as zout:
+            zout.writestr(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob)
+            zout.writestr(PACKAGE_URI.rels_uri.membername, pkg.rels.xml)
+            for part in parts:
+                name = part.partname.membername
+                data, is_xml = _part_bytes(part)
+                info = src_zip.NameToInfo.get(name) if src_zip is not None else None
+                if info is not None and info.CRC == snap.entries.get(name) and _is_clean(snap, name, data, is_xml):
+                    zout.copy_raw(src, info)
+                    stats.copied += 1
+                    stats.copied_bytes += info.compress_size
+                else:
+                    zout.writestr(name, data, ZIP_STORED if part.content_type in STORED_TYPES else ZIP_DEFLATED)
+                    stats.written += 1
+                    stats.written_bytes += len(data)
+                if len(part.rels):
+                    zout.writestr(part.partname.rels_uri.membername, part.rels.xml)
+        os.replace(tmp, out)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    profiling.count("parts_copied_raw", stats.copied)
+    profiling.count("parts_rewritten", stats.written)
+    profiling.record_file(out)
+    log.debug("Saved %s: %d parts copied raw (%d bytes), %d rewritten (%d bytes)",
+              path, stats.copied, stats.copied_bytes, stats.written, stats.written_bytes)
+    return stats
@@ -1,40 +1,26 @@
 # extract_structure.py
 import json
-import re
 from docx import Document
+from outline import build_outline
 import argparse
 
-def _heading_level(p):
-    name = (p.style.name or "").lower()
-    m = re.search(r'(heading|überschrift|عنوان)\s*(\d+)$', name)
-    if m: return int(m.group(2))
-    return None
-
 def paragraph_to_json(p):
     return {
         "text": p.text.strip(),
         "style": p.style.name if p.style else "None"
     }
 
+def node_to_json(node, styles):
+    return {
+        "title": node.title,
+        "level": node.level,
+        "style": styles.name(node.style_id),
+        "children": [node_to_json(c, styles) for c in node.children]
+    }
+
 def build_tree(doc):
-    roots, stack = [], []
-    for p in doc.paragraphs:
-        lvl = _heading_level(p)
-        if lvl:
-            node = {
-                "title": p.text.strip(),
-                "level": lvl,
-                "style": p.style.name if p.style else "None",
-                "children": []
-            }
-            while stack and stack[-1]["level"] >= lvl:
-                stack.pop()
-            if stack:
-                stack[-1]["children"].append(node)
-            else:
-                roots.append(node)
-            stack.append(node)
-    return roots
+    outline = build_outline(doc, front_matter=False)
+    return [node_to_json(n, outline.styles) for n in outline.roots]
 
 def main():
     ap = argparse.ArgumentParser(description="Extract the structure and styles of a Word document into a JSON file.")
@@ -0,0 +1,273 @@
+# images.py
+# pip install python-docx   (optional: pip install Pillow, for downscaling)
+#
+# Image stage for documents that embed figures:
+#
+#   pipe = ImagePipeline(ImageSettings(target_dpi=220, cache_dir=".image-cache"))
+#   pipe.add_picture(run, "content/banzen.png", width=Cm(12))
+#
+# - A source file is read and hashed once per process (memo on path + mtime + size);
+#   dimensions and DPI come from the file header, nothing is decoded.
+# - Identical images are stored once per package: the image part is looked up by the
+#   content hash, and later uses only add a relationship and a w:drawing.
+# - With target_dpi, an image with more than target_dpi pixels per inch at the width
+#   written into the drawing (the requested size, else the native one) is downscaled and
+#   recompressed. This needs Pillow; without it images pass through unchanged.
+# - With cache_dir, processed images are kept on disk keyed by the source hash and the
+#   settings, so later builds skip the resize.
+#
+# prefetch() reads, hashes and resizes a list of images in a thread pool while the
+# caller goes on building XML; add_picture() then waits only for the image it needs.
+# The pool is the pipeline's own, started on the first prefetch(); close() (or leaving
+# a `with ImagePipeline(...)` block) shuts it down.
+#
+# Scripts without a CLI take the settings from the environment (settings_from_env):
+#   DOCX_IMAGE_DPI=220 DOCX_IMAGE_CACHE=.image-cache python add_docx.py
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, astuple
+from io import BytesIO
+from typing import Dict, IO, Iterable, Optional, Tuple, Union
+from docx.image.image import Image
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.shape import CT_Inline
+from docx.shape import InlineShape
+from docx.shared import Emu, Inches, Length
+import hashlib, logging, os, threading, weakref
+
+log = logging.getLogger("images")
+
+Source = Union[str, bytes, IO[bytes]]
+EMU_PER_INCH = 914400
+DPI_ENV, CACHE_ENV = "DOCX_IMAGE_DPI", "DOCX_IMAGE_CACHE"
+PIL_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/gif": "GIF", "image/bmp": "BMP", "image/tiff": "TIFF"}
+
+@dataclass(frozen=True)
+class ImageSettings:
+    target_dpi: Optional[int] = None     # None: never resample
+    jpeg_quality: int = 85
+    cache_dir: Optional[str] = None
+
+    def key(self) -> str:
+        return hashlib.sha1(repr(astuple(self)[:2]).encode()).hexdigest()[:12]
+
+def settings_from_env() -> ImageSettings:
+    dpi = os.environ.get(DPI_ENV)
+    return ImageSettings(target_dpi=int(dpi) if dpi else None, cache_dir=os.environ.get(CACHE_ENV) or None)
+
+@dataclass
+class PreparedImage:
+    blob: bytes
+    filename: str
+    content_type: str
+    px_width: int
+    px_height: int
+    horz_dpi: int
+    vert_dpi: int
+    sha1: str
+    extent: Optional[Tuple[Length, Length]] = None   # native size of the source a downscaled copy stands for
+
+    def standing_for(self, orig: "PreparedImage") -> "PreparedImage":
+        """This (resampled) image with `orig`'s native size: its own DPI is rounded to whole dots."""
+        self.extent = orig.native_size
+        return self
+
+    @classmethod
+    def from_blob(cls, blob: bytes, filename: str) -> "PreparedImage":
+        img = Image.from_blob(blob)      # header parse only
+        return cls(blob, filename, img.content_type, img.px_width, img.px_height,
+                   img.horz_dpi, img.vert_dpi, hashlib.sha1(blob).hexdigest())
+
+    @property
+    def native_size(self) -> Tuple[Length, Length]:
+        if self.extent is not None:
+            return self.extent
+        return Inches(self.px_width / self.horz_dpi), Inches(self.px_height / self.vert_dpi)
+
+    def scaled(self, width: Optional[Length], height: Optional[Length]) -> Tuple[Length, Length]:
+        """Image.scaled_dimensions for these pixels and DPI."""
+        cx, cy = self.native_size
+        if width is None and height is None:
+            return Emu(cx), Emu(cy)
+        if width is None:
+            width = round(cx * float(height) / cy)
+        if height is None:
+            height = round(cy * float(width) / cx)
+        return Emu(width), Emu(height)
+
+def downscale(prep: PreparedImage, target_px: int, quality: int) -> Optional[bytes]:
+    """Resampled and re-encoded bytes, or None when Pillow is missing or the format is unsupported."""
+    fmt = PIL_FORMATS.get(prep.content_type)
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        return None
+    if fmt is None:
+        return None
+    with PILImage.open(BytesIO(prep.blob)) as im:
+        height = max(1, round(prep.px_height * target_px / prep.px_width))
+        # nearest whole DPI; the pipeline keeps the exact native size (PreparedImage.extent)
+        out_dpi = max(1, round(prep.horz_dpi * target_px / prep.px_width))
+        small = im.resize((target_px, height), PILImage.LANCZOS)
+        buf = BytesIO()
+        opts = {"dpi": (out_dpi, out_dpi)}
+        if fmt == "JPEG":
+            opts.update(quality=quality, optimize=True)
+        elif fmt == "PNG":
+            opts.update(optimize=True)
+        small.save(buf, fmt, **opts)
+    return buf.getvalue()
+
+class ImagePipeline:
+    def __init__(self, settings: ImageSettings = ImageSettings(), workers: int = 8):
+        self.settings = settings
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None     # prefetch threads, started on first use
+        self._sources: Dict[tuple, Tuple[str, PreparedImage]] = {}          # stat key -> (sha256, original)
+        self._processed: Dict[Tuple[str, int], PreparedImage] = {}         # (sha256, target px) -> result
+        self._parts = weakref.WeakKeyDictionary()     # package -> {sha1: ImagePart}
+        self._ids = weakref.WeakKeyDictionary()       # story part -> next shape id
+        self._pending: Dict[str, Future] = {}         # abspath -> prefetch in flight
+        self._warned = False
+
+    # ----------------- loading -----------------
+
+    def load(self, source: Source) -> Tuple[str, PreparedImage]:
+        """(sha256 of the bytes, image as stored in the source), read once per file version."""
+        if isinstance(source, str):
+            p = os.path.abspath(source)
+            st = os.stat(p)
+            key = (p, st.st_mtime_ns, st.st_size)
+            hit = self._sources.get(key)
+            if hit is None:
+                with open(p, "rb") as f:
+                    blob = f.read()
+                hit = self._sources[key] = (hashlib.sha256(blob).hexdigest(), PreparedImage.from_blob(blob, os.path.basename(p)))
+            return hit
+        blob = source if isinstance(source, bytes) else source.read()
+        sha = hashlib.sha256(blob).hexdigest()
+        prep = PreparedImage.from_blob(blob, "image" + _ext(blob))
+        return sha, prep
+
+    def prepare(self, source: Source, display_width: Optional[int] = None) -> PreparedImage:
+        """The image to embed for `source` shown `display_width` EMU wide (None: native width)."""
+        sha, orig = self.load(source)
+        dpi = self.settings.target_dpi
+        if not dpi:
+            return orig
+        width = display_width or orig.native_size[0]
+        target_px = max(1, round(width / EMU_PER_INCH * dpi))
+        if orig.px_width <= target_px:
+            return orig
+        key = (sha, target_px)
+        prep = self._processed.get(key)
+        if prep is None:
+            prep = self._processed[key] = self._downscaled(sha, orig, target_px)
+        return prep
+
+    def _cache_path(self, sha: str, target_px: int, filename: str) -> Optional[str]:
+        if not self.settings.cache_dir: return None
+        ext = os.path.splitext(filename)[1] or ".img"
+        return os.path.join(self.settings.cache_dir, sha[:2], f"{sha}-{self.settings.key()}-{target_px}{ext}")
+
+    def _downscaled(self, sha: str, orig: PreparedImage, target_px: int) -> PreparedImage:
+        path = self._cache_path(sha, target_px, orig.filename)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return PreparedImage.from_blob(f.read(), orig.filename).standing_for(orig)
+        blob = downscale(orig, target_px, self.settings.jpeg_quality)
+        if blob is None:
+            if not self._warned:
+                self._warned = True
+                log.warning("Downscaling needs Pillow for %s; embedding images at full resolution", orig.content_type)
+            return orig
+        if len(blob) >= len(orig.blob):
+            blob = orig.blob      # recompression did not pay off; keep the original bytes
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        log.debug("Downscaled %s: %dpx -> %dpx, %d -> %d bytes", orig.filename, orig.px_width, target_px,
+                  len(orig.blob), len(blob))
+        return PreparedImage.from_blob(blob, orig.filename).standing_for(orig) if blob is not orig.blob else orig
+
+    # ----------------- prefetch -----------------
+
+    def display_width(self, source: Source, width: Optional[Length], height: Optional[Length]) -> int:
+        """Width add_picture writes as the extent: the requested size scaled like python-docx does."""
+        return self.load(source)[1].scaled(width, height)[0]
+
+    def _prefetch_one(self, path: str):
+        self.prepare(path, self.display_width(path, None, None))
+
+    def prefetch(self, paths: Iterable[str]):
+        """
+        Start preparing image files (as add_picture without a size will) in the
+        pipeline's background threads. Errors surface from the add_picture call for
+        that path. Every call shares one thread pool; close() shuts it down.
+        """
+        todo = [p for p in dict.fromkeys(os.path.abspath(p) for p in paths) if p not in self._pending]
+        if not todo: return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="images")
+        for p in todo:
+            self._pending[p] = self._executor.submit(self._prefetch_one, p)
+
+    def close(self):
+        """Stop the prefetch threads; prefetches not started yet are dropped."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _wait(self, source: Source):
+        if isinstance(source, str) and self._pending:
+            fut = self._pending.pop(os.path.abspath(source), None)
+            if fut is not None:
+                fut.result()
+
+    # ----------------- embedding -----------------
+
+    def image_part(self, package, prep: PreparedImage):
+        """The package's part for these bytes, created on first use."""
+        parts = self._parts.get(package)
+        if parts is None:
+            parts = self._parts[package] = {}
+        part = parts.get(prep.sha1)
+        if part is None:
+            part = parts[prep.sha1] = package.get_or_add_image_part(BytesIO(prep.blob))
+        return part
+
+    def _next_id(self, story_part) -> int:
+        # StoryPart.next_id walks every @id in the document; walk once, then count up
+        n = self._ids.get(story_part)
+        if n is None:
+            n = story_part.next_id
+        self._ids[story_part] = n + 1
+        return n
+
+    def add_picture(self, run, source: Source, width: Optional[Length] = None,
+                    height: Optional[Length] = None) -> InlineShape:
+        """run.add_picture through the pipeline."""
+        part = run.part
+        if not isinstance(source, (str, bytes)):
+            source = source.read()      # loaded twice below; a stream reads only once
+        self._wait(source)
+        prep = self.prepare(source, self.display_width(source, width, height))
+        rId = part.relate_to(self.image_part(part.package, prep), RT.IMAGE)
+        cx, cy = prep.scaled(width, height)
+        inline = CT_Inline.new_pic_inline(self._next_id(part), rId, prep.filename, cx, cy)
+        run._r.add_drawing(inline)
+        return InlineShape(inline)
+
+def _ext(blob: bytes) -> str:
+    return {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif", "image/bmp": ".bmp",
+            "image/tiff": ".tiff"}.get(Image.from_blob(blob).content_type, "")
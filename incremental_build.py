@@ -0,0 +1,565 @@
+# incremental_build.py
+# pip install python-docx
+#
+# Multi-chapter build that re-renders only the chapters whose inputs changed.
+#
+#   python incremental_build.py styles.json thesis.docx content/ch01.json content/ch02.json ... \
+#       [--template template/blank-template.docx] [--cache-dir .build-cache] [--watch]
+#
+# Every chapter (a build_docx content JSON) is rendered on its own into a clone of
+# the prepared template, and what it added is cached as a fragment:
+#   - the body blocks it appended and the section properties that close it
+#   - every relationship those reference (header/footer parts, images, hyperlinks),
+#     with the target parts' bytes
+# A fragment is keyed by the sha256 of the chapter JSON, the style spec, the template
+# and FRAGMENT_VERSION. The output is the template clone with every fragment spliced
+# in, in chapter order: a section break, the blocks, and fresh rIds/part names for
+# the imported parts. Editing one chapter re-renders that chapter only.
+#
+# Splicing also renumbers what must be unique across the body: bookmark ids (and a
+# bookmark name already taken, with the hyperlinks and field codes that use it) and
+# drawing ids (wp:docPr), since every chapter starts counting from the same template
+# (compose.BodyIds).
+#
+# Chapters that need rendering are independent, so with -j N they are rendered in a
+# pool of worker processes, each holding its own prepared template; fragments come
+# back in chapter order and are spliced as above.
+#
+# Fragments live in memory for the life of the builder and on disk under the cache
+# directory (a JSON manifest per fragment, parts stored once by content hash). The
+# directory is kept under --cache-max-mb: after a build that added fragments, the
+# least recently used ones (other than the build's own) are deleted, then the blobs
+# no remaining manifest refers to.
+# --watch keeps one builder alive and rebuilds whenever a chapter, the style spec or
+# the template changes (see watch.py), reporting each rebuild's latency.
+
+from dataclasses import dataclass, field, asdict
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from docx.opc.part import PartFactory, XmlPart
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import qn
+from lxml import etree
+import argparse, hashlib, json, logging, os, time
+
+import build_docx
+import logconfig
+import watch
+from batch_build import TemplateSession
+from compose import BodyIds, append_section, partname_template
+from docxzip import save_docx
+
+log = logging.getLogger("incremental_build")
+
+FRAGMENT_VERSION = 1
+_R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_W_SECTPR = qn("w:sectPr")
+
+# ----------------- content hashing -----------------
+
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+
+def file_digest(path: str) -> str:
+    """sha256 of a file, memoized by path + mtime + size (cheap to call on every build)."""
+    p = os.path.abspath(path)
+    st = os.stat(p)
+    key = (p, st.st_mtime_ns, st.st_size)
+    digest = _DIGESTS.get(key)
+    if digest is None:
+        with open(p, "rb") as f:
+            digest = _DIGESTS[key] = hashlib.sha256(f.read()).hexdigest()
+    return digest
+
+def fragment_key(content_digest: str, session_key: str, fast: bool) -> str:
+    h = hashlib.sha256(f"{FRAGMENT_VERSION}|{session_key}|{content_digest}|{int(fast)}".encode())
+    return h.hexdigest()
+
+# ----------------- fragments -----------------
+
+@dataclass
+class CachedPart:
+    partname: str
+    content_type: str
+    blob: bytes = field(repr=False)
+    rels: List["CachedRel"] = field(default_factory=list)
+
+@dataclass
+class CachedRel:
+    rId: str
+    reltype: str
+    target_ref: str = ""                 # external URL, or the partname of a template part
+    part: Optional[CachedPart] = None    # a part the chapter created (copied into the output)
+    is_external: bool = False
+
+@dataclass
+class Fragment:
+    key: str
+    xml: bytes = field(repr=False)       # w:body holding the chapter's blocks, its w:sectPr last
+    rels: List[CachedRel] = field(default_factory=list)
+
+def _part_blob(part) -> bytes:
+    return serialize_part_xml(part.element) if isinstance(part, XmlPart) else part.blob
+
+def _cache_rel(rel, rId: str, base_partnames: set, seen: Dict[str, CachedPart]) -> CachedRel:
+    if rel.is_external:
+        return CachedRel(rId, rel.reltype, target_ref=rel.target_ref, is_external=True)
+    target = rel.target_part
+    name = str(target.partname)
+    if name in base_partnames:
+        return CachedRel(rId, rel.reltype, target_ref=name)
+    cp = seen.get(name)
+    if cp is None:
+        cp = seen[name] = CachedPart(name, target.content_type, _part_blob(target))
+        cp.rels = [_cache_rel(r, rid, base_partnames, seen) for rid, r in target.rels.items()]
+    return CachedRel(rId, rel.reltype, part=cp)
+
+def referenced_rids(el) -> List[str]:
+    """rIds used by `el`'s subtree (r:id, r:embed, r:link, ...), in document order."""
+    out: Dict[str, None] = {}
+    for node in el.iter():
+        for name, value in node.attrib.items():
+            if name.startswith(_R_NS):
+                out.setdefault(value)
+    return list(out)
+
+def render_chapter(doc, data: Dict, fast: bool = False):
+    """
+    build_docx.write_section for one chapter, except that a configured header/footer
+    gets its own definition instead of editing the one inherited from the previous
+    section; a chapter then neither depends on nor changes what precedes it.
+    """
+    body_only = {k: v for k, v in data.items() if k not in ("header", "footer")}
+    emitter = build_docx.FastEmitter(doc) if fast else None
+    build_docx.write_section(doc, data.get("meta", {}), body_only, emitter=emitter)
+    section = doc.sections[-1]
+    for key, is_header in (("header", True), ("footer", False)):
+        cfg = data.get(key) or {}
+        if cfg.get("enabled"):
+            (section.header if is_header else section.footer).is_linked_to_previous = False
+            build_docx.apply_header_footer_specific(doc, section, cfg, is_header)
+
+def render_fragment(session: TemplateSession, data: Dict, key: str, fast: bool = False) -> Fragment:
+    doc = session.new_document()
+    body = doc.element.body
+    body.get_or_add_sectPr()
+    n_before = len(body) - 1
+    base_partnames = {str(p.partname) for p in doc.part.package.iter_parts()}
+
+    render_chapter(doc, data, fast)
+
+    # [template blocks][section break paragraph][chapter blocks][w:sectPr]; the break is
+    # re-created at splice time, closing whatever section precedes the chapter
+    container = OxmlElement("w:body")
+    for el in list(body)[n_before + 1:]:
+        container.append(el)
+    rels = doc.part.rels
+    seen: Dict[str, CachedPart] = {}
+    cached = [_cache_rel(rels[rId], rId, base_partnames, seen) for rId in referenced_rids(container)]
+    return Fragment(key, etree.tostring(container, encoding="UTF-8"), cached)
+
+# ----------------- splicing -----------------
+
+def _import_part(package, cp: CachedPart, by_name: Dict[str, object], imported: Dict[int, object]):
+    part = imported.get(id(cp))
+    if part is not None:
+        return part
+    if cp.content_type.startswith("image/"):
+        part = imported[id(cp)] = package.get_or_add_image_part(BytesIO(cp.blob))
+        return part
+    partname = package.next_partname(partname_template(cp.partname))
+    part = imported[id(cp)] = PartFactory(partname, cp.content_type, "", cp.blob, package)
+    for r in cp.rels:
+        part.rels.add_relationship(r.reltype, _rel_target(package, r, by_name, imported), r.rId, r.is_external)
+    return part
+
+def _rel_target(package, r: CachedRel, by_name, imported):
+    if r.is_external:
+        return r.target_ref
+    if r.part is None:
+        return by_name[r.target_ref]
+    return _import_part(package, r.part, by_name, imported)
+
+def splice(doc, fragments: List[Fragment]):
+    """Append each fragment to `doc` as its own section, in order."""
+    package = doc.part.package
+    by_name = {str(p.partname): p for p in package.iter_parts()}
+    body = doc.element.body
+    body_ids = BodyIds(body)
+    for frag in fragments:
+        container = parse_xml(frag.xml)
+        body_ids.renumber(container)
+        imported: Dict[int, object] = {}
+        rid_map = {}
+        for r in frag.rels:
+            target = _rel_target(package, r, by_name, imported)
+            rid_map[r.rId] = doc.part.relate_to(target, r.reltype, is_external=r.is_external)
+        for node in container.iter():
+            for name, value in node.attrib.items():
+                if name.startswith(_R_NS) and value in rid_map:
+                    node.set(name, rid_map[value])
+        blocks = list(container)
+        sect = blocks.pop() if blocks and blocks[-1].tag == _W_SECTPR else None
+        append_section(body, blocks, sect)
+
+# ----------------- fragment cache -----------------
+
+class FragmentCache:
+    """Fragments by key: in memory, and under `directory` when one is given."""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.dir = Path(directory) if directory else None
+        self.max_bytes = max_bytes          # None: the directory is never trimmed
+        self.mem: Dict[str, Fragment] = {}
+
+    def _blob_path(self, sha: str) -> Path:
+        return self.dir / "blobs" / sha[:2] / sha
+
+    def _put_blob(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return sha
+
+    def _dump_rel(self, r: CachedRel) -> Dict:
+        d = {"rId": r.rId, "reltype": r.reltype, "target_ref": r.target_ref, "is_external": r.is_external}
+        if r.part is not None:
+            d["part"] = {"partname": r.part.partname, "content_type": r.part.content_type,
+                         "blob": self._put_blob(r.part.blob), "rels": [self._dump_rel(x) for x in r.part.rels]}
+        return d
+
+    def _load_rel(self, d: Dict) -> CachedRel:
+        part = None
+        if d.get("part"):
+            p = d["part"]
+            part = CachedPart(p["partname"], p["content_type"], self._blob_path(p["blob"]).read_bytes(),
+                              [self._load_rel(x) for x in p["rels"]])
+        return CachedRel(d["rId"], d["reltype"], d["target_ref"], part, d["is_external"])
+
+    def get(self, key: str) -> Optional[Fragment]:
+        frag = self.mem.get(key)
+        if frag is not None or self.dir is None:
+            return frag
+        manifest = self.dir / f"{key}.json"
+        try:
+            d = json.loads(manifest.read_text(encoding="utf-8"))
+            frag = Fragment(key, self._blob_path(d["xml"]).read_bytes(), [self._load_rel(x) for x in d["rels"]])
+        except (OSError, ValueError, KeyError) as e:
+            if manifest.exists():
+                log.warning("Ignoring unreadable cache entry %s: %s", manifest, e)
+            return None
+        try:
+            os.utime(manifest)        # the manifest's mtime is its last use, for evict()
+        except OSError:
+            pass
+        self.mem[key] = frag
+        return frag
+
+    def retain(self, keys: Iterable[str]):
+        """Drop in-memory fragments not in `keys` (superseded versions of edited chapters)."""
+        keep = set(keys)
+        self.mem = {k: v for k, v in self.mem.items() if k in keep}
+
+    def put(self, frag: Fragment):
+        self.mem[frag.key] = frag
+        if self.dir is None:
+            return
+        d = {"version": FRAGMENT_VERSION, "xml": self._put_blob(frag.xml), "rels": [self._dump_rel(r) for r in frag.rels]}
+        manifest = self.dir / f"{frag.key}.json"
+        tmp = manifest.with_suffix(".tmp")
+        tmp.write_text(json.dumps(d), encoding="utf-8")
+        os.replace(tmp, manifest)
+
+    @staticmethod
+    def _manifest_blobs(d: Dict) -> Iterator[str]:
+        yield d["xml"]
+        rels = list(d["rels"])
+        while rels:
+            part = rels.pop().get("part")
+            if part:
+                yield part["blob"]
+                rels.extend(part["rels"])
+
+    def evict(self, keep: Iterable[str] = ()):
+        """
+        Trim the directory to max_bytes: delete the least recently used manifests
+        (never those in `keep`) until the manifests left and the blobs they refer to
+        fit, then delete the unreferenced blobs.
+        """
+        if self.dir is None or self.max_bytes is None or not self.dir.is_dir():
+            return
+        keep = set(keep)
+        sizes = {p.name: p.stat().st_size for p in self.dir.glob("blobs/*/*") if p.suffix != ".tmp"}
+        entries = []                 # (mtime, path, size, blob shas)
+        refs: Dict[str, int] = {}
+        for manifest in self.dir.glob("*.json"):
+            try:
+                st = manifest.stat()
+                shas = set(self._manifest_blobs(json.loads(manifest.read_text(encoding="utf-8"))))
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((st.st_mtime_ns, manifest, st.st_size, shas))
+            for sha in shas:
+                refs[sha] = refs.get(sha, 0) + 1
+        total = sum(e[2] for e in entries) + sum(n for sha, n in sizes.items() if sha in refs)
+        if total > self.max_bytes:
+            entries.sort(key=lambda e: e[0])
+            for _, manifest, size, shas in entries:
+                if total <= self.max_bytes:
+                    break
+                if manifest.stem in keep:
+                    continue
+                manifest.unlink(missing_ok=True)
+                self.mem.pop(manifest.stem, None)
+                total -= size
+                for sha in shas:
+                    refs[sha] -= 1
+                    if refs[sha] == 0:
+                        total -= sizes.get(sha, 0)
+            log.debug("Fragment cache trimmed to %.1f MB", total / 1e6)
+        for sha in sizes:
+            if not refs.get(sha):
+                self._blob_path(sha).unlink(missing_ok=True)
+
+# ----------------- worker processes -----------------
+# As in batch_build: each worker prepares the template once in the pool initializer
+# and then renders chapters into fragments; only paths and fragments cross the pipe.
+
+_WORKER_SESSION: Optional[TemplateSession] = None
+
+def _init_worker(template_path, styles_path, fast, worker_logs):
+    global _WORKER_SESSION
+    if worker_logs is not None:
+        logconfig.configure_worker(*worker_logs)
+    _WORKER_SESSION = TemplateSession(template_path, styles_path, fast=fast)
+
+def _render_bytes(session: TemplateSession, raw: bytes, key: str, fast: bool) -> Fragment:
+    """The fragment for a chapter's JSON bytes: the very bytes `key` was hashed from."""
+    return render_fragment(session, json.loads(raw.decode("utf-8")), key, fast)
+
+def _render_in_worker(raw: bytes, key: str, fast: bool) -> Fragment:
+    return _render_bytes(_WORKER_SESSION, raw, key, fast)
+
+# ----------------- builder -----------------
+
+@dataclass
+class BuildReport:
+    output: str
+    rendered: List[str]
+    reused: List[str]
+    seconds: float
+    render_seconds: float
+    splice_seconds: float
+    save_seconds: float
+
+class IncrementalBuilder:
+    """
+    Keeps the prepared template and the fragments between builds, so a long-lived
+    builder (e.g. a watch loop) only pays for the chapters that changed. With
+    workers != 1, a build that renders several chapters spreads them over a process
+    pool that lives as long as the builder (close() shuts it down).
+    """
+
+    def __init__(self, styles_path: str, template_path: Optional[str] = None,
+                 cache_dir: Optional[str] = ".build-cache", fast: bool = False,
+                 workers: int = 1, log_settings=None, cache_max_bytes: Optional[int] = 512 << 20):
+        self.styles_path = styles_path
+        self.template_path = template_path
+        self.fast = fast
+        if workers < 0:
+            raise ValueError(f"workers must be >= 0 (0 = one per CPU), got {workers}")
+        self.workers = workers or os.cpu_count() or 1
+        self.log_settings = log_settings
+        self.cache = FragmentCache(cache_dir, cache_max_bytes)
+        self.session: Optional[TemplateSession] = None
+        self.session_key: Optional[str] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_key: Optional[str] = None
+        self._logs: Optional[logconfig.WorkerLogs] = None
+
+    def _session(self) -> TemplateSession:
+        parts = [file_digest(self.styles_path), file_digest(self.template_path) if self.template_path else "-"]
+        key = hashlib.sha256("|".join(parts).encode()).hexdigest()
+        if key != self.session_key:
+            self.session = TemplateSession(self.template_path, self.styles_path, fast=self.fast)
+            self.session_key = key
+        return self.session
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # workers hold their own prepared template: a changed style spec or template retires them
+        if self._pool is None or self._pool_key != self.session_key:
+            self.close()
+            if self.log_settings is not None:
+                self._logs = logconfig.WorkerLogs(self.log_settings[0], self.log_settings[2])
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.template_path, self.styles_path, self.fast,
+                                                       self._logs and self._logs.settings))
+            self._pool_key = self.session_key
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_key = None
+        if self._logs is not None:
+            self._logs.close()
+            self._logs = None
+
+    def _render(self, session: TemplateSession, todo: List[Tuple[bytes, str]]) -> Iterator[Fragment]:
+        """Fragments for (chapter bytes, key) pairs, in order."""
+        if self.workers == 1 or len(todo) < 2:
+            for raw, key in todo:
+                yield _render_bytes(session, raw, key, self.fast)
+            return
+        pool = self._executor()
+        try:
+            futures = [pool.submit(_render_in_worker, raw, key, self.fast) for raw, key in todo]
+            for fut in futures:
+                yield fut.result()
+        except BrokenProcessPool:
+            # a worker died (or its initializer failed): the pool takes no more work, so
+            # drop it and let the next build start a fresh one
+            self.close()
+            raise
+
+    def build(self, chapters: List[str], output: str, force: bool = False) -> BuildReport:
+        t0 = time.perf_counter()
+        session = self._session()
+        rendered, reused, todo = [], [], []
+        fragments: List[Optional[Fragment]] = []
+        for path in chapters:
+            key = fragment_key(file_digest(path), self.session_key, self.fast)
+            frag = None if force else self.cache.get(key)
+            if frag is None:
+                # render from one read of the file, keyed by the hash of those bytes (the
+                # stat-memoized digest above may predate an edit that kept mtime and size)
+                raw = Path(path).read_bytes()
+                read_key = fragment_key(hashlib.sha256(raw).hexdigest(), self.session_key, self.fast)
+                if read_key != key:
+                    key = read_key
+                    frag = None if force else self.cache.get(key)
+            if frag is None:
+                todo.append((raw, key))
+                rendered.append(path)
+            else:
+                reused.append(path)
+            fragments.append(frag)
+        missing = [i for i, f in enumerate(fragments) if f is None]
+        for i, frag in zip(missing, self._render(session, todo)):
+            self.cache.put(frag)
+            fragments[i] = frag
+        self.cache.retain(f.key for f in fragments)
+        if todo:
+            self.cache.evict(f.key for f in fragments)
+        t1 = time.perf_counter()
+
+        doc = session.new_document()
+        splice(doc, fragments)
+        t2 = time.perf_counter()
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        save_docx(doc, output)
+        t3 = time.perf_counter()
+        return BuildReport(output, rendered, reused, round(t3 - t0, 4), round(t1 - t0, 4),
+                           round(t2 - t1, 4), round(t3 - t2, 4))
+
+CHAPTER_PATTERNS = ("*.json",)     # what a chapter directory contributes, and all that is watched in it
+
+def chapter_paths(sources: List[str]) -> List[str]:
+    """Chapter files in order; a directory contributes its *.json files (not hidden or lock files), sorted by name."""
+    out = []
+    for s in sources:
+        p = Path(s)
+        out.extend(sorted(str(x) for x in p.glob("*.json") if not watch.ignored(x.name)) if p.is_dir() else [s])
+    return out
+
+def watch_and_rebuild(builder: IncrementalBuilder, sources: List[str], output: str,
+                      poll: bool = False, quiet: float = 0.2, budget: float = 1.0, force: bool = False):
+    """
+    Rebuild `output` whenever a chapter (or a file added to a chapter directory), the
+    style spec or the template changes. Latency is measured from the first change of
+    a burst to the output being written, so it includes the debounce window. `force`
+    re-renders every chapter in the first build; rebuilds re-render what changed. A
+    failed build (the first one included) is reported and the next change retries.
+    """
+    paths = list(sources) + [builder.styles_path] + ([builder.template_path] if builder.template_path else [])
+    watcher = watch.make_watcher(paths, poll=poll, patterns=CHAPTER_PATTERNS)
+    watching = f"watching {len(paths)} paths ({type(watcher).__name__}), Ctrl+C to stop"
+    try:
+        try:
+            r = builder.build(chapter_paths(sources), output, force=force)
+            print(f"[watch] {r.output}: {len(r.rendered)} chapters rendered in {r.seconds:.3f}s; {watching}")
+        except Exception as e:    # e.g. a chapter with a syntax error; fixing it triggers a rebuild
+            log.debug("Initial build failed", exc_info=True)
+            print(f"[watch] {output}: build failed: {type(e).__name__}: {e}; {watching}")
+        ignore = {os.path.abspath(output), os.path.abspath(output) + ".tmp"}
+        for changed, first in watch.debounced(watcher, quiet):
+            changed -= ignore        # our own output, when it lands in a watched directory
+            if not changed: continue
+            names = ", ".join(sorted(os.path.basename(p) for p in changed))
+            try:
+                r = builder.build(chapter_paths(sources), output)
+            except Exception as e:    # e.g. a JSON caught half-written; the next save retries
+                log.debug("Rebuild failed", exc_info=True)
+                print(f"[watch] {names}: rebuild failed: {type(e).__name__}: {e}")
+                continue
+            latency = time.perf_counter() - first
+            flag = "" if latency <= budget else f"  (over the {budget:.1f}s budget)"
+            print(f"[watch] {names}: {len(r.rendered)} rendered, {len(r.reused)} cached, "
+                  f"latency {latency:.3f}s (build {r.seconds:.3f}s: render {r.render_seconds:.3f}s, "
+                  f"splice {r.splice_seconds:.3f}s, save {r.save_seconds:.3f}s){flag}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Build a multi-chapter .docx, re-rendering only changed chapters.")
+    ap.add_argument("styles_json")
+    ap.add_argument("output_docx")
+    ap.add_argument("chapters", nargs="+", help="Chapter content JSONs in document order (a directory: its *.json by name)")
+    ap.add_argument("--template", default=None, help="Template .docx (default: python-docx default)")
+    ap.add_argument("--cache-dir", default=".build-cache", help="Fragment cache directory ('' = memory only)")
+    ap.add_argument("--cache-max-mb", type=float, default=512, metavar="MB",
+                    help="Trim the cache directory to this size, least recently used first (0 = no limit)")
+    ap.add_argument("--force", action="store_true", help="Re-render every chapter (with --watch: in the first build)")
+    ap.add_argument("--fast", action="store_true", help="Use build_docx's FastEmitter")
+    ap.add_argument("--report", default=None, metavar="PATH", help="Write the build report as JSON")
+    ap.add_argument("-j", "--workers", type=int, default=1,
+                    help="Worker processes rendering chapters (1 = in-process, 0 = one per CPU)")
+    ap.add_argument("--watch", action="store_true", help="Keep running and rebuild on every change")
+    ap.add_argument("--poll", action="store_true", help="--watch: poll file stats instead of using inotify")
+    ap.add_argument("--debounce", type=float, default=0.2, metavar="SECONDS",
+                    help="--watch: quiet period that ends a burst of changes")
+    logconfig.add_arguments(ap)
+    args = ap.parse_args()
+    if args.workers < 0:
+        ap.error("-j/--workers must be >= 0")
+    logconfig.configure_from_args(args)
+
+    builder = IncrementalBuilder(args.styles_json, args.template, args.cache_dir or None, fast=args.fast,
+                                 workers=args.workers, cache_max_bytes=int(args.cache_max_mb * 2**20) or None,
+                                 log_settings=(args.log_level, args.log_json, logconfig.parse_modules(args.trace)))
+    try:
+        if args.watch:
+            watch_and_rebuild(builder, args.chapters, args.output_docx, poll=args.poll, quiet=args.debounce,
+                              force=args.force)
+            return
+        r = builder.build(chapter_paths(args.chapters), args.output_docx, force=args.force)
+    finally:
+        builder.close()
+    print(f"Wrote {r.output}: {len(r.rendered)} rendered, {len(r.reused)} cached, {r.seconds:.3f}s "
+          f"(render {r.render_seconds:.3f}s, splice {r.splice_seconds:.3f}s, save {r.save_seconds:.3f}s)")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(asdict(r), f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# ir.py
+#
+# Block IR shared by the builders. Each content format is lowered once into a flat
+# list of small typed blocks; the emitters consume that list instead of walking the
+# JSON dicts with their own key conventions.
+#
+#   blocks = ir.lower_section(node, meta)       # build_docx content (write_section)
+#   blocks = ir.lower_add_docx(data)            # add_docx.py chapter JSON
+#   blocks = ir.lower_custom_chapter(chapter)   # add_custom_chapter chapter object
+#
+# Block types: Heading, Para, ListItem, Image, Caption, SectionBreak. A style of None
+# means "the emitter's default for this block" (Heading N, the body style, the list
+# style for the list kind). Style names are interned, so the many blocks naming one
+# style share a single string and emitters can cache per-style work on it.
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Union
+import base64, sys
+
+def style_ref(name: Optional[str]) -> Optional[str]:
+    return None if name is None else sys.intern(name)
+
+class Block:
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__)})"
+
+class Heading(Block):
+    __slots__ = ("text", "level", "style")
+
+    def __init__(self, text: str, level: int = 1, style: Optional[str] = None):
+        self.text, self.level, self.style = text, level, style_ref(style)
+
+class Para(Block):
+    __slots__ = ("text", "style")
+
+    def __init__(self, text: str, style: Optional[str] = None):
+        self.text, self.style = text, style_ref(style)
+
+class ListItem(Block):
+    __slots__ = ("text", "kind", "style")
+
+    def __init__(self, text: str, kind: Optional[str] = "ol", style: Optional[str] = None):
+        self.text, self.kind, self.style = text, kind, style_ref(style)
+
+class Image(Block):
+    __slots__ = ("path", "style")     # path: file path, or the bytes of an embedded figure
+
+    def __init__(self, path: Union[str, bytes], style: Optional[str] = None):
+        self.path, self.style = path, style_ref(style)
+
+class Caption(Block):
+    __slots__ = ("text", "style")
+
+    def __init__(self, text: str, style: Optional[str] = None):
+        self.text, self.style = text, style_ref(style)
+
+class SectionBreak(Block):
+    """A new section; header/footer are the format's own config, applied by its emitter."""
+    __slots__ = ("start", "header", "footer")
+
+    def __init__(self, start: str = "oddPage", header: Optional[Dict] = None, footer: Optional[Dict] = None):
+        self.start, self.header, self.footer = start, header, footer
+
+# ----------------- build_docx content -----------------
+
+def lower_section(node: Dict, meta: Dict) -> List[Block]:
+    """write_section's input: the section break, then the chapter title, intro and sections."""
+    sect_cfg = node.get("section") or {}
+    out: List[Block] = [SectionBreak(sect_cfg.get("break", "oddPage"), node.get("header") or None,
+                                     node.get("footer") or None)]
+    ch = node.get("chapter")
+    if ch:
+        body = meta.get("defaultParagraphStyle", "Normal")
+        out.append(Heading(ch["title"], 1))
+        for par in ch.get("intro", []):
+            # {"text": "..."} or a plain string
+            out.append(Para(par.get("text") if isinstance(par, dict) else str(par), body))
+        for sec in ch.get("sections", []):
+            out.extend(lower_subsection(sec, meta))
+    return out
+
+def lower_subsection(sec: Dict, meta: Dict) -> Iterator[Block]:
+    yield Heading(sec["title"], sec.get("level", 2))
+    for node in sec.get("content", []):
+        yield from lower_content_node(node, meta)
+    for sub in sec.get("sections", []):
+        yield from lower_subsection(sub, meta)
+
+def lower_content_node(node, meta: Dict) -> Iterator[Block]:
+    """One entry of a section's "content": a paragraph, a list, or a plain string."""
+    if isinstance(node, dict) and "text" in node:
+        yield Para(node["text"], meta.get("defaultParagraphStyle", "Normal"))
+    elif isinstance(node, dict) and "list" in node:
+        kind = node["list"].get("type", "ol")
+        style = meta.get("listStyleMap", {}).get(kind)
+        for item in node["list"].get("items", []):
+            yield ListItem(item.get("text") if isinstance(item, dict) else str(item), kind, style)
+    elif isinstance(node, str):
+        yield Para(node, meta.get("defaultParagraphStyle", "Normal"))
+
+# ----------------- add_docx.py chapter JSON -----------------
+
+def lower_add_docx(data: Dict) -> List[Block]:
+    """Chapter title, intro and sections of an add_docx chapter; every block names its style."""
+    ch = data["chapter"]
+    out: List[Block] = [Heading(ch["title"], 1, ch["style"])]
+    out.extend(Para(p["text"], p["style"]) for p in ch["intro"])
+    for sec in ch["sections"]:
+        out.append(Heading(sec["title"], 2, sec["style"]))
+        for block in sec.get("content", []):
+            out.extend(lower_add_docx_block(block))
+        for sub in sec.get("sub_sections", []):
+            out.append(Heading(sub["title"], 3, sub.get("style")))
+            for block in sub.get("content", []):
+                out.extend(lower_add_docx_block(block, sub=True))
+    return out
+
+def lower_add_docx_block(block: Dict, sub: bool = False) -> Iterator[Block]:
+    """One "content" entry; sub-sections take text or a list per block (no uploads)."""
+    if "text" in block:
+        yield Para(block["text"], block.get("style"))
+        if sub: return
+    if "list" in block:
+        yield from (ListItem(item["text"], None, item.get("style")) for item in block["list"])
+        if sub: return
+    if "upload" in block and not sub:
+        for item in block["upload"]:
+            if "image" in item:
+                yield Image(image_source(item["image"]), item.get("style"))
+            if "text" in item:
+                yield Caption(item["text"], item.get("style"))
+
+def image_source(value: Union[str, bytes]) -> Union[str, bytes]:
+    """An image path, or the bytes of an embedded "data:image/...;base64,..." figure."""
+    if isinstance(value, bytes):
+        return value        # json_stream decodes the figure as it reads it
+    if value.startswith("data:"):
+        header, _, payload = value.partition(",")
+        if header.endswith(";base64"):
+            return base64.b64decode(payload)
+    return value
+
+def images(blocks: Iterable[Block]) -> Iterator[str]:
+    """Image file paths (embedded figures are already bytes)."""
+    return (b.path for b in blocks if type(b) is Image and isinstance(b.path, str))
+
+def prefetch_ahead(blocks: Iterable[Block], start: Callable[[List[str]], Any], window: int = 32) -> Iterator[Block]:
+    """
+    `blocks` unchanged, but read up to `window` blocks ahead, calling start([path])
+    for each image file as it is read (ImagePipeline.prefetch for a streamed chapter).
+    An embedded figure is passed on at once rather than held in the window.
+    """
+    ahead: Deque[Block] = deque()
+    for b in blocks:
+        if type(b) is Image:
+            if not isinstance(b.path, str):
+                yield from ahead
+                ahead.clear()
+                yield b
+                continue
+            start([b.path])
+        ahead.append(b)
+        if len(ahead) > window:
+            yield ahead.popleft()
+    yield from ahead
+
+# ----------------- add_custom_chapter chapter object -----------------
+
+def paragraph_texts(x) -> List[str]:
+    if x is None: return []
+    if isinstance(x, str): return [x.strip()]
+    if isinstance(x, list): return [str(t).strip() for t in x if str(t).strip()]
+    return []
+
+def lower_custom_chapter(chapter: Dict) -> List[Block]:
+    """Title, intro and nested sections; styles are left to the emitter (inferred from a template)."""
+    out: List[Block] = [Heading(chapter["title"], 1)]
+    out.extend(Para(p) for p in paragraph_texts(chapter.get("intro")))
+    out.extend(lower_custom_sections(chapter.get("sections", [])))
+    return out
+
+def lower_custom_sections(sections: List[Dict]) -> Iterator[Block]:
+    for s in sections:
+        yield Heading(s.get("title", ""), int(s.get("level", 2)))
+        yield from (Para(p) for p in paragraph_texts(s.get("content")))
+        yield from lower_custom_sections(s.get("sections", []))
@@ -0,0 +1,466 @@
+# json_stream.py
+#
+# Streaming ingestion of content JSON: an event parser over a text stream, and
+# lowerings that turn a build_docx / add_docx content file into IR blocks (ir.py)
+# as it is read. Only the block being lowered is held in memory (one paragraph,
+# list or upload entry, including its embedded base64 figure), so peak memory does
+# not grow with the size of the file.
+#
+#   with open("huge-chapter.json", encoding="utf-8") as f:
+#       emitter.emit(json_stream.stream_section(f))          # same blocks as ir.lower_section
+#
+#   head, blocks = json_stream.stream_add_docx(f)           # head: top-level keys before "chapter"
+#
+# Blocks come out in file order. The small keys that shape a block (title, level,
+# style, meta, header, ...) must come before the large ones it contains (content,
+# sections, chapter), as the exporters write them. Otherwise the block is either
+# held back until the keys arrive (a title after its content), or a ValueError
+# names the key that came too late, where earlier output would change.
+#
+# The tokenizer uses json's C string scanner; a long string grows the read size
+# geometrically, so it is scanned a bounded number of times. A base64 data URI under
+# one of `binary_keys` (stream_add_docx: "image") is decoded chunk by chunk as it is
+# read instead, and comes out as the figure's bytes: neither the whole base64 text
+# nor a buffer holding it is ever built.
+
+from json.decoder import JSONDecodeError, scanstring
+from typing import AbstractSet, Any, Callable, Dict, IO, Iterator, List, Optional, Tuple
+import binascii, re
+
+import ir
+
+START_MAP, END_MAP, MAP_KEY = "start_map", "end_map", "map_key"
+START_ARRAY, END_ARRAY = "start_array", "end_array"
+STRING, NUMBER, BOOLEAN, NULL = "string", "number", "boolean", "null"
+SCALARS = frozenset((STRING, NUMBER, BOOLEAN, NULL))
+
+Event = Tuple[str, Any]
+
+# ----------------- tokenizer -----------------
+
+_WS = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+_LITERALS = (("true", BOOLEAN, True), ("false", BOOLEAN, False), ("null", NULL, None),
+             ("NaN", NUMBER, float("nan")), ("Infinity", NUMBER, float("inf")),
+             ("-Infinity", NUMBER, float("-inf")))   # json.load accepts the last three too
+_DATA_URI = re.compile(r'data:[^",]{0,200}?;base64,')
+_NOT_BASE64 = re.compile(r"[^A-Za-z0-9+/=]+")
+_CONTROL = re.compile(r"[\x00-\x1f]")
+
+class _Lexer:
+    def __init__(self, fp: IO[str], chunk: int):
+        self.fp, self.chunk = fp, chunk
+        self.buf, self.pos, self.eof = "", 0, False
+        self.consumed = 0          # characters dropped from the front of buf
+        self.start = 0             # where the last token began, for errors
+
+    def more(self, want: int = 0) -> bool:
+        """Append at least `want` (default one chunk) more characters; False at end of input."""
+        if self.eof: return False
+        data = self.fp.read(max(self.chunk, want))
+        if not data:
+            self.eof = True
+            return False
+        self.consumed += self.pos
+        buf = self.buf[self.pos:] if self.pos else self.buf
+        self.buf = ""         # sole reference left in `buf`: += can grow it in place
+        buf += data
+        self.buf, self.pos = buf, 0
+        return True
+
+    def error(self, msg: str) -> ValueError:
+        return ValueError(f"JSON stream: {msg} (character {self.start})")
+
+    def data_uri(self) -> Optional[bytes]:
+        """
+        The decoded payload of a base64 data URI string at self.pos, read one chunk at
+        a time; None (nothing consumed) when the string is not one.
+        """
+        while len(self.buf) - self.pos < 256 and self.more():
+            pass
+        m = _DATA_URI.match(self.buf, self.pos + 1)
+        if m is None:
+            return None
+        self.pos = m.end()
+        pieces: List[bytes] = []
+        carry = ""
+        while True:
+            buf = self.buf
+            end = buf.find('"', self.pos)
+            while end >= 0 and (end - self.pos - len(buf[self.pos:end].rstrip("\\"))) % 2:
+                end = buf.find('"', end + 1)         # an escaped quote
+            stop = end if end >= 0 else len(buf)
+            if end < 0:
+                tail = buf.rfind("\\", max(self.pos, stop - 5), stop)
+                if tail >= 0 and (tail + 1 - self.pos - len(buf[self.pos:tail + 1].rstrip("\\"))) % 2:
+                    stop = tail                      # an escape may continue in the next read
+            seg = buf[self.pos:stop]
+            if _CONTROL.search(seg):
+                raise self.error("Invalid control character in string")
+            if "\\" in seg:
+                try:
+                    seg = scanstring(f'"{seg}"', 1, True)[0]
+                except JSONDecodeError as e:
+                    raise self.error(e.msg) from None
+            seg = carry + _NOT_BASE64.sub("", seg)
+            whole = len(seg) - len(seg) % 4
+            try:
+                if end >= 0:
+                    pieces.append(binascii.a2b_base64(seg))
+                    self.pos = end + 1
+                    return b"".join(pieces)
+                pieces.append(binascii.a2b_base64(seg[:whole]))
+            except binascii.Error as e:
+                raise self.error(f"bad base64 in data URI: {e}") from None
+            carry, self.pos = seg[whole:], stop
+            if not self.more():
+                raise self.error("Unterminated string")
+
+    def token(self, data_uri: bool = False):
+        """
+        '{', '}', '[', ']', ':', ',', a (kind, value) scalar, or None at end of input.
+        With `data_uri`, a base64 data URI string is returned as (STRING, its bytes).
+        """
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf): break
+            if not self.more(): return None
+        self.start = self.consumed + self.pos
+        c = self.buf[self.pos]
+        if c in "{}[]:,":
+            self.pos += 1
+            return c
+        if c == '"':
+            if data_uri:
+                blob = self.data_uri()
+                if blob is not None:
+                    return (STRING, blob)
+            while True:
+                try:
+                    s, self.pos = scanstring(self.buf, self.pos + 1, True)
+                    return (STRING, s)
+                except JSONDecodeError as e:
+                    # an unterminated string (or escape) at the end of the buffer: read on
+                    if not self.more(len(self.buf)):
+                        raise self.error(e.msg) from None
+        for word, kind, value in _LITERALS:
+            if c == word[0]:
+                while len(self.buf) - self.pos < len(word) and self.more():
+                    pass
+                if self.buf.startswith(word, self.pos):
+                    self.pos += len(word)
+                    return (kind, value)
+        if c == "-" or "0" <= c <= "9":
+            # "1." / "1e" / "1e-" at the end of the buffer may continue in the next read
+            while len(self.buf) - self.pos < 32 and self.more():
+                pass
+            m = _NUMBER.match(self.buf, self.pos)
+            while m is not None and len(self.buf) - m.end() < 3 and self.more():
+                m = _NUMBER.match(self.buf, self.pos)
+            if m is None:
+                raise self.error(f"unexpected {c!r}")
+            text = m.group()
+            self.pos = m.end()
+            return (NUMBER, int(text) if text.lstrip("-").isdigit() else float(text))
+        raise self.error(f"unexpected {c!r}")
+
+# ----------------- event parser -----------------
+
+_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END, _COLON, _AFTER = range(6)
+
+def events(fp: IO[str], chunk: int = 1 << 16, binary_keys: AbstractSet[str] = frozenset()) -> Iterator[Event]:
+    """
+    (event, value) pairs for the JSON document in `fp` (opened in text mode). A base64
+    data URI that is the value of a key in `binary_keys` is yielded decoded, as bytes.
+    """
+    lex = _Lexer(fp, chunk)
+    stack: List[bool] = []      # True: in a map
+    state = _VALUE
+    binary = binary_key = False     # the next value / the last key is one of binary_keys
+    while True:
+        t = lex.token(binary)
+        binary = False
+        if t is None:
+            if stack or state != _AFTER:
+                raise lex.error("unexpected end of input")
+            return
+        if state == _VALUE or state == _VALUE_OR_END:
+            if t == "]" and state == _VALUE_OR_END:
+                stack.pop()
+                yield (END_ARRAY, None)
+                state = _AFTER
+            elif t == "{":
+                stack.append(True)
+                yield (START_MAP, None)
+                state = _KEY_OR_END
+            elif t == "[":
+                stack.append(False)
+                yield (START_ARRAY, None)
+                state = _VALUE_OR_END
+            elif type(t) is tuple:
+                yield t
+                state = _AFTER
+            else:
+                raise lex.error(f"unexpected {t!r}")
+        elif state == _KEY or state == _KEY_OR_END:
+            if t == "}" and state == _KEY_OR_END:
+                stack.pop()
+                yield (END_MAP, None)
+                state = _AFTER
+            elif type(t) is tuple and t[0] == STRING:
+                yield (MAP_KEY, t[1])
+                binary_key = t[1] in binary_keys
+                state = _COLON
+            else:
+                raise lex.error(f"expected a key, got {t!r}")
+        elif state == _COLON:
+            if t != ":":
+                raise lex.error(f"expected ':', got {t!r}")
+            binary = binary_key
+            state = _VALUE
+        else:
+            if not stack:
+                raise lex.error("extra data after the document")
+            if t == ",":
+                state = _KEY if stack[-1] else _VALUE
+            elif t == ("}" if stack[-1] else "]"):
+                stack.pop()
+                yield (END_MAP if t == "}" else END_ARRAY, None)
+            else:
+                raise lex.error(f"unexpected {t!r}")
+
+# ----------------- reader -----------------
+
+class Reader:
+    """
+    Pull access to an event stream. map_keys()/array_items() walk a container; for
+    each key or item the caller consumes exactly one value (value(), skip(), or a
+    nested walk) before asking for the next.
+    """
+
+    def __init__(self, evs: Iterator[Event]):
+        self._it = iter(evs)
+        self._peeked: Optional[Event] = None
+
+    def next(self) -> Event:
+        if self._peeked is not None:
+            ev, self._peeked = self._peeked, None
+            return ev
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise ValueError("JSON stream: unexpected end of input") from None
+
+    def peek(self) -> str:
+        """The next event's type, without consuming it."""
+        if self._peeked is None:
+            self._peeked = self.next()
+        return self._peeked[0]
+
+    def _expect(self, want: str):
+        ev, _ = self.next()
+        if ev != want:
+            raise ValueError(f"JSON stream: expected {want}, got {ev}")
+
+    def value(self) -> Any:
+        """The next value, built in full."""
+        ev, v = self.next()
+        if ev in SCALARS:
+            return v
+        if ev not in (START_MAP, START_ARRAY):
+            raise ValueError(f"JSON stream: expected a value, got {ev}")
+        root: Any = {} if ev == START_MAP else []
+        stack: List[Any] = [root]
+        key: Optional[str] = None
+        keys: List[Optional[str]] = []
+        while stack:
+            ev, v = self.next()
+            top = stack[-1]
+            if ev == MAP_KEY:
+                key = v
+                continue
+            if ev == END_MAP or ev == END_ARRAY:
+                stack.pop()
+                key = keys.pop() if keys else None
+                continue
+            if ev == START_MAP or ev == START_ARRAY:
+                child: Any = {} if ev == START_MAP else []
+                if type(top) is dict:
+                    top[key] = child
+                else:
+                    top.append(child)
+                stack.append(child)
+                keys.append(key)
+                continue
+            if type(top) is dict:
+                top[key] = v
+            else:
+                top.append(v)
+        return root
+
+    def skip(self):
+        depth = 0
+        while True:
+            ev, _ = self.next()
+            if ev == START_MAP or ev == START_ARRAY:
+                depth += 1
+            elif ev == END_MAP or ev == END_ARRAY:
+                depth -= 1
+            elif ev == MAP_KEY:
+                continue
+            if depth == 0:
+                return
+
+    def map_keys(self) -> Iterator[str]:
+        self._expect(START_MAP)
+        while True:
+            ev, v = self.next()
+            if ev == END_MAP:
+                return
+            if ev != MAP_KEY:
+                raise ValueError(f"JSON stream: expected a key, got {ev} (value not consumed?)")
+            yield v
+
+    def array_items(self) -> Iterator[int]:
+        self._expect(START_ARRAY)
+        i = 0
+        while self.peek() != END_ARRAY:
+            yield i
+            i += 1
+        self.next()
+
+# ----------------- streamed lowering -----------------
+
+Part = Callable[[Reader, Dict], Iterator[ir.Block]]
+
+def _stream_map(r: Reader, where: str, required: Tuple[str, ...], optional: Tuple[str, ...],
+                parts: Dict[str, Part], head: Callable[[Dict], List[ir.Block]],
+                skip_empty: bool = False) -> Iterator[ir.Block]:
+    """
+    Lower a map whose small keys (required/optional) are read whole and whose large
+    keys (`parts`, in output order) are lowered as they arrive. head(values) opens the
+    map once the required keys are known; parts that arrive earlier are held back.
+    With skip_empty, an empty map lowers to nothing.
+    """
+    order = list(parts)
+    vals: Dict[str, Any] = {}
+    opened, last, waiting, seen = False, -1, [], False
+    for key in r.map_keys():
+        seen = True
+        if key in parts:
+            i = order.index(key)
+            if i < last:
+                raise ValueError(f"{where}: {key!r} comes after {order[last]!r}; streaming needs the order {order}")
+            last = i
+            if not opened and all(k in vals for k in required):
+                opened = True
+                yield from head(vals)
+                yield from waiting
+                waiting = []
+            if opened:
+                yield from parts[key](r, vals)
+            else:
+                waiting.extend(parts[key](r, vals))
+        elif key in required or key in optional:
+            if opened:
+                raise ValueError(f"{where}: {key!r} comes after {order[last]!r}; streaming needs it first")
+            vals[key] = r.value()
+        else:
+            r.skip()
+    if not opened:
+        if skip_empty and not seen:
+            return
+        for k in required:
+            if k not in vals:
+                raise KeyError(k)      # as the dict-based lowering would
+        yield from head(vals)
+        yield from waiting
+
+def _each(lower: Callable[[Any], Iterator[ir.Block]]) -> Part:
+    """An array part whose items are read whole, one at a time, and lowered."""
+    def part(r: Reader, vals: Dict) -> Iterator[ir.Block]:
+        for _ in r.array_items():
+            yield from lower(r.value())
+    return part
+
+class Content:
+    """A top-level content map read up to `body` (default "chapter"); .head holds the keys before it."""
+
+    def __init__(self, fp: IO[str], body: str = "chapter", chunk: int = 1 << 16,
+                 binary_keys: AbstractSet[str] = frozenset()):
+        self.reader = Reader(events(fp, chunk, binary_keys))
+        self.body = body
+        self.head: Dict[str, Any] = {}
+        self._keys = self.reader.map_keys()
+        self.has_body = False
+        for key in self._keys:
+            if key == body:
+                self.has_body = True
+                break
+            self.head[key] = self.reader.value()
+
+    def body_blocks(self, lower: Callable[[Reader], Iterator[ir.Block]], needs: Tuple[str, ...] = ()) -> Iterator[ir.Block]:
+        """Lower the body, then check that none of the head keys `needs` come after it."""
+        if self.has_body:
+            yield from lower(self.reader)
+        for key in self._keys:
+            if key in needs:
+                raise ValueError(f"{key!r} comes after {self.body!r}; streaming needs it first")
+            self.reader.skip()
+
+# build_docx content (ir.lower_section)
+
+def _build_section(meta: Dict) -> Part:
+    def part(r: Reader, vals: Dict) -> Iterator[ir.Block]:
+        return _stream_map(r, "section", ("title",), ("level",),
+                           {"content": _each(lambda node: ir.lower_content_node(node, meta)),
+                            "sections": lambda r, v: (b for _ in r.array_items() for b in part(r, {}))},
+                           lambda v: [ir.Heading(v["title"], v.get("level", 2))])
+    return part
+
+def stream_section(fp: IO[str], chunk: int = 1 << 16) -> Iterator[ir.Block]:
+    """ir.lower_section(spec, spec["meta"]) for the build_docx content JSON in `fp`, streamed."""
+    content = Content(fp, chunk=chunk)
+    head = content.head
+    meta = head.get("meta", {})
+    yield ir.SectionBreak((head.get("section") or {}).get("break", "oddPage"), head.get("header") or None,
+                          head.get("footer") or None)
+    body = meta.get("defaultParagraphStyle", "Normal")
+    section = _build_section(meta)
+    def chapter(r: Reader) -> Iterator[ir.Block]:
+        # "chapter": null / {} writes no heading, as in lower_section
+        if r.peek() != START_MAP:
+            r.skip()
+            return
+        yield from _stream_map(r, "chapter", ("title",), (), {
+            "intro": _each(lambda par: [ir.Para(par.get("text") if isinstance(par, dict) else str(par), body)]),
+            "sections": lambda r, v: (b for _ in r.array_items() for b in section(r, {})),
+        }, lambda v: [ir.Heading(v["title"], 1)], skip_empty=True)
+    yield from content.body_blocks(chapter, needs=("meta", "section", "header", "footer"))
+
+# add_docx chapter JSON (ir.lower_add_docx)
+
+def _add_docx_sub(r: Reader, vals: Dict) -> Iterator[ir.Block]:
+    return _stream_map(r, "sub_section", ("title",), ("style",),
+                       {"content": _each(lambda b: ir.lower_add_docx_block(b, sub=True))},
+                       lambda v: [ir.Heading(v["title"], 3, v.get("style"))])
+
+def _add_docx_section(r: Reader, vals: Dict) -> Iterator[ir.Block]:
+    return _stream_map(r, "section", ("title", "style"), (),
+                       {"content": _each(ir.lower_add_docx_block),
+                        "sub_sections": lambda r, v: (b for _ in r.array_items() for b in _add_docx_sub(r, {}))},
+                       lambda v: [ir.Heading(v["title"], 2, v["style"])])
+
+def _add_docx_chapter(r: Reader) -> Iterator[ir.Block]:
+    return _stream_map(r, "chapter", ("title", "style"), (), {
+        "intro": _each(lambda p: [ir.Para(p["text"], p["style"])]),
+        "sections": lambda r, v: (b for _ in r.array_items() for b in _add_docx_section(r, {})),
+    }, lambda v: [ir.Heading(v["title"], 1, v["style"])])
+
+def stream_add_docx(fp: IO[str], chunk: int = 1 << 16) -> Tuple[Dict, Iterator[ir.Block]]:
+    """
+    (top-level keys before "chapter", the chapter's blocks as ir.lower_add_docx makes
+    them). Embedded figures are decoded while they are read.
+    """
+    content = Content(fp, chunk=chunk, binary_keys={"image"})
+    return content.head, content.body_blocks(_add_docx_chapter, needs=("section", "header", "footer"))
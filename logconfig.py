@@ -0,0 +1,117 @@
+# logconfig.py
+# Level-gated logging for the build scripts.
+#
+# Modules log through logging.getLogger(__name__) with %-style arguments, so a
+# disabled level costs one level check: nothing is formatted or sliced.
+# Tracing can be switched on per module (e.g. --trace build_docx) and every
+# enabled record can also be written as JSON lines for post-mortem analysis.
+#
+# Pool workers do not open the log file themselves: configure_worker() sends the
+# records that pass a worker's levels to a queue, and WorkerLogs hands them to the
+# parent's handlers, so the console and --log-json each have a single writer.
+
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import sys
+from typing import Dict, Optional, Tuple
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+CONSOLE_FORMAT = "[%(levelname)s] %(name)s: %(message)s"
+
+class JsonLinesHandler(logging.FileHandler):
+    """Writes one JSON object per record."""
+
+    def __init__(self, path: str):
+        super().__init__(path, mode="a", encoding="utf-8", delay=True)
+
+    def format(self, record: logging.LogRecord) -> str:
+        d = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            d["exc"] = logging.Formatter().formatException(record.exc_info)
+        return json.dumps(d, ensure_ascii=False)
+
+def parse_modules(spec: Optional[str]) -> Dict[str, str]:
+    """'build_docx=DEBUG,outline' -> {'build_docx': 'DEBUG', 'outline': 'DEBUG'}"""
+    out: Dict[str, str] = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, lvl = item.partition("=")
+        out[name.strip()] = (lvl.strip() or "DEBUG").upper()
+    return out
+
+def configure(level: str = "WARNING", json_path: Optional[str] = None,
+              modules: Optional[Dict[str, str]] = None):
+    """
+    Console output on stderr at `level`; `modules` raises (or lowers) individual
+    loggers, e.g. {"build_docx": "DEBUG"}. With `json_path`, every record that
+    passes its logger's level is also appended there as JSON lines.
+    """
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+
+    # loggers inherit the global level from root; traced modules override it.
+    # Handlers stay at NOTSET so propagated records from those modules still print.
+    root.setLevel(level.upper())
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    root.addHandler(console)
+    if json_path:
+        root.addHandler(JsonLinesHandler(json_path))
+
+    for name, lvl in (modules or {}).items():
+        logging.getLogger(name).setLevel(lvl)
+
+def configure_worker(queue, level: str = "WARNING", modules: Optional[Dict[str, str]] = None):
+    """configure() for a pool worker: records go to `queue` (WorkerLogs.settings) instead of handlers."""
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+    root.setLevel(level.upper())
+    root.addHandler(logging.handlers.QueueHandler(queue))
+    for name, lvl in (modules or {}).items():
+        logging.getLogger(name).setLevel(lvl)
+
+class WorkerLogs:
+    """
+    The parent's end of worker logging: a queue for configure_worker, drained by a
+    thread into this process's root handlers until close().
+    """
+
+    def __init__(self, level: str = "WARNING", modules: Optional[Dict[str, str]] = None):
+        self.queue = multiprocessing.Queue()
+        self.settings: Tuple = (self.queue, level, modules or {})     # configure_worker(*settings)
+        self._listener = logging.handlers.QueueListener(self.queue, *logging.getLogger().handlers,
+                                                        respect_handler_level=True)
+        self._listener.start()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self.queue.close()
+
+def add_arguments(ap):
+    g = ap.add_argument_group("logging")
+    g.add_argument("--log-level", default="WARNING", choices=LEVELS, type=str.upper,
+                   help="Console log level (default: WARNING)")
+    g.add_argument("--trace", default=None, metavar="MODULE[=LEVEL],...",
+                   help="Per-module levels, e.g. build_docx or build_docx=DEBUG,outline=INFO")
+    g.add_argument("--log-json", default=None, metavar="PATH",
+                   help="Also append enabled records to PATH as JSON lines")
+
+def configure_from_args(args):
+    configure(args.log_level, json_path=args.log_json, modules=parse_modules(args.trace))
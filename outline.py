@@ -0,0 +1,340 @@
+# outline.py
+# pip install python-docx
+#
+# Shared heading-outline engine for the CLIs (apply_replacements, add_chapter_like,
+# add_custom_chapter, extract_structure). One streaming pass over w:body children;
+# heading levels come from a styleId -> level table computed once per document.
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable
+from docx import Document
+from docx.styles import BabelFish
+from docx.text.paragraph import Paragraph
+from docx.oxml.ns import qn
+import re
+
+from textnorm import normalize_text, normalize_cached
+
+HEADING_NAME_RE = re.compile(r'(heading|überschrift|عنوان)\s*(\d+)$')
+
+FM_TITLES = {"فهرست مطالب","فهرست جداول","فهرست اشکال","فهرست شکل‌ها",
+             "Table of Contents","List of Tables","List of Figures"}
+FM_STYLE_KEYS = ("toc heading","table of contents","list of tables","list of figures")
+
+_W_P = qn("w:p")
+_W_PPR = qn("w:pPr")
+_W_PSTYLE = qn("w:pStyle")
+_W_OUTLINELVL = qn("w:outlineLvl")
+_W_SECTPR = qn("w:sectPr")
+_W_VAL = qn("w:val")
+_W_NUMPR = qn("w:numPr")
+_W_NUMID = qn("w:numId")
+_W_ILVL = qn("w:ilvl")
+
+@dataclass(eq=False, slots=True)
+class Node:
+    title: str
+    level: int
+    start_idx: int
+    content_idxs: List[int] = field(default_factory=list)
+    children: List["Node"] = field(default_factory=list)
+    style_id: Optional[str] = None
+    front_matter: bool = False
+    elm: Any = None   # the heading's live w:p element
+
+FM_KEYS = {normalize_text(x) for x in FM_TITLES}
+
+def _num_pr(pPr) -> Optional[Tuple[str, Optional[int]]]:
+    """(numId, ilvl) of a w:pPr/w:numPr; numId '0' means numbering explicitly switched off."""
+    if pPr is None: return None
+    numPr = pPr.find(_W_NUMPR)
+    if numPr is None: return None
+    nid = numPr.find(_W_NUMID)
+    if nid is None: return None
+    il = numPr.find(_W_ILVL)
+    try: ilvl = int(il.get(_W_VAL)) if il is not None else None
+    except (TypeError, ValueError): ilvl = None
+    return nid.get(_W_VAL), ilvl
+
+def _outline_lvl(pPr) -> Optional[int]:
+    """Heading level from a w:pPr/w:outlineLvl (0-based in XML; 9 = body text)."""
+    if pPr is None: return None
+    ol = pPr.find(_W_OUTLINELVL)
+    if ol is None: return None
+    try: v = int(ol.get(_W_VAL))
+    except (TypeError, ValueError): return None
+    return v + 1 if 0 <= v < 9 else None
+
+# ----------------- style table -----------------
+class StyleLevels:
+    """
+    Paragraph-style facts resolved once per document: display name, heading level
+    from the name pattern, outlineLvl and list numbering inherited through basedOn,
+    and whether the style marks a TOC/LOF/LOT title.
+    """
+    def __init__(self, doc: Optional[Document] = None, styles_element=None):
+        """From a Document, or from a parsed word/styles.xml root (streaming callers)."""
+        if styles_element is None:
+            styles_element = doc.styles.element
+        self.names: Dict[str, str] = {}
+        self.name_levels: Dict[str, int] = {}
+        self.chain_levels: Dict[str, int] = {}
+        self.front_matter: Set[str] = set()
+        self.numbered: Set[str] = set()
+        self.num_pr: Dict[str, Tuple[str, int]] = {}   # styleId -> inherited (numId, ilvl)
+        self.default_id: Optional[str] = None
+
+        based_on: Dict[str, Optional[str]] = {}
+        own_lvl: Dict[str, Optional[int]] = {}
+        own_num: Dict[str, Optional[Tuple[str, Optional[int]]]] = {}
+        for s in styles_element.iterchildren(qn("w:style")):
+            if s.get(qn("w:type")) != "paragraph": continue
+            sid = s.get(qn("w:styleId"))
+            if sid is None: continue
+            name_el = s.find(qn("w:name"))
+            raw = name_el.get(_W_VAL) if name_el is not None else sid
+            self.names[sid] = BabelFish.internal2ui(raw)
+            if s.get(qn("w:default")) in ("1", "true", "on") and self.default_id is None:
+                self.default_id = sid
+            base = s.find(qn("w:basedOn"))
+            based_on[sid] = base.get(_W_VAL) if base is not None else None
+            own_lvl[sid] = _outline_lvl(s.find(_W_PPR))
+            own_num[sid] = _num_pr(s.find(_W_PPR))
+
+        for sid, name in self.names.items():
+            lname = name.lower()
+            if any(k in lname for k in FM_STYLE_KEYS):
+                self.front_matter.add(sid)
+            m = HEADING_NAME_RE.search(lname)
+            if m:
+                self.name_levels[sid] = int(m.group(2))
+            cur, seen = sid, set()
+            while cur is not None and cur not in seen:
+                seen.add(cur)
+                if own_lvl.get(cur) is not None:
+                    self.chain_levels[sid] = own_lvl[cur]; break
+                cur = based_on.get(cur)
+            cur, seen = sid, set()
+            while cur is not None and cur not in seen:
+                seen.add(cur)
+                if own_num.get(cur) is not None:
+                    nid, ilvl = own_num[cur]
+                    if nid != "0":
+                        self.numbered.add(sid)
+                        self.num_pr[sid] = (nid, ilvl or 0)
+                    break
+                cur = based_on.get(cur)
+
+    def id_for_name(self, name: str) -> Optional[str]:
+        lname = name.lower()
+        for sid, n in self.names.items():
+            if n.lower() == lname: return sid
+        return None
+
+    def style_id(self, p_elm) -> Optional[str]:
+        pPr = p_elm.find(_W_PPR)
+        if pPr is not None:
+            ps = pPr.find(_W_PSTYLE)
+            if ps is not None:
+                sid = ps.get(_W_VAL)
+                if sid in self.names: return sid
+        return self.default_id
+
+    def name(self, style_id: Optional[str]) -> str:
+        return self.names.get(style_id, "None") if style_id else "None"
+
+    def level(self, p_elm) -> Optional[int]:
+        """Heading level of a w:p: style name, then direct outlineLvl, then the style chain."""
+        sid = self.style_id(p_elm)
+        lvl = self.name_levels.get(sid)
+        if lvl is not None: return lvl
+        direct = _outline_lvl(p_elm.find(_W_PPR))
+        if direct is not None: return direct
+        return self.chain_levels.get(sid)
+
+    def numbering(self, p_elm) -> Optional[Tuple[str, int]]:
+        """Effective (numId, ilvl) of a w:p, or None when it is not a list paragraph."""
+        sid = self.style_id(p_elm)
+        direct = _num_pr(p_elm.find(_W_PPR))
+        if direct is not None:
+            if direct[0] == "0": return None
+            ilvl = direct[1]
+            if ilvl is None: ilvl = self.num_pr.get(sid, (None, 0))[1]
+            return direct[0], ilvl
+        return self.num_pr.get(sid)
+
+    def is_numbered(self, p_elm) -> bool:
+        """Whether a w:p carries list numbering, directly or through its style."""
+        return self.numbering(p_elm) is not None
+
+def has_sectPr_elm(p_elm) -> bool:
+    pPr = p_elm.find(_W_PPR)
+    return pPr is not None and pPr.find(_W_SECTPR) is not None
+
+# ----------------- outline -----------------
+@dataclass
+class Outline:
+    roots: List[Node]
+    paragraphs: List[Any]      # body-level w:p elements, same order as doc.paragraphs
+    styles: StyleLevels
+
+def build_outline(doc: Document, front_matter: bool = True, section_aware: bool = True) -> Outline:
+    """
+    One pass over w:body children. TOC/LOF/LOT titles become their own roots when
+    `front_matter` is set; with `section_aware`, body capture stops at a sectPr.
+    """
+    styles = StyleLevels(doc)
+    return outline_from_paragraphs(doc.element.body.iterchildren(_W_P), styles,
+                                   front_matter=front_matter, section_aware=section_aware)
+
+def outline_from_paragraphs(paragraph_elms: Iterable[Any], styles: StyleLevels,
+                            front_matter: bool = True, section_aware: bool = True) -> Outline:
+    """build_outline over any iterable of body-level w:p elements, e.g. a streaming parse."""
+    paragraphs: List[Any] = []
+    roots: List[Node] = []
+    stack: List[Node] = []
+
+    for elm in paragraph_elms:
+        idx = len(paragraphs)
+        paragraphs.append(elm)
+        sid = styles.style_id(elm)
+
+        if front_matter:
+            text = elm.text
+            if sid in styles.front_matter or normalize_text(text) in FM_KEYS:
+                n = Node(title=text.strip(), level=1, start_idx=idx, style_id=sid,
+                         front_matter=True, elm=elm)
+                roots.append(n)
+                stack.clear(); stack.append(n)
+                continue
+
+        lvl = styles.level(elm)
+        if lvl is not None:
+            node = Node(title=elm.text.strip(), level=lvl, start_idx=idx, style_id=sid, elm=elm)
+            while stack and stack[-1].level >= lvl:
+                stack.pop()
+            if stack: stack[-1].children.append(node)
+            else: roots.append(node)
+            stack.append(node)
+        elif stack:
+            stack[-1].content_idxs.append(idx)
+            if section_aware and has_sectPr_elm(elm):   # stop at section end
+                stack.clear()
+    return Outline(roots=roots, paragraphs=paragraphs, styles=styles)
+
+def build_tree(doc: Document, front_matter: bool = True, section_aware: bool = True) -> List[Node]:
+    return build_outline(doc, front_matter=front_matter, section_aware=section_aware).roots
+
+def iter_nodes(nodes: List[Node]) -> List[Node]:
+    out=[]
+    def walk(n: Node):
+        out.append(n)
+        for c in n.children: walk(c)
+    for r in nodes: walk(r)
+    return out
+
+def heading_paragraph(doc: Document, node: Node) -> Paragraph:
+    return Paragraph(node.elm, doc._body)
+
+# ----------------- title index -----------------
+@dataclass
+class TitleMatch:
+    key: str
+    kind: str                  # "exact" | "substring" | "ambiguous" | "none"
+    nodes: List[Node]          # nodes to act on (empty unless exact / unique substring)
+    candidates: List[Node] = field(default_factory=list)   # every node whose title contains the key
+
+class TitleIndex:
+    """
+    Heading lookup over normalize_text(title). Exact keys hit a dict; otherwise an
+    n-gram inverted index (n <= 3) narrows substring candidates to the titles that
+    contain every gram of the key, rarest posting list first, before the final `in`
+    check. A substring match counts only when exactly one node contains the key;
+    more than one is reported as ambiguous. Results are memoized per key.
+    """
+    N = 3
+
+    def __init__(self, nodes: List[Node]):
+        self.by_title: Dict[str, List[Node]] = {}
+        for n in nodes:
+            self.by_title.setdefault(normalize_cached(n.title), []).append(n)
+        self.titles: List[str] = [t for t in self.by_title if t]
+        self.grams: Dict[str, Set[int]] = {}
+        for i, t in enumerate(self.titles):
+            for n in range(1, self.N + 1):
+                for j in range(len(t) - n + 1):
+                    self.grams.setdefault(t[j:j + n], set()).add(i)
+        self._memo: Dict[str, TitleMatch] = {}
+
+    def _contains(self, want: str) -> List[int]:
+        n = min(self.N, len(want))
+        keys = {want[j:j + n] for j in range(len(want) - n + 1)}
+        postings = sorted((self.grams.get(g, set()) for g in keys), key=len)
+        if not postings or not postings[0]: return []
+        cand = set(postings[0])
+        for p in postings[1:]:
+            cand &= p
+            if not cand: return []
+        return sorted(i for i in cand if want in self.titles[i])
+
+    def lookup(self, key: str) -> TitleMatch:
+        want = normalize_text(key)
+        hit = self._memo.get(want)
+        if hit is not None: return hit
+        if want in self.by_title:
+            m = TitleMatch(key, "exact", list(self.by_title[want]))
+        elif not want:
+            m = TitleMatch(key, "none", [])
+        else:
+            cands = [n for i in self._contains(want) for n in self.by_title[self.titles[i]]]
+            if len(cands) == 1: m = TitleMatch(key, "substring", cands, cands)
+            elif cands: m = TitleMatch(key, "ambiguous", [], cands)
+            else: m = TitleMatch(key, "none", [])
+        self._memo[want] = m
+        return m
+
+# ----------------- block index -----------------
+class BlockIndex:
+    """
+    Document-level paragraph index, built once per run.
+
+    `doc.paragraphs` rebuilds the whole list on every access; this keeps the
+    live `w:p` elements addressable by the positions stored on Node
+    (start_idx / content_idxs). Removed paragraphs are tombstoned and inserted
+    ones get fresh positions at the end, so existing positions never shift.
+    """
+    def __init__(self, doc: Document, outline: Optional[Outline] = None):
+        self.doc = doc
+        outline = outline or build_outline(doc)
+        self.styles = outline.styles
+        self.elms: List[Any] = list(outline.paragraphs)
+        self.pos: Dict[Any, int] = {elm: i for i, elm in enumerate(self.elms)}
+
+    def __len__(self) -> int:
+        return len(self.elms)
+
+    def element(self, idx: int):
+        if 0 <= idx < len(self.elms):
+            return self.elms[idx]
+        return None
+
+    def paragraph(self, idx: int) -> Optional[Paragraph]:
+        elm = self.element(idx)
+        return None if elm is None else Paragraph(elm, self.doc._body)
+
+    def heading(self, node: Node) -> Paragraph:
+        return Paragraph(node.elm, self.doc._body)
+
+    def level(self, elm) -> Optional[int]:
+        return self.styles.level(elm)
+
+    def remove(self, elm):
+        idx = self.pos.pop(elm, None)
+        if idx is not None:
+            self.elms[idx] = None
+        elm.getparent().remove(elm)
+
+    def add(self, elm) -> int:
+        self.elms.append(elm)
+        self.pos[elm] = len(self.elms) - 1
+        return self.pos[elm]
@@ -0,0 +1,602 @@
+# pagination.py
+# pip install python-docx
+#
+# Approximate pagination without a layout engine. One pass over the body estimates
+# the page each paragraph starts on from the section geometry (page size, margins,
+# section breaks and page numbering), per-style font size / line spacing / indents,
+# and inline image sizes. Good enough to fill TOC/LOF/LOT page numbers (PAGEREF
+# results) on machines without Word; Word still re-lays out when fields are updated.
+#
+#   pages = estimate_pages(doc)
+#   pages.label(heading_elm)      # "12", or "ب" in an arabicAbjad-numbered section
+#   fill_pagerefs(doc, pages)     # rewrite every PAGEREF result in the body
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Tuple
+from docx import Document
+from docx.oxml.ns import qn as _qn
+import functools, math, re
+
+# (line height, average glyph advance) as fractions of the font size
+FONT_METRICS: Dict[str, Tuple[float, float]] = {
+    "times new roman": (1.15, 0.44),
+    "arial": (1.15, 0.50),
+    "calibri": (1.22, 0.46),
+    "cambria": (1.17, 0.48),
+    "tahoma": (1.21, 0.50),
+    "b nazanin": (1.50, 0.38),
+    "b lotus": (1.50, 0.38),
+    "b zar": (1.50, 0.39),
+    "b mitra": (1.50, 0.38),
+    "b yekan": (1.60, 0.45),
+    "b titr": (1.65, 0.50),
+    "iransans": (1.55, 0.47),
+    "vazirmatn": (1.55, 0.47),
+}
+DEFAULT_METRICS = (1.17, 0.46)
+# sha256 of the documents FONT_METRICS were tuned against; accuracy measured on them is
+# in-sample, and bench_pagination reports it apart from held-out documents
+TUNED_ON = frozenset({
+    "1d84c2d0d983b3206db9d88a866b4cccfd7dd771b43557e7a641bc9e04386d3e",   # template/persian-thesis.docx
+})
+
+qn = functools.lru_cache(maxsize=None)(_qn)   # hot path: measure() resolves tags per run
+
+TWIP = 1 / 20            # pt per twip
+EMU = 1 / 12700          # pt per EMU
+TAB_PT = 36.0
+CELL_MARGIN_PT = 10.8    # default left + right cell padding (108 twips each side)
+
+_RTL_RE = re.compile(r"[֐-ࣿיִ-﷿ﹰ-﻿]")
+
+_W_P = qn("w:p")
+_W_TBL = qn("w:tbl")
+_W_TR = qn("w:tr")
+_W_TC = qn("w:tc")
+_W_SDT = qn("w:sdt")
+_W_SDTCONTENT = qn("w:sdtContent")
+_W_CUSTOMXML = qn("w:customXml")
+_W_PPR = qn("w:pPr")
+_W_RPR = qn("w:rPr")
+_W_R = qn("w:r")
+_W_T = qn("w:t")
+_W_TAB = qn("w:tab")
+_W_BR = qn("w:br")
+_W_CR = qn("w:cr")
+_W_SYM = qn("w:sym")
+_W_DRAWING = qn("w:drawing")
+_W_SECTPR = qn("w:sectPr")
+_W_PSTYLE = qn("w:pStyle")
+_W_VAL = qn("w:val")
+_W_TYPE = qn("w:type")
+_W_BOOKMARKSTART = qn("w:bookmarkStart")
+_W_NAME = qn("w:name")
+_W_FLDCHAR = qn("w:fldChar")
+_W_FLDCHARTYPE = qn("w:fldCharType")
+_W_INSTRTEXT = qn("w:instrText")
+_WP_INLINE = qn("wp:inline")
+_WP_EXTENT = qn("wp:extent")
+
+def _int(el, attr: str, default=None):
+    if el is None: return default
+    v = el.get(qn(attr) if ":" in attr else attr)
+    try: return int(v) if v is not None else default
+    except ValueError:
+        try: return int(float(v))
+        except ValueError: return default
+
+def _on(el) -> Optional[bool]:
+    """OOXML toggle: present without w:val (or val true/1/on) means on."""
+    if el is None: return None
+    return el.get(_W_VAL) not in ("0", "false", "off")
+
+# ----------------- page numbers -----------------
+
+_ABJAD = "أبجدهوزحطیکلمنسعفصقرشتثخذضظغ"
+_ALPHA = "أبتثجحخدذرزسشصضطظعغفقکلمنهوی"
+
+def _roman(n: int) -> str:
+    out = ""
+    for v, r in ((1000,"m"),(900,"cm"),(500,"d"),(400,"cd"),(100,"c"),(90,"xc"),
+                 (50,"l"),(40,"xl"),(10,"x"),(9,"ix"),(5,"v"),(4,"iv"),(1,"i")):
+        while n >= v:
+            out += r; n -= v
+    return out
+
+def format_page_number(n: int, fmt: Optional[str]) -> str:
+    """Render page `n` in a w:pgNumType w:fmt (decimal when unknown)."""
+    if fmt == "arabicAbjad" and 0 < n <= len(_ABJAD): return "هـ" if _ABJAD[n - 1] == "ه" else _ABJAD[n - 1]
+    if fmt == "arabicAlpha" and 0 < n <= len(_ALPHA): return _ALPHA[n - 1]
+    if fmt == "lowerRoman": return _roman(n)
+    if fmt == "upperRoman": return _roman(n).upper()
+    if fmt == "lowerLetter" and n > 0: return chr(ord("a") + (n - 1) % 26) * ((n - 1) // 26 + 1)
+    if fmt == "upperLetter" and n > 0: return chr(ord("A") + (n - 1) % 26) * ((n - 1) // 26 + 1)
+    return str(n)
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+def parse_page_number(label: str) -> Optional[int]:
+    """Inverse of format_page_number for decimal (Latin/Persian digits) and abjad/alpha letters."""
+    s = (label or "").replace("‌", "").replace("‏", "").strip().translate(_DIGITS)
+    if s.isdigit(): return int(s)
+    if s in ("هـ", "ه"): return 5
+    if len(s) == 1:
+        for seq in (_ABJAD, _ALPHA):
+            if s in seq: return seq.index(s) + 1
+    return None
+
+# ----------------- sections -----------------
+
+@dataclass
+class SectionGeometry:
+    body_height: float        # pt available between top and bottom margins
+    body_width: float
+    start_type: str           # nextPage / oddPage / evenPage / continuous / nextColumn
+    num_start: Optional[int]
+    num_fmt: Optional[str]
+    line_pitch: Optional[float]   # docGrid line pitch when lines snap to the grid
+
+def section_geometry(sectPr) -> SectionGeometry:
+    pgSz = sectPr.find(qn("w:pgSz")) if sectPr is not None else None
+    pgMar = sectPr.find(qn("w:pgMar")) if sectPr is not None else None
+    w = _int(pgSz, "w:w", 12240) * TWIP
+    h = _int(pgSz, "w:h", 15840) * TWIP
+    top = abs(_int(pgMar, "w:top", 1440)) * TWIP
+    bottom = abs(_int(pgMar, "w:bottom", 1440)) * TWIP
+    left = _int(pgMar, "w:left", 1440) * TWIP
+    right = _int(pgMar, "w:right", 1440) * TWIP
+    gutter = _int(pgMar, "w:gutter", 0) * TWIP
+    typ = sectPr.find(qn("w:type")) if sectPr is not None else None
+    num = sectPr.find(qn("w:pgNumType")) if sectPr is not None else None
+    grid = sectPr.find(qn("w:docGrid")) if sectPr is not None else None
+    pitch = None
+    if grid is not None and grid.get(_W_TYPE) in ("lines", "linesAndChars", "snapToChars"):
+        pitch = _int(grid, "w:linePitch", 0) * TWIP or None
+    return SectionGeometry(
+        body_height=h - top - bottom,
+        body_width=w - left - right - gutter,
+        start_type=typ.get(_W_VAL, "nextPage") if typ is not None else "nextPage",
+        num_start=_int(num, "w:start"),
+        num_fmt=num.get(qn("w:fmt")) if num is not None else None,
+        line_pitch=pitch,
+    )
+
+# ----------------- style properties -----------------
+
+
+def _ppr_props(pPr) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    if pPr is None: return out
+    sp = pPr.find(qn("w:spacing"))
+    if sp is not None:
+        for key, attr in (("before", "w:before"), ("after", "w:after"), ("line", "w:line")):
+            v = _int(sp, attr)
+            if v is not None: out[key] = v
+        if sp.get(qn("w:lineRule")): out["rule"] = sp.get(qn("w:lineRule"))
+        if _on(sp.find(qn("w:beforeAutospacing"))): out["before"] = 280
+    ind = pPr.find(qn("w:ind"))
+    if ind is not None:
+        sides = [_int(ind, a) for a in ("w:left", "w:right", "w:start", "w:end")]
+        out["ind"] = sum(max(v, 0) for v in sides if v is not None)
+        first, hanging = _int(ind, "w:firstLine"), _int(ind, "w:hanging")
+        if first is not None or hanging is not None:
+            out["first"] = (first or 0) - (hanging or 0)
+    for key, tag in (("keep_next", "w:keepNext"), ("break_before", "w:pageBreakBefore"),
+                     ("ctx", "w:contextualSpacing")):
+        v = _on(pPr.find(qn(tag)))
+        if v is not None: out[key] = v
+    return out
+
+def _rpr_props(rPr) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    if rPr is None: return out
+    sz, sz_cs = rPr.find(qn("w:sz")), rPr.find(qn("w:szCs"))
+    if sz is not None: out["sz"] = _int(sz, "w:val", 24) / 2
+    if sz_cs is not None: out["sz_cs"] = _int(sz_cs, "w:val", 24) / 2
+    fonts = rPr.find(qn("w:rFonts"))
+    if fonts is not None:
+        if fonts.get(qn("w:ascii")): out["font"] = fonts.get(qn("w:ascii")).lower()
+        if fonts.get(qn("w:cs")): out["font_cs"] = fonts.get(qn("w:cs")).lower()
+    return out
+
+class StyleProps:
+    """Paragraph and run properties per paragraph style, resolved through basedOn and docDefaults."""
+
+    def __init__(self, doc: Document):
+        styles = doc.styles.element
+        defaults = styles.find(qn("w:docDefaults"))
+        base: Dict[str, Any] = {"before": 0, "after": 0, "line": 240, "rule": "auto", "ind": 0,
+                                "first": 0, "keep_next": False, "break_before": False,
+                                "ctx": False, "sz": 10.0, "sz_cs": 10.0, "font": "", "font_cs": ""}
+        if defaults is not None:
+            ppr_def = defaults.find(qn("w:pPrDefault"))
+            rpr_def = defaults.find(qn("w:rPrDefault"))
+            if ppr_def is not None: base.update(_ppr_props(ppr_def.find(_W_PPR)))
+            if rpr_def is not None: base.update(_rpr_props(rpr_def.find(_W_RPR)))
+        self.base = base
+        self.own: Dict[str, Dict[str, Any]] = {}
+        self.based_on: Dict[str, Optional[str]] = {}
+        self.default_id: Optional[str] = None
+        for s in styles.iterchildren(qn("w:style")):
+            if s.get(qn("w:type")) != "paragraph": continue
+            sid = s.get(qn("w:styleId"))
+            own = _ppr_props(s.find(_W_PPR))
+            own.update(_rpr_props(s.find(_W_RPR)))
+            self.own[sid] = own
+            b = s.find(qn("w:basedOn"))
+            self.based_on[sid] = b.get(_W_VAL) if b is not None else None
+            if s.get(qn("w:default")) in ("1", "true", "on") and self.default_id is None:
+                self.default_id = sid
+        self._resolved: Dict[Optional[str], Dict[str, Any]] = {}
+
+    def get(self, sid: Optional[str]) -> Dict[str, Any]:
+        if sid not in self.own: sid = self.default_id
+        hit = self._resolved.get(sid)
+        if hit is not None: return hit
+        chain, cur = [], sid
+        while cur is not None and cur in self.own and cur not in chain:
+            chain.append(cur)
+            cur = self.based_on.get(cur)
+        props = dict(self.base)
+        for s in reversed(chain):
+            props.update(self.own[s])
+        self._resolved[sid] = props
+        return props
+
+def metrics(font: str) -> Tuple[float, float]:
+    return FONT_METRICS.get(font, DEFAULT_METRICS)
+
+# ----------------- paragraph measurement -----------------
+
+@dataclass
+class Measure:
+    before: float
+    after: float
+    lines: List[float]                 # height of each line, in flow order
+    breaks: List[int] = field(default_factory=list)   # line indexes preceded by a page break
+    keep_next: bool = False
+    break_before: bool = False
+    ctx: bool = False
+    style_id: Optional[str] = None
+    has_content: bool = False
+
+def _block_children(container):
+    """Body-level w:p / w:tbl, looking through content controls and custom XML."""
+    for el in container.iterchildren():
+        if el.tag in (_W_P, _W_TBL):
+            yield el
+        elif el.tag == _W_SDT:
+            content = el.find(_W_SDTCONTENT)
+            if content is not None:
+                yield from _block_children(content)
+        elif el.tag == _W_CUSTOMXML:
+            yield from _block_children(el)
+
+class Paginator:
+    def __init__(self, doc: Document):
+        self.doc = doc
+        self.styles = StyleProps(doc)
+
+    # --- measurement ---
+
+    def _run_size(self, props, rPr, rtl: bool) -> Tuple[float, float, float]:
+        """(font size pt, line factor, advance factor) for a run."""
+        own = _rpr_props(rPr) if rPr is not None else {}
+        if rtl:
+            size = own.get("sz_cs") or props["sz_cs"] or own.get("sz") or props["sz"]
+            font = own.get("font_cs") or props["font_cs"] or own.get("font") or props["font"]
+        else:
+            size = own.get("sz") or props["sz"]
+            font = own.get("font") or props["font"]
+        lf, adv = metrics(font)
+        return size, lf, adv
+
+    def _line_height(self, props, size: float, lf: float, pitch: Optional[float]) -> float:
+        natural = size * lf
+        rule, line = props["rule"], props["line"]
+        if rule == "exact":
+            return line * TWIP
+        if rule == "atLeast":
+            return max(line * TWIP, natural)
+        h = natural * line / 240
+        if pitch:
+            h = math.ceil(h / pitch - 0.01) * pitch
+        return h
+
+    def measure(self, p, width: float, pitch: Optional[float] = None) -> Measure:
+        pPr = p.find(_W_PPR)
+        sid = None
+        if pPr is not None:
+            ps = pPr.find(_W_PSTYLE)
+            if ps is not None: sid = ps.get(_W_VAL)
+        props = self.styles.get(sid)
+        direct = _ppr_props(pPr)
+        if direct:
+            props = dict(props); props.update(direct)
+        mark_rpr = pPr.find(_W_RPR) if pPr is not None else None
+
+        avail = max(width - props["ind"] * TWIP, 36.0)
+        first_avail = max(avail - props["first"] * TWIP, 36.0)
+
+        lines: List[float] = []
+        breaks: List[int] = []
+        cur_w, cur_h, line_avail = 0.0, 0.0, first_avail
+        has_content = False
+
+        def end_line(h_default):
+            nonlocal cur_w, cur_h, line_avail
+            lines.append(cur_h or h_default)
+            cur_w, cur_h, line_avail = 0.0, 0.0, avail
+
+        size, lf, adv = self._run_size(props, mark_rpr, False)
+        base_h = self._line_height(props, size, lf, pitch)
+        for r in p.iter(_W_R):
+            rPr = r.find(_W_RPR)
+            key = None
+            for child in r:
+                tag = child.tag
+                if tag == _W_T:
+                    text = child.text or ""
+                    if not text: continue
+                    has_content = True
+                    rtl = bool(_RTL_RE.search(text))
+                    if key != rtl:
+                        size, lf, adv = self._run_size(props, rPr, rtl)
+                        key = rtl
+                    h = self._line_height(props, size, lf, pitch)
+                    w = len(text) * size * adv
+                    while cur_w + w > line_avail:
+                        w -= line_avail - cur_w
+                        cur_h = max(cur_h, h)
+                        end_line(base_h)
+                    cur_w += w
+                    cur_h = max(cur_h, h)
+                elif tag == _W_TAB:
+                    cur_w += TAB_PT - (cur_w % TAB_PT)
+                elif tag == _W_SYM:
+                    cur_w += base_h * 0.5
+                elif tag in (_W_BR, _W_CR):
+                    kind = child.get(_W_TYPE)
+                    if kind == "page":
+                        if cur_w or cur_h: end_line(base_h)
+                        breaks.append(len(lines))
+                    elif kind != "column":
+                        end_line(base_h)
+                elif tag == _W_DRAWING:
+                    inline = child.find(_WP_INLINE)
+                    ext = inline.find(_WP_EXTENT) if inline is not None else None
+                    if ext is None: continue
+                    has_content = True
+                    img_w, img_h = _int(ext, "cx", 0) * EMU, _int(ext, "cy", 0) * EMU
+                    if cur_w + img_w > line_avail and cur_w:
+                        end_line(base_h)
+                    cur_w += img_w
+                    cur_h = max(cur_h, img_h + base_h * 0.2)
+        if cur_w or cur_h or not lines:
+            end_line(base_h)
+        return Measure(before=props["before"] * TWIP, after=props["after"] * TWIP, lines=lines,
+                       breaks=breaks, keep_next=props["keep_next"], break_before=props["break_before"],
+                       ctx=props["ctx"], style_id=sid, has_content=has_content)
+
+    def table_rows(self, tbl, width: float, pitch: Optional[float]) -> List[Tuple[float, List[Any]]]:
+        """(height, paragraphs) per row; rows are treated as unsplittable."""
+        grid = [(_int(g, "w:w", 0) or 0) * TWIP for g in tbl.iterchildren(qn("w:tblGrid"))
+                for g in g.iterchildren(qn("w:gridCol"))]
+        rows = []
+        for tr in tbl.iterchildren(_W_TR):
+            cells = list(tr.iterchildren(_W_TC))
+            row_h, paras = 0.0, []
+            col = 0
+            for tc in cells:
+                tcPr = tc.find(qn("w:tcPr"))
+                span = _int(tcPr.find(qn("w:gridSpan")) if tcPr is not None else None, "w:val", 1)
+                tcW = tcPr.find(qn("w:tcW")) if tcPr is not None else None
+                if tcW is not None and tcW.get(_W_TYPE) == "dxa" and _int(tcW, "w:w", 0):
+                    cw = _int(tcW, "w:w") * TWIP
+                elif grid[col:col + span]:
+                    cw = sum(grid[col:col + span])
+                else:
+                    cw = width / max(len(cells), 1)
+                col += span
+                cell_h = 0.0
+                for block in _block_children(tc):
+                    if block.tag == _W_P:
+                        m = self.measure(block, cw - CELL_MARGIN_PT, pitch)
+                        cell_h += m.before + sum(m.lines) + m.after
+                        paras.append(block)
+                    else:
+                        sub = self.table_rows(block, cw - CELL_MARGIN_PT, pitch)
+                        cell_h += sum(h for h, _ in sub)
+                        for _, ps in sub: paras.extend(ps)
+                row_h = max(row_h, cell_h)
+            trPr = tr.find(qn("w:trPr"))
+            trh = trPr.find(qn("w:trHeight")) if trPr is not None else None
+            if trh is not None:
+                spec = _int(trh, "w:val", 0) * TWIP
+                row_h = spec if trh.get(qn("w:hRule")) == "exact" else max(row_h, spec)
+            rows.append((row_h + 1.0, paras))
+        return rows
+
+    # --- layout ---
+
+    def run(self) -> "PageMap":
+        body = self.doc.element.body
+        blocks = list(_block_children(body))
+        sect_prs = [b.find(_W_PPR).find(_W_SECTPR) for b in blocks
+                    if b.tag == _W_P and b.find(_W_PPR) is not None and b.find(_W_PPR).find(_W_SECTPR) is not None]
+        sect_prs.append(body.find(_W_SECTPR))
+        sections = [section_geometry(s) for s in sect_prs]
+
+        pages: Dict[Any, int] = {}
+        numbers: List[Tuple[int, Optional[str]]] = []   # per physical page: (number, fmt)
+        si = 0
+        geo = sections[0]
+        state = {"page": 1, "y": 0.0, "num": geo.num_start or 1}
+        numbers.append((state["num"], geo.num_fmt))
+
+        def new_page():
+            state["page"] += 1
+            state["y"] = 0.0
+            state["num"] += 1
+            numbers.append((state["num"], sections[si].num_fmt))
+
+        def start_section(idx):
+            g = sections[idx]
+            if g.start_type != "continuous" or state["y"] == 0:
+                if state["y"] > 0 or g.start_type in ("oddPage", "evenPage"):
+                    new_page()
+                if g.num_start is not None:
+                    state["num"] = g.num_start
+                    numbers[-1] = (g.num_start, g.num_fmt)
+                else:
+                    numbers[-1] = (state["num"], g.num_fmt)
+                parity = 1 if g.start_type == "oddPage" else 0 if g.start_type == "evenPage" else None
+                if parity is not None and state["num"] % 2 != parity:
+                    new_page()   # blank page to land on the right parity
+                    numbers[-1] = (state["num"], g.num_fmt)
+
+        prev: Optional[Measure] = None
+        pending_keep: List[Any] = []
+        for i, block in enumerate(blocks):
+            H = sections[si].body_height
+            if block.tag == _W_TBL:
+                rows = self.table_rows(block, sections[si].body_width, sections[si].line_pitch)
+                first = True
+                for h, paras in rows:
+                    if state["y"] > 0 and state["y"] + h > H:
+                        new_page()
+                    if first:
+                        pages[block] = state["page"]
+                        first = False
+                    for p in paras:
+                        pages[p] = state["page"]
+                    state["y"] += min(h, H)
+                prev = None
+                continue
+
+            m = self.measure(block, sections[si].body_width, sections[si].line_pitch)
+            if m.break_before and state["y"] > 0:
+                new_page()
+            before = m.before
+            if prev is not None and m.ctx and prev.ctx and prev.style_id == m.style_id:
+                before = 0.0
+                state["y"] -= prev.after
+            if state["y"] == 0:
+                before = 0.0
+            # keep the first two lines together (widow/orphan control), and a keepNext
+            # paragraph with the first line of what follows
+            need = before + sum(m.lines[:2])
+            if m.keep_next:
+                need += m.lines[-1] if len(m.lines) < 2 else 0
+                need += m.after + m.lines[0]
+            if state["y"] > 0 and state["y"] + need > H:
+                new_page()
+                before = 0.0
+            state["y"] += before
+            start_page = state["page"]
+            placed = False
+            for li, h in enumerate(m.lines):
+                if li in m.breaks and (li > 0 or state["y"] > 0):
+                    new_page()
+                if state["y"] > 0 and state["y"] + h > H:
+                    new_page()
+                if not placed and (m.has_content or li == len(m.lines) - 1):
+                    start_page = state["page"] if m.has_content else start_page
+                    placed = True
+                state["y"] += h
+            if len(m.breaks) and m.breaks[-1] == len(m.lines):
+                new_page()
+            state["y"] = min(state["y"] + m.after, H)
+            pages[block] = start_page
+            prev = m
+
+            pPr = block.find(_W_PPR)
+            if pPr is not None and pPr.find(_W_SECTPR) is not None and si + 1 < len(sections):
+                si += 1
+                start_section(si)
+                prev = None
+
+        return PageMap(pages=pages, numbers=numbers)
+
+@dataclass
+class PageMap:
+    pages: Dict[Any, int]                      # w:p / w:tbl element -> physical page (1-based)
+    numbers: List[Tuple[int, Optional[str]]]   # physical page -> (displayed number, w:fmt)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.numbers)
+
+    def page(self, elm) -> Optional[int]:
+        return self.pages.get(elm)
+
+    def number(self, elm) -> Optional[int]:
+        pg = self.pages.get(elm)
+        return self.numbers[pg - 1][0] if pg else None
+
+    def label(self, elm) -> Optional[str]:
+        pg = self.pages.get(elm)
+        if not pg: return None
+        n, fmt = self.numbers[pg - 1]
+        return format_page_number(n, fmt)
+
+def estimate_pages(doc: Document) -> PageMap:
+    return Paginator(doc).run()
+
+# ----------------- bookmarks and PAGEREF -----------------
+
+def bookmark_paragraphs(doc: Document) -> Dict[str, Any]:
+    """Bookmark name -> the w:p it starts in (or the paragraph right after it)."""
+    out: Dict[str, Any] = {}
+    for b in doc.element.body.iter(_W_BOOKMARKSTART):
+        name = b.get(_W_NAME)
+        if not name or name in out: continue
+        p = b.getparent()
+        while p is not None and p.tag != _W_P:
+            p = p.getparent()
+        if p is None:
+            p = b.getnext()
+            while p is not None and p.tag != _W_P:
+                p = p.getnext()
+        if p is not None:
+            out[name] = p
+    return out
+
+def iter_pageref_results(doc: Document):
+    """(bookmark name, [w:t elements of the field result]) for every PAGEREF field in the body."""
+    stack: List[Dict[str, Any]] = []
+    for el in doc.element.body.iter(_W_FLDCHAR, _W_INSTRTEXT, _W_T):
+        if el.tag == _W_FLDCHAR:
+            kind = el.get(_W_FLDCHARTYPE)
+            if kind == "begin":
+                stack.append({"instr": [], "sep": False, "ts": []})
+            elif kind == "separate" and stack:
+                stack[-1]["sep"] = True
+            elif kind == "end" and stack:
+                f = stack.pop()
+                parts = "".join(f["instr"]).split()
+                if len(parts) >= 2 and parts[0] == "PAGEREF":
+                    yield parts[1], f["ts"]
+        elif el.tag == _W_INSTRTEXT:
+            if stack and not stack[-1]["sep"]:
+                stack[-1]["instr"].append(el.text or "")
+        elif stack and stack[-1]["sep"]:
+            stack[-1]["ts"].append(el)
+
+def fill_pagerefs(doc: Document, pages: PageMap) -> int:
+    """Rewrite PAGEREF results with estimated page labels; returns how many were set."""
+    targets = bookmark_paragraphs(doc)
+    count = 0
+    for name, ts in list(iter_pageref_results(doc)):
+        p = targets.get(name)
+        label = pages.label(p) if p is not None else None
+        if label is None or not ts: continue
+        ts[0].text = label
+        for t in ts[1:]:
+            t.text = ""
+        count += 1
+    return count
+
+def recorded_pagerefs(doc: Document) -> Dict[str, str]:
+    """PAGEREF results as last rendered by Word: bookmark name -> page label."""
+    return {name: "".join(t.text or "" for t in ts) for name, ts in iter_pageref_results(doc)}
@@ -0,0 +1,222 @@
+# profiling.py
+# Opt-in instrumentation for the build scripts: timing spans, counters, and
+# optionally cProfile and tracemalloc.
+#
+#   with profiling.span("save", doc=doc):        # doc=: also the net change in XML elements
+#       ...
+#   @profiling.traced("build_docx.apply_styles_from_json")
+#   def apply_styles_from_json(doc): ...
+#   profiling.count("bytes_written", n)
+#
+# Nothing is recorded until configure() is called (--profile on the CLIs, or the
+# DOCX_PROFILE environment variable for scripts without arguments); until then a
+# span is a single global check. Output when the process exits:
+#   --profile             flat summary on stderr (calls, total and self time per span, counters)
+#   --profile trace.json  the same summary, plus a Chrome trace (chrome://tracing, Perfetto)
+#   --profile-cprofile P  cProfile stats dumped to P (read with python -m pstats P)
+#   --profile-memory      tracemalloc: peak traced memory per span and the top allocation sites
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import atexit, functools, json, os, sys, threading, time
+
+ENV_VAR = "DOCX_PROFILE"
+
+class _Span:
+    __slots__ = ("name", "start", "dur", "tid", "args", "child_time", "mem_peak")
+
+    def __init__(self, name: str, start: float, tid: int, args: Dict):
+        self.name, self.start, self.tid, self.args = name, start, tid, args
+        self.dur = 0.0
+        self.child_time = 0.0
+        self.mem_peak = 0
+
+class Profiler:
+    def __init__(self, trace_path: Optional[str] = None, cprofile_path: Optional[str] = None,
+                 memory: bool = False):
+        self.trace_path = trace_path
+        self.cprofile_path = cprofile_path
+        self.memory = memory
+        self.t0 = time.perf_counter()
+        self.spans: List[_Span] = []
+        self.counters: Dict[str, int] = {}
+        self.local = threading.local()
+        self.cprof = None
+        self.finished = False
+        if cprofile_path:
+            import cProfile
+            self.cprof = cProfile.Profile()
+            self.cprof.enable()
+        if memory:
+            import tracemalloc
+            tracemalloc.start(10)
+
+    def _stack(self) -> List[_Span]:
+        st = getattr(self.local, "stack", None)
+        if st is None:
+            st = self.local.stack = []
+        return st
+
+    def begin(self, name: str, args: Dict) -> _Span:
+        sp = _Span(name, time.perf_counter(), threading.get_ident(), args)
+        if self.memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+        self._stack().append(sp)
+        return sp
+
+    def end(self, sp: _Span):
+        sp.dur = time.perf_counter() - sp.start
+        stack = self._stack()
+        stack.pop()
+        if self.memory:
+            import tracemalloc
+            # a child's reset_peak hid anything before it, so fold the children's peaks in
+            sp.mem_peak = max(sp.mem_peak, tracemalloc.get_traced_memory()[1])
+            sp.args["mem_peak_kb"] = sp.mem_peak // 1024
+        if stack:
+            stack[-1].child_time += sp.dur
+            stack[-1].mem_peak = max(stack[-1].mem_peak, sp.mem_peak)
+        self.spans.append(sp)
+
+    # ----------------- output -----------------
+
+    def summary(self) -> str:
+        rows: Dict[str, List[float]] = {}
+        for sp in self.spans:
+            r = rows.setdefault(sp.name, [0, 0.0, 0.0, 0])
+            r[0] += 1
+            r[1] += sp.dur
+            r[2] += sp.dur - sp.child_time
+            r[3] = max(r[3], sp.mem_peak)
+        wall = time.perf_counter() - self.t0
+        lines = [f"profile: {wall:.3f}s wall, {len(self.spans)} spans",
+                 f"  {'span':40s} {'calls':>6s} {'total ms':>10s} {'self ms':>10s} {'%wall':>6s}"
+                 + ("  peak KB" if self.memory else "")]
+        for name, (n, total, self_t, peak) in sorted(rows.items(), key=lambda kv: -kv[1][1]):
+            line = f"  {name:40s} {n:6d} {total * 1000:10.1f} {self_t * 1000:10.1f} {100 * total / max(wall, 1e-9):5.1f}%"
+            if self.memory:
+                line += f"  {peak // 1024:7d}"
+            lines.append(line)
+        for k, v in sorted(self.counters.items()):
+            lines.append(f"  {k}: {v}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict:
+        pid = os.getpid()
+        events = [{"name": sp.name, "cat": sp.name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": sp.tid,
+                   "ts": round((sp.start - self.t0) * 1e6, 1), "dur": round(sp.dur * 1e6, 1), "args": sp.args}
+                  for sp in self.spans]
+        end_ts = round((time.perf_counter() - self.t0) * 1e6, 1)
+        events += [{"name": k, "ph": "C", "pid": pid, "tid": 0, "ts": end_ts, "args": {k: v}}
+                   for k, v in self.counters.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": self.counters}}
+
+    def finish(self):
+        if self.finished: return
+        self.finished = True
+        if self.cprof is not None:
+            self.cprof.disable()
+            self.cprof.dump_stats(self.cprofile_path)
+        print(self.summary(), file=sys.stderr)
+        if self.memory:
+            import tracemalloc
+            snap = tracemalloc.take_snapshot()
+            print("  top allocation sites (still allocated):", file=sys.stderr)
+            for stat in snap.statistics("lineno")[:10]:
+                print(f"    {stat}", file=sys.stderr)
+            tracemalloc.stop()
+        if self.trace_path:
+            with open(self.trace_path, "w", encoding="utf-8") as f:
+                json.dump(self.chrome_trace(), f, ensure_ascii=False)
+            print(f"  chrome trace -> {self.trace_path}", file=sys.stderr)
+        if self.cprofile_path:
+            print(f"  cProfile stats -> {self.cprofile_path}", file=sys.stderr)
+
+_ACTIVE: Optional[Profiler] = None
+
+def active() -> Optional[Profiler]:
+    return _ACTIVE
+
+def _element_count(doc) -> int:
+    return sum(1 for _ in doc.element.iter())
+
+@contextmanager
+def span(name: str, doc=None, **args):
+    """
+    Time the block as `name`. With `doc`, also record the net change in the number of
+    XML elements of the main document part (a full tree walk at each end, so only
+    for coarse spans).
+    """
+    prof = _ACTIVE
+    if prof is None:
+        yield
+        return
+    before = _element_count(doc) if doc is not None else 0
+    sp = prof.begin(name, dict(args))
+    try:
+        yield
+    finally:
+        if doc is not None:
+            delta = _element_count(doc) - before
+            sp.args["elements_delta"] = delta
+            count("xml_elements_delta", delta)
+        prof.end(sp)
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if _ACTIVE is None:
+                return fn(*a, **kw)
+            with span(name):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+def count(name: str, n: int = 1):
+    prof = _ACTIVE
+    if prof is not None:
+        prof.counters[name] = prof.counters.get(name, 0) + n
+
+def record_file(path: str, counter: str = "bytes_written"):
+    """Count the size of a file just written."""
+    if _ACTIVE is not None:
+        try:
+            count(counter, os.path.getsize(path))
+        except OSError:
+            pass
+
+def configure(trace_path: Optional[str] = None, cprofile_path: Optional[str] = None,
+              memory: bool = False) -> Profiler:
+    """Start recording; the report is written when the process exits (or on finish())."""
+    global _ACTIVE
+    if _ACTIVE is None:
+        _ACTIVE = Profiler(trace_path, cprofile_path, memory)
+        atexit.register(finish)
+    return _ACTIVE
+
+def finish():
+    if _ACTIVE is not None:
+        _ACTIVE.finish()
+
+def add_arguments(ap):
+    g = ap.add_argument_group("profiling")
+    g.add_argument("--profile", nargs="?", const="-", default=None, metavar="TRACE.json",
+                   help="Print per-stage timings on exit; with a path, also write a Chrome trace there")
+    g.add_argument("--profile-cprofile", default=None, metavar="PATH", help="Also run cProfile and dump stats to PATH")
+    g.add_argument("--profile-memory", action="store_true", help="Also track allocations with tracemalloc")
+
+def configure_from_args(args):
+    wanted = args.profile is not None or args.profile_cprofile or args.profile_memory
+    if wanted:
+        configure(None if args.profile in (None, "-") else args.profile, args.profile_cprofile, args.profile_memory)
+    else:
+        configure_from_env()
+
+def configure_from_env():
+    """DOCX_PROFILE=- (summary) or DOCX_PROFILE=trace.json, for scripts without a CLI."""
+    value = os.environ.get(ENV_VAR)
+    if value:
+        configure(None if value == "-" else value)
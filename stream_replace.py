@@ -0,0 +1,245 @@
+# stream_replace.py
+# pip install python-docx
+#
+# Streaming variant of apply_replacements for very large (image-heavy) documents.
+# The main document part is never loaded whole:
+#   pass 1  iterparse over word/document.xml, collecting heading titles/levels only;
+#           the spec's keys are resolved against them exactly as apply_replacements does
+#   pass 2  iterparse again; each body child is written to the output zip as soon as
+#           it is parsed and then freed, and a target heading's direct body is dropped
+#           and replaced while its boundary (next heading or section break) is crossed
+# Every other part, media included, is copied as its original compressed bytes.
+# Peak memory is one body-level block plus the heading list, whatever the file size.
+
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+from zipfile import ZipFile
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup
+from docx.text.paragraph import Paragraph
+from lxml import etree
+import json, re
+
+from outline import StyleLevels, outline_from_paragraphs, iter_nodes, has_sectPr_elm, FM_KEYS
+from apply_replacements import plan_replacements
+from textnorm import normalize_text
+import docxzip
+
+_W_BODY = qn("w:body")
+_W_P = qn("w:p")
+_W_TBL = qn("w:tbl")
+_W_PPR = qn("w:pPr")
+
+# ----------------- parsing -----------------
+
+def iter_document(zin: ZipFile, part: str) -> Iterator[Tuple[str, Any, int]]:
+    """
+    ("root" | "pre" | "body_start" | "body" | "body_end" | "post", element, depth) for
+    the document element and its children, each child once fully parsed. Yielded
+    children are detached from the parse tree afterwards, so the tree never grows.
+    """
+    with zin.open(part) as src:
+        it = etree.iterparse(src, events=("start", "end"), huge_tree=True, remove_blank_text=False)
+        it.set_element_class_lookup(element_class_lookup)
+        depth, in_body, seen_body = 0, False, False
+        for event, el in it:
+            if event == "start":
+                if depth == 0:
+                    yield "root", el, 0
+                elif depth == 1 and el.tag == _W_BODY:
+                    in_body, seen_body = True, True
+                    yield "body_start", el, 1
+                depth += 1
+                continue
+            depth -= 1
+            parent = el.getparent()
+            if depth == 2 and in_body:
+                yield "body", el, 2
+            elif depth == 1 and el.tag == _W_BODY:
+                in_body = False
+                yield "body_end", el, 1
+                continue
+            elif depth == 1:
+                yield ("post" if seen_body else "pre"), el, 1
+            else:
+                continue
+            # the consumer has the block (or has moved it out already); drop it from the tree
+            if parent is not None and el.getparent() is parent:
+                parent.remove(el)
+
+def load_styles(zin: ZipFile, document_part: str) -> StyleLevels:
+    part = docxzip.styles_part(zin, document_part)
+    root = etree.fromstring(zin.read(part), etree.XMLParser(huge_tree=True)) if part else etree.Element(qn("w:styles"))
+    return StyleLevels(styles_element=root)
+
+def scan_outline(zin: ZipFile, document_part: str, styles: StyleLevels):
+    """Pass 1: the heading tree (build_outline semantics) without keeping the body."""
+    def paragraphs():
+        for kind, el, _ in iter_document(zin, document_part):
+            if kind == "body" and el.tag == _W_P:
+                yield el
+                el.clear()    # title and level are taken; keep only the empty shell
+    return outline_from_paragraphs(paragraphs(), styles)
+
+# ----------------- writing -----------------
+
+class ChildSerializer:
+    """
+    Serializes detached children as if they were still inside w:document/w:body, so
+    the namespaces declared on the root are not repeated on every block.
+    """
+    def __init__(self, root, body=None):
+        self.shell = etree.Element(root.tag, dict(root.attrib), nsmap=root.nsmap)
+        self.container = self.shell
+        if body is not None:
+            self.container = etree.SubElement(self.shell, body.tag, dict(body.attrib), nsmap=body.nsmap)
+        marker = etree.SubElement(self.container, "marker")
+        full = etree.tostring(self.shell, encoding="UTF-8", xml_declaration=False)
+        i = full.index(b"<marker/>")
+        self.prefix, self.suffix = full[:i], full[i + len(b"<marker/>"):]
+        self.container.remove(marker)
+
+    def __call__(self, el) -> bytes:
+        self.container.append(el)
+        try:
+            full = etree.tostring(self.shell, encoding="UTF-8", xml_declaration=False)
+        finally:
+            self.container.remove(el)
+        return full[len(self.prefix):len(full) - len(self.suffix)]
+
+def new_body_paragraph(text: str, style_id: Optional[str], with_ppr: bool):
+    """The w:p that apply_replacements.insert_paragraph_after builds through python-docx."""
+    p = OxmlElement("w:p")
+    if with_ppr:
+        p.get_or_add_pPr().style = style_id
+    if text:
+        Paragraph(p, None).add_run(text)
+    return p
+
+def clear_section_paragraph(p):
+    """What clear_paragraph_text leaves of a sectPr paragraph: its pPr and one empty run."""
+    for child in list(p):
+        if child.tag != _W_PPR:
+            p.remove(child)
+    p.append(OxmlElement("w:r"))
+
+def _has_text(p) -> bool:
+    return bool(p.text.strip())
+
+class Replacer:
+    """Pass-2 state: which heading is being replaced and what is held back meanwhile."""
+
+    def __init__(self, styles: StyleLevels, targets: Dict[int, str]):
+        self.styles = styles
+        self.targets = targets
+        self.normal_id = styles.id_for_name("Normal")
+        self.p_idx = -1
+        self.text: Optional[str] = None
+        self.style_from: Optional[str] = None
+        self.scanning_style = False
+        self.held: List[Any] = []
+
+    def body_style(self) -> Tuple[Optional[str], bool]:
+        """(pStyle to write, whether a pPr is written) mirroring infer_body_style + Paragraph.style."""
+        sid = self.style_from
+        if sid is None:
+            if self.normal_id is None: return None, False
+            sid = self.normal_id
+        return (None if sid == self.styles.default_id else sid), True
+
+    def finish(self) -> List[Any]:
+        """Close the running replacement: new paragraphs, then held-back blocks."""
+        if self.text is None: return []
+        sid, with_ppr = self.body_style()
+        blocks = [t.strip() for t in re.split(r"\n\s*\n", self.text) if t.strip()]
+        out = [new_body_paragraph(b, sid, with_ppr) for b in blocks] + self.held
+        self.text, self.held, self.style_from = None, [], None
+        return out
+
+    def feed(self, el) -> List[Any]:
+        """Blocks to write for body child `el` (possibly none, possibly earlier held ones)."""
+        out: List[Any] = []
+        if el.tag == _W_P:
+            self.p_idx += 1
+            is_heading = self.styles.level(el) is not None
+            starts_node = is_heading or self._is_front_matter(el)
+            if self.text is not None:
+                if has_sectPr_elm(el):
+                    out.extend(self.finish())
+                    clear_section_paragraph(el)
+                    out.append(el)
+                    return out
+                if is_heading:
+                    out.extend(self.finish())
+                else:
+                    if starts_node:
+                        self.scanning_style = False
+                    if self.scanning_style and self.style_from is None and _has_text(el):
+                        self.style_from = self.styles.style_id(el)
+                    return out          # dropped
+            out.append(el)
+            text = self.targets.get(self.p_idx)
+            if text is not None:
+                self.text, self.scanning_style, self.style_from = text, True, None
+            return out
+        if self.text is not None:
+            if el.tag != _W_TBL:
+                self.held.append(el)
+            return out
+        out.append(el)
+        return out
+
+    def _is_front_matter(self, el) -> bool:
+        sid = self.styles.style_id(el)
+        return sid in self.styles.front_matter or normalize_text(el.text) in FM_KEYS
+
+# ----------------- driver -----------------
+
+def stream_apply_replacements(docx_in: str, json_in: str, docx_out: str, edit_front_matter: bool = False,
+                              debug: bool = False, compresslevel: Optional[int] = None):
+    with open(json_in, "r", encoding="utf-8") as f:
+        spec: Dict[str, Any] = json.load(f)
+
+    with ZipFile(docx_in) as zin, open(docx_in, "rb") as raw, \
+            docxzip.ZipWriter(docx_out, compresslevel) as zout:
+        doc_part = docxzip.main_document_part(zin)
+        styles = load_styles(zin, doc_part)
+        outline = scan_outline(zin, doc_part, styles)
+        targets: Dict[int, str] = {}
+        for node, text in plan_replacements(iter_nodes(outline.roots), spec, debug=debug):
+            if node.front_matter and not edit_front_matter:
+                if debug: print(f"[skip front-matter] {node.title}")
+                continue
+            targets[node.start_idx] = text
+        del outline
+
+        for info in zin.infolist():
+            if info.filename != doc_part:
+                zout.copy_raw(raw, info)
+                continue
+            with zout.open(info.filename, zip64=info.file_size > (1 << 30)) as dst:
+                write_document(zin, doc_part, styles, targets, dst)
+
+def write_document(zin: ZipFile, doc_part: str, styles: StyleLevels, targets: Dict[int, str], dst):
+    """Pass 2: stream the main part to `dst`, replacing target headings' direct body."""
+    replacer = Replacer(styles, targets)
+    root = doc_ser = body_ser = None
+    dst.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n')
+    for kind, el, _ in iter_document(zin, doc_part):
+        if kind == "root":
+            root = el
+            doc_ser = ChildSerializer(root)
+            dst.write(doc_ser.prefix)
+        elif kind == "body_start":
+            body_ser = ChildSerializer(root, el)
+            dst.write(body_ser.prefix[len(doc_ser.prefix):])
+        elif kind == "body":
+            for block in replacer.feed(el):
+                dst.write(body_ser(block))
+        elif kind == "body_end":
+            for block in replacer.finish():
+                dst.write(body_ser(block))
+            dst.write(body_ser.suffix[:len(body_ser.suffix) - len(doc_ser.suffix)])
+        else:
+            dst.write(doc_ser(el))
+    dst.write(doc_ser.suffix)
@@ -0,0 +1,244 @@
+# synth_thesis.py
+# pip install python-docx
+#
+# Synthetic Persian theses for benchmarks: deterministic (seeded) content of any size.
+#
+#   python synth_thesis.py out/synth --chapters 12 --sections 6 --depth 3 --images 4
+#
+# Writes into the output directory:
+#   chNN.json          build_docx content JSON per chapter (title, intro, nested
+#                      sections, paragraphs, ol/ul lists)
+#   styles.json        a small build_docx style spec
+#   thesis.docx        the chapters rendered in one document, with PNG figures and
+#                      captions closing randomly chosen sections
+#   replacements.json  apply_replacements spec covering a share of the headings
+#   new_chapter.json   add_chapter_like --json content for one new chapter
+#   chNN.docx          with --chapter-docs: each chapter rendered as its own document
+#                      (inputs for compose.py)
+#
+# Paragraphs mix Persian and Latin words (--latin), with lengths drawn between
+# --words MIN MAX. Images are random-noise PNGs (incompressible, like photos),
+# written without any imaging library.
+
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Cm
+from docx.text.paragraph import Paragraph
+import argparse, io, json, random, struct, zlib
+
+import build_docx
+
+PERSIAN_WORDS = (
+    "پژوهش تحقیق داده مدل روش نتیجه تحلیل سامانه شبکه الگوریتم ارزیابی آزمایش "
+    "پیشنهاد بررسی ساختار کاربرد مقایسه عملکرد طراحی پیاده‌سازی معیار دقت سرعت "
+    "حافظه پردازش یادگیری ماشین عصبی زبان متن سند فصل بخش جدول شکل منبع مقاله "
+    "دانشگاه دانشکده استاد راهنما مشاور پایان‌نامه کارشناسی ارشد دکتری فرضیه "
+    "مسئله هدف اهمیت پیشینه چارچوب نظری آماری نمونه جامعه متغیر وابسته مستقل"
+).split()
+LATIN_WORDS = (
+    "model data network learning baseline accuracy latency throughput dataset "
+    "transformer encoder decoder benchmark Python XML DOCX API GPU CPU cache "
+    "pipeline RTL Unicode NFKC et al. Fig. Table"
+).split()
+ORDINALS = ["اول", "دوم", "سوم", "چهارم", "پنجم", "ششم", "هفتم", "هشتم", "نهم", "دهم",
+            "یازدهم", "دوازدهم", "سیزدهم", "چهاردهم", "پانزدهم", "شانزدهم"]
+
+@dataclass
+class SynthConfig:
+    chapters: int = 6
+    sections: int = 5            # top-level sections per chapter
+    depth: int = 3               # deepest heading level (2 = no subsections)
+    subsections: int = 2         # children per section below level 2
+    paragraphs: int = 4          # paragraphs per section
+    words: Tuple[int, int] = (40, 160)
+    latin: float = 0.15          # share of Latin words
+    list_every: int = 3          # a list in every Nth section (0 = none)
+    list_items: int = 5
+    images: int = 2              # figures per chapter
+    image_size: Tuple[int, int] = (640, 400)
+    seed: int = 1
+
+class Generator:
+    def __init__(self, cfg: SynthConfig):
+        self.cfg = cfg
+        self.rnd = random.Random(cfg.seed)
+
+    def sentence(self, n: int) -> str:
+        words = [self.rnd.choice(LATIN_WORDS if self.rnd.random() < self.cfg.latin else PERSIAN_WORDS)
+                 for _ in range(n)]
+        return " ".join(words) + "."
+
+    def paragraph(self) -> str:
+        n = self.rnd.randint(*self.cfg.words)
+        out, left = [], n
+        while left > 0:
+            k = min(left, self.rnd.randint(8, 20))
+            out.append(self.sentence(k))
+            left -= k
+        return " ".join(out)
+
+    def title(self, prefix: str) -> str:
+        return f"{prefix} {self.sentence(self.rnd.randint(2, 5)).rstrip('.')}"
+
+    def section(self, number: str, level: int, counter: List[int]) -> Dict:
+        counter[0] += 1
+        content: List = [{"text": self.paragraph()} for _ in range(self.cfg.paragraphs)]
+        if self.cfg.list_every and counter[0] % self.cfg.list_every == 0:
+            content.insert(1, {"list": {"type": self.rnd.choice(("ol", "ul")),
+                                        "items": [self.sentence(self.rnd.randint(4, 10)) for _ in range(self.cfg.list_items)]}})
+        sec = {"title": self.title(number), "level": level, "content": content}
+        if level < self.cfg.depth:
+            sec["sections"] = [self.section(f"{number}.{i + 1}", level + 1, counter)
+                               for i in range(self.cfg.subsections)]
+        return sec
+
+    def chapter(self, i: int) -> Dict:
+        ordinal = ORDINALS[i] if i < len(ORDINALS) else str(i + 1)
+        counter = [0]
+        return {
+            "meta": {"defaultParagraphStyle": "Normal", "listStyleMap": {"ol": "List Number", "ul": "List Bullet"}},
+            "section": {"break": "oddPage"},
+            "header": {"enabled": True, "runs": [{"text": f"فصل {ordinal}"}]},
+            "footer": {"enabled": True, "runs": [{"field": "pageNumber"}]},
+            "chapter": {
+                "title": f"فصل {ordinal}: {self.sentence(3).rstrip('.')}",
+                "intro": [{"text": self.paragraph()} for _ in range(2)],
+                "sections": [self.section(f"{i + 1}.{j + 1}", 2, counter) for j in range(self.cfg.sections)],
+            },
+        }
+
+    def chapters(self) -> List[Dict]:
+        return [self.chapter(i) for i in range(self.cfg.chapters)]
+
+# ----------------- images -----------------
+
+def png_bytes(width: int, height: int, seed: int = 0) -> bytes:
+    """An RGB PNG of random noise (no imaging library needed)."""
+    rnd = random.Random(seed)
+    row = width * 3
+    raw = b"".join(b"\x00" + rnd.randbytes(row) for _ in range(height))
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+# ----------------- outputs -----------------
+
+STYLE_SPEC = {
+    "Normal": {"alignment": "justify"},
+    "Heading 1": {"alignment": "right"},
+    "Heading 2": {"alignment": "right"},
+    "Heading 3": {"alignment": "right"},
+}
+
+def _headings(sec: Dict):
+    yield sec
+    for sub in sec.get("sections", []):
+        yield from _headings(sub)
+
+def render_docx(chapters: List[Dict], cfg: SynthConfig, path: str, first: int = 0):
+    """
+    All chapters in one document (build_docx), plus a figure and caption ending random
+    sections. `first` is the index of chapters[0] in the thesis (figure numbers, seeds).
+    """
+    build_docx.STYLE_SPEC = STYLE_SPEC
+    doc = Document()
+    build_docx.apply_styles_from_json(doc)
+    build_docx.ensure_numbering_rtl(doc)
+    rnd = random.Random(cfg.seed + 1 + first)
+    body = doc.element.body
+    body.get_or_add_sectPr()
+    for ci, ch in enumerate(chapters, first):
+        n_before = len(body) - 1
+        build_docx.write_section(doc, ch.get("meta", {}), ch)
+        if not cfg.images: continue
+        added = [Paragraph(el, doc._body) for el in list(body)[n_before:-1] if el.tag == qn("w:p")]
+        subheadings = [p for p in added if p.style.name.startswith("Heading ") and p.style.name != "Heading 1"]
+        # figure + caption go at the end of the section before each chosen heading
+        for k, anchor in enumerate(rnd.sample(subheadings, min(cfg.images, len(subheadings)))):
+            w, h = cfg.image_size
+            fig = anchor.insert_paragraph_before()
+            fig.add_run().add_picture(io.BytesIO(png_bytes(w, h, seed=cfg.seed * 1000 + ci * 10 + k)), width=Cm(12))
+            anchor.insert_paragraph_before(f"شکل {ci + 1}-{k + 1}: {ch['chapter']['title']}", style="Caption")
+    doc.save(path)
+
+def replacement_spec(chapters: List[Dict], share: float = 0.3, seed: int = 1) -> Dict[str, str]:
+    rnd = random.Random(seed + 2)
+    gen = Generator(SynthConfig(seed=seed + 3))
+    spec = {}
+    for ch in chapters:
+        for top in ch["chapter"]["sections"]:
+            for sec in _headings(top):
+                if rnd.random() < share:
+                    spec[sec["title"]] = "\n\n".join(gen.paragraph() for _ in range(2))
+    return spec
+
+def new_chapter_spec(chapter: Dict, seed: int = 1) -> Dict:
+    gen = Generator(SynthConfig(seed=seed + 4))
+    def node(sec):
+        d = {"__content__": gen.paragraph()}
+        for sub in sec.get("sections", []):
+            d[sub["title"]] = node(sub)
+        return d
+    return {"__content__": gen.paragraph(), **{s["title"]: node(s) for s in chapter["chapter"]["sections"]}}
+
+def generate(out_dir: str, cfg: SynthConfig, chapter_docs: bool = False) -> Dict[str, str]:
+    """Write every benchmark input under `out_dir`; returns name -> path."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    chapters = Generator(cfg).chapters()
+    paths = {"styles": str(out / "styles.json"), "thesis": str(out / "thesis.docx"),
+             "replacements": str(out / "replacements.json"), "new_chapter": str(out / "new_chapter.json")}
+    (out / "styles.json").write_text(json.dumps(STYLE_SPEC, ensure_ascii=False, indent=2), encoding="utf-8")
+    chapter_paths = []
+    for i, ch in enumerate(chapters):
+        p = out / f"ch{i + 1:02d}.json"
+        p.write_text(json.dumps(ch, ensure_ascii=False, indent=2), encoding="utf-8")
+        chapter_paths.append(str(p))
+    paths["chapters"] = chapter_paths
+    render_docx(chapters, cfg, paths["thesis"])
+    if chapter_docs:
+        paths["chapter_docs"] = [str(out / f"ch{i + 1:02d}.docx") for i in range(len(chapters))]
+        for i, (ch, p) in enumerate(zip(chapters, paths["chapter_docs"])):
+            render_docx([ch], cfg, p, first=i)
+    (out / "replacements.json").write_text(json.dumps(replacement_spec(chapters, seed=cfg.seed), ensure_ascii=False, indent=2),
+                                           encoding="utf-8")
+    (out / "new_chapter.json").write_text(json.dumps(new_chapter_spec(chapters[0], cfg.seed), ensure_ascii=False, indent=2),
+                                          encoding="utf-8")
+    (out / "config.json").write_text(json.dumps(asdict(cfg), indent=2), encoding="utf-8")
+    return paths
+
+def add_config_arguments(ap):
+    d = SynthConfig()
+    ap.add_argument("--chapters", type=int, default=d.chapters)
+    ap.add_argument("--sections", type=int, default=d.sections, help="Top-level sections per chapter")
+    ap.add_argument("--depth", type=int, default=d.depth, help="Deepest heading level")
+    ap.add_argument("--subsections", type=int, default=d.subsections, help="Children per section above --depth")
+    ap.add_argument("--paragraphs", type=int, default=d.paragraphs, help="Paragraphs per section")
+    ap.add_argument("--words", type=int, nargs=2, default=d.words, metavar=("MIN", "MAX"), help="Words per paragraph")
+    ap.add_argument("--latin", type=float, default=d.latin, help="Share of Latin words")
+    ap.add_argument("--list-every", type=int, default=d.list_every, help="A list in every Nth section (0 = none)")
+    ap.add_argument("--images", type=int, default=d.images, help="Figures per chapter")
+    ap.add_argument("--image-size", type=int, nargs=2, default=d.image_size, metavar=("W", "H"))
+    ap.add_argument("--seed", type=int, default=d.seed)
+
+def config_from_args(args) -> SynthConfig:
+    return SynthConfig(chapters=args.chapters, sections=args.sections, depth=args.depth, subsections=args.subsections,
+                       paragraphs=args.paragraphs, words=tuple(args.words), latin=args.latin,
+                       list_every=args.list_every, images=args.images, image_size=tuple(args.image_size),
+                       seed=args.seed)
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic Persian thesis (content JSONs + .docx) for benchmarks.")
+    ap.add_argument("out_dir")
+    add_config_arguments(ap)
+    ap.add_argument("--chapter-docs", action="store_true", help="Also render each chapter as its own .docx")
+    args = ap.parse_args()
+    paths = generate(args.out_dir, config_from_args(args), chapter_docs=args.chapter_docs)
+    print(f"Wrote {len(paths['chapters'])} chapters, {paths['thesis']}, {paths['replacements']}, {paths['new_chapter']}")
+
+if __name__ == "__main__":
+    main()
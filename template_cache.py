@@ -0,0 +1,100 @@
+# template_cache.py
+# pip install python-docx
+#
+# Parsed-template cache. Opening a .docx template unzips and parses every XML part
+# (styles, numbering, settings, headers, the body); this keeps one parsed master per
+# template and hands out clones instead.
+#
+#   doc = open_template("template/blank-template.docx")   # private, editable clone
+#   ref = load_template("template/persian-thesis.docx")   # shared master, read-only use
+#
+# Entries are keyed by path + mtime + size; the content hash (sha256) lets a touched
+# or copied template with unchanged bytes reuse the parsed master. A clone deep-copies
+# the XML parts; binary parts (media, embeddings, theme, fonts) keep sharing the
+# master's immutable blobs, so their cost is only paid once.
+
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from docx import Document
+import hashlib, io, logging, os, time
+
+import docxzip
+import profiling
+
+log = logging.getLogger("template_cache")
+
+@dataclass
+class _Entry:
+    sha256: str
+    master: Document
+
+class TemplateCache:
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._by_stat: "OrderedDict[Tuple[str, int, int], _Entry]" = OrderedDict()
+        self._by_hash: Dict[str, _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stat_key(path: str) -> Tuple[str, int, int]:
+        p = os.path.abspath(path)
+        st = os.stat(p)
+        return (p, st.st_mtime_ns, st.st_size)
+
+    def load(self, path: str) -> Document:
+        """The parsed master for `path`. Do not modify it; use clone() for that."""
+        key = self._stat_key(path)
+        entry = self._by_stat.get(key)
+        if entry is not None:
+            self._by_stat.move_to_end(key)
+            self.hits += 1
+            return entry.master
+
+        with open(key[0], "rb") as f:
+            data = f.read()
+        sha = hashlib.sha256(data).hexdigest()
+        entry = self._by_hash.get(sha)
+        if entry is None:
+            t0 = time.perf_counter()
+            entry = _Entry(sha256=sha, master=Document(io.BytesIO(data)))
+            docxzip.track_source(entry.master, key[0])    # clones save their untouched parts raw
+            self._by_hash[sha] = entry
+            self.misses += 1
+            log.debug("Parsed %s in %.3fs", path, time.perf_counter() - t0)
+        else:
+            self.hits += 1
+            log.debug("Reusing parsed master for %s (content unchanged)", path)
+
+        # a path whose file changed drops its stale stat key
+        for stale in [k for k in self._by_stat if k[0] == key[0]]:
+            del self._by_stat[stale]
+        self._by_stat[key] = entry
+        self._evict()
+        return entry.master
+
+    def clone(self, path: str) -> Document:
+        """A private copy of the template, safe to edit and save."""
+        return deepcopy(self.load(path))
+
+    def _evict(self):
+        while len(self._by_stat) > self.max_entries:
+            self._by_stat.popitem(last=False)
+        live = {id(e) for e in self._by_stat.values()}
+        for sha in [s for s, e in self._by_hash.items() if id(e) not in live]:
+            del self._by_hash[sha]
+
+    def clear(self):
+        self._by_stat.clear()
+        self._by_hash.clear()
+
+_DEFAULT = TemplateCache()
+
+@profiling.traced("template_cache.open_template")
+def open_template(path: str, cache: Optional[TemplateCache] = None) -> Document:
+    return (cache or _DEFAULT).clone(path)
+
+def load_template(path: str, cache: Optional[TemplateCache] = None) -> Document:
+    return (cache or _DEFAULT).load(path)
@@ -0,0 +1,6 @@
+# The scripts are top-level modules, not a package: import them from the repo root.
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,68 @@
+import json
+import logging
+
+import pytest
+
+import batch_build
+import logconfig
+from batch_build import Job
+
+def chapter(i: int) -> dict:
+    return {"meta": {}, "chapter": {"title": f"فصل {i}", "intro": ["متن"]}}
+
+@pytest.fixture
+def jobs(tmp_path):
+    out = []
+    for i in range(4):
+        p = tmp_path / f"c{i}.json"
+        p.write_text(json.dumps(chapter(i), ensure_ascii=False), encoding="utf-8")
+        out.append(Job(str(p), str(tmp_path / "out" / f"c{i}.docx")))
+    return out
+
+@pytest.fixture
+def root_logging():
+    root = logging.getLogger()
+    saved = (root.level, list(root.handlers))
+    yield
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+    root.setLevel(saved[0])
+    for h in saved[1]:
+        root.addHandler(h)
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_parallel_writes_every_job(jobs, ordered):
+    results = list(batch_build.run_parallel(jobs, workers=2, chunksize=3, ordered=ordered))
+    assert sorted(r.content for r in results) == sorted(j.content for j in jobs)
+    assert all(r.ok for r in results)
+
+def test_initializer_failure_fails_each_job(jobs, tmp_path):
+    results = list(batch_build.run_parallel(jobs, template_path=str(tmp_path / "missing.docx"), workers=2))
+    assert [r.content for r in results] == [j.content for j in jobs]
+    assert not any(r.ok for r in results)
+    assert all(r.error.startswith("BrokenProcessPool") for r in results)
+
+def test_malformed_build_job_fails_before_rendering(tmp_path):
+    bad = tmp_path / "bad.json"
+    bad.write_text(json.dumps({"chapter": {"sections": [{"content": []}]}}), encoding="utf-8")
+    job = Job(str(bad), str(tmp_path / "out" / "bad.docx"))
+    result, = batch_build.run_batch(batch_build.TemplateSession(), [job])
+    assert not result.ok
+    assert result.error.startswith("SpecError")
+    assert "$.chapter.sections[0]: missing required property 'title'" in result.error
+    assert not (tmp_path / "out").exists()
+
+def test_negative_workers_are_rejected(jobs):
+    with pytest.raises(ValueError):
+        list(batch_build.run_parallel(jobs, workers=-2))
+
+def test_worker_records_reach_the_parents_json_log(jobs, tmp_path, root_logging):
+    path = tmp_path / "log.jsonl"
+    logconfig.configure("INFO", json_path=str(path))
+    results = list(batch_build.run_parallel(jobs, workers=2, log_settings=("INFO", str(path), {})))
+    assert all(r.ok for r in results)
+    logging.getLogger().handlers[1].close()
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    ready = [r for r in records if r["logger"] == "batch_build" and r["msg"].startswith("Template ready")]
+    assert 1 <= len(ready) <= 2     # one per worker started, every line whole
@@ -0,0 +1,132 @@
+import os
+from collections import Counter
+
+import pytest
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.part import XmlPart
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+
+import compose
+import incremental_build as ib
+from conftest import ROOT
+from docxzip import open_docx, save_docx
+
+THESIS = os.path.join(ROOT, "template", "persian-thesis.docx")
+BLANK = os.path.join(ROOT, "template", "blank-template.docx")
+
+def duplicates(values):
+    return [v for v, n in Counter(values).items() if n > 1]
+
+def dangling_rids(doc):
+    """(partname, rId) for every r:* attribute that names no relationship of its part."""
+    out = []
+    for part in doc.part.package.iter_parts():
+        if isinstance(part, XmlPart):
+            root = part.element
+        elif part.content_type.endswith("xml"):
+            root = parse_xml(part.blob)
+        else:
+            continue
+        out += [(str(part.partname), str(a)) for a in compose._R_ATTRS(root) if str(a) not in part.rels]
+    return out
+
+def check_invariants(doc):
+    body = doc.element.body
+    numbering = doc.part.numbering_part.element
+    assert not duplicates(numbering.xpath("w:num/@w:numId"))
+    assert not duplicates(numbering.xpath("w:abstractNum/@w:abstractNumId"))
+    assert set(body.xpath(".//w:numId/@w:val")) <= set(numbering.xpath("w:num/@w:numId")) | {"0"}
+    assert not duplicates(doc.styles.element.xpath("w:style/@w:styleId"))
+    assert not duplicates(body.xpath(".//w:bookmarkStart/@w:id"))
+    assert not duplicates(body.xpath(".//w:bookmarkStart/@w:name"))
+    assert not duplicates(body.xpath(".//wp:docPr/@id"))
+    assert not dangling_rids(doc)
+
+@pytest.fixture
+def composed_thesis(tmp_path):
+    out = tmp_path / "twice.docx"
+    compose.compose([BLANK, THESIS, THESIS], str(out))
+    return Document(str(out))
+
+def test_compose_thesis_twice(composed_thesis):
+    # the thesis has WMF equation previews, which python-docx cannot parse
+    check_invariants(composed_thesis)
+    notes = parse_xml(composed_thesis.part.part_related_by(RT.FOOTNOTES).blob)
+    note_ids = [n.get(qn("w:id")) for n in notes.iterchildren(qn("w:footnote"))]
+    assert not duplicates(note_ids)
+    refs = composed_thesis.element.body.xpath(".//w:footnoteReference/@w:id")
+    assert refs and set(refs) <= set(note_ids)
+
+def test_compose_keeps_text_and_dedupes_media(composed_thesis):
+    texts = lambda doc: [p.text for p in doc.paragraphs if p.text.strip()]
+    assert texts(composed_thesis) == texts(Document(BLANK)) + texts(Document(THESIS)) * 2
+    media = [p for p in composed_thesis.part.package.iter_parts() if p.partname.startswith("/word/media/")]
+    assert len(media) == len({p.blob for p in media})
+    assert any(p.partname.ext == "wmf" for p in media)
+
+def test_compose_style_by_name_and_numbering(tmp_path):
+    src = Document()
+    styles = src.styles.element
+    styles.append(parse_xml(
+        '<w:style xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="paragraph"'
+        ' w:styleId="berschrift1"><w:name w:val="heading 1"/></w:style>'))
+    styles.append(parse_xml(
+        '<w:style xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="paragraph"'
+        ' w:styleId="Mine"><w:name w:val="Mine"/><w:pPr><w:numPr><w:numId w:val="3"/></w:numPr></w:pPr></w:style>'))
+    p = src.add_paragraph("h")._p
+    p.get_or_add_pPr().get_or_add_pStyle().val = "berschrift1"
+    q = src.add_paragraph("item")._p
+    q.get_or_add_pPr().get_or_add_pStyle().val = "Mine"
+    path = tmp_path / "src.docx"
+    src.save(str(path))
+
+    master = Document()
+    composer = compose.Composer(master)
+    composer.append(str(path))
+    composer.append(str(path))
+    check_invariants(master)
+    ids = [p.style.style_id for p in master.paragraphs if p.text]
+    assert ids == ["Heading1", "Mine", "Heading1", "Mine"]
+    mine = master.styles.element.xpath('w:style[@w:styleId="Mine"]')
+    assert len(mine) == 1
+    num_id = mine[0].xpath(".//w:numId/@w:val")[0]
+    assert master.part.numbering_part.element.xpath(f'w:num[@w:numId="{num_id}"]')
+
+def test_splice_renumbers_ids():
+    w = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+         'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"')
+    xml = (f'<w:body {w}><w:p><w:bookmarkStart w:id="0" w:name="_Toc1"/><w:bookmarkEnd w:id="0"/>'
+           '<w:hyperlink w:anchor="_Toc1"/><w:r><w:instrText> PAGEREF _Toc1 \\h </w:instrText></w:r>'
+           '<w:r><w:drawing><wp:inline><wp:docPr id="1" name="p"/></wp:inline></w:drawing></w:r></w:p></w:body>')
+    doc = Document()
+    ib.splice(doc, [ib.Fragment("a", xml.encode(), []), ib.Fragment("b", xml.encode(), [])])
+    body = doc.element.body
+    check_invariants(doc)
+    assert body.xpath(".//w:bookmarkStart/@w:name") == ["_Toc1", "_Toc1_2"]
+    assert body.xpath(".//w:hyperlink/@w:anchor") == ["_Toc1", "_Toc1_2"]
+    assert [t.strip() for t in body.xpath(".//w:instrText/text()")] == ["PAGEREF _Toc1 \\h", "PAGEREF _Toc1_2 \\h"]
+    assert len(doc.sections) == 3
+
+def test_save_after_compose_round_trips(tmp_path):
+    master = open_docx(BLANK)
+    compose.Composer(master).append(THESIS)
+    out = tmp_path / "out.docx"
+    save_docx(master, str(out))
+    check_invariants(Document(str(out)))
+
+def test_compose_into_master_without_numbering(tmp_path):
+    master = Document(BLANK)
+    rid = next(r for r, rel in master.part.rels.items() if rel.reltype == RT.NUMBERING)
+    master.part.drop_rel(rid)
+    path = tmp_path / "bare.docx"
+    master.save(str(path))
+    assert compose.related_part(Document(str(path)).part, RT.NUMBERING) is None
+
+    out = tmp_path / "out.docx"
+    compose.compose([str(path), THESIS], str(out))
+    doc = Document(str(out))
+    assert str(compose.related_part(doc.part, RT.NUMBERING).partname) == "/word/numbering.xml"
+    check_invariants(doc)
+    assert doc.part.numbering_part.element.xpath("w:num")
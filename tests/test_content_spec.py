@@ -0,0 +1,124 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+import content_spec
+from content_spec import SchemaError, compile_schema
+from conftest import ROOT
+
+# (schema, valid instances, invalid instances)
+KEYWORDS = [
+    ({"type": "integer"}, [1, 2.0, -3], [1.5, True, "1", None]),
+    ({"type": ["string", "null"]}, ["", None], [0, [], {}]),
+    ({"type": "number"}, [0, 1.5], [False, "1"]),
+    ({"enum": [1, "a", None, [1]]}, [1, 1.0, "a", None, [1]], [True, "b", [2], 2]),
+    ({"const": {"a": [1, 2]}}, [{"a": [1, 2]}], [{"a": [2, 1]}, {"a": [1, 2], "b": 0}]),
+    ({"const": False}, [False], [0, None]),
+    ({"properties": {"a": {"type": "string"}}}, [{}, {"a": "x"}, {"b": 1}, 5], [{"a": 1}]),
+    ({"required": ["a", "b"]}, [{"a": 0, "b": 0}, [], "x"], [{"a": 0}, {}]),
+    ({"properties": {"a": True}, "additionalProperties": False}, [{}, {"a": 1}], [{"b": 1}]),
+    ({"additionalProperties": {"type": "integer"}}, [{"a": 1}], [{"a": "1"}]),
+    ({"patternProperties": {"^x-": {"type": "string"}}, "additionalProperties": False},
+     [{"x-a": "s"}], [{"x-a": 1}, {"y": "s"}]),
+    ({"dependentRequired": {"text": ["style"]}}, [{}, {"style": 1}, {"text": 1, "style": 1}], [{"text": 1}]),
+    ({"items": {"type": "string"}}, [[], ["a"], "not an array"], [["a", 1]]),
+    ({"prefixItems": [{"type": "integer"}], "items": {"type": "string"}}, [[1], [1, "a"], []], [["a"], [1, 2]]),
+    ({"minItems": 1, "maxItems": 2}, [[1], [1, 2], "xyz"], [[], [1, 2, 3]]),
+    ({"minLength": 2, "maxLength": 3}, ["ab", "فصل", 5], ["a", "abcd"]),
+    ({"pattern": "^[0-9]+pt$"}, ["12pt", 12], ["12", "x12pt"]),
+    ({"minimum": 1, "maximum": 3}, [1, 3, 2.5, "9"], [0, 3.5]),
+    ({"exclusiveMinimum": 1, "exclusiveMaximum": 3}, [2, 1.5], [1, 3]),
+    ({"allOf": [{"type": "integer"}, {"minimum": 2}]}, [2], [1, 2.5]),
+    ({"anyOf": [{"type": "string"}, {"minimum": 2}]}, ["a", 3], [1]),
+    ({"oneOf": [{"type": "integer"}, {"minimum": 2}]}, [1, 2.5, "a"], [3, 1.5]),
+    ({"not": {"type": "string"}}, [1, None], ["a"]),
+    (True, [1, None], []),
+    (False, [], [1, None]),
+    ({"title": "annotations only", "description": "", "$comment": ""}, [1], []),
+]
+
+@pytest.mark.parametrize("schema, good, bad", KEYWORDS)
+def test_keywords(schema, good, bad):
+    check = compile_schema(schema)
+    for v in good:
+        assert check(v) == [], v
+    for v in bad:
+        assert check(v), v
+
+def test_refs_are_local_and_may_recurse():
+    tree = compile_schema({
+        "$defs": {"node": {"type": "object", "required": ["name"],
+                           "properties": {"name": {"type": "string"},
+                                          "children": {"type": "array", "items": {"$ref": "#/$defs/node"}}}}},
+        "$ref": "#/$defs/node",
+    })
+    assert tree({"name": "a", "children": [{"name": "b", "children": []}]}) == []
+    assert tree({"name": "a", "children": [{"children": [{"name": 1}]}]}) == [
+        "$.children[0]: missing required property 'name'",
+        "$.children[0].children[0].name: expected string, got int",
+    ]
+
+@pytest.mark.parametrize("schema", [
+    {"format": "email"}, {"type": "date"}, {"$ref": "other.json#/x"}, {"$ref": "#/$defs/missing"}, [],
+])
+def test_unsupported_schemas_fail_at_compile_time(schema):
+    with pytest.raises(SchemaError):
+        compile_schema(schema)
+
+def test_errors_name_the_path():
+    check = compile_schema({"properties": {"a": {"items": {"properties": {"b": {"type": "string"}}}}}})
+    assert check({"a": [{}, {"b": 2}]}) == ["$.a[1].b: expected string, got int"]
+
+def test_repo_content_is_valid():
+    with open(os.path.join(ROOT, "content", "01-chapter-01.json"), encoding="utf-8") as f:
+        assert content_spec.CHECK_CHAPTER(json.load(f)) == []
+    with open(os.path.join(ROOT, "content", "00-frontmatter.json"), encoding="utf-8") as f:
+        assert content_spec.CHECK_FRONT_MATTER(json.load(f)) == []
+    assert content_spec.doc_spec()({"no such option": 1}) == ["$: unexpected property 'no such option'"]
+
+def test_build_schema_accepts_what_write_section_reads():
+    from synth_thesis import Generator, SynthConfig
+    for chapter in Generator(SynthConfig(chapters=2)).chapters():
+        assert content_spec.CHECK_BUILD(chapter) == []
+    assert content_spec.CHECK_BUILD({"chapter": {"title": "C", "intro": ["a", {"text": "b"}], "sections": [
+        {"title": "S", "content": ["x", {"list": {"type": "ul", "items": ["u", {"text": "v"}]}}]}]}}) == []
+
+def test_build_schema_rejects_what_write_section_drops_or_fails_on():
+    assert content_spec.CHECK_BUILD({"chapter": {"intro": [{"style": "Normal"}], "sections": [
+        {"title": "S", "level": "2", "content": [{"image": "x.png"}], "sections": [{}]}]}}) == [
+        "$.chapter: missing required property 'title'",
+        "$.chapter.intro[0]: matches none of the anyOf alternatives (first: $.chapter.intro[0]: expected string, got dict)",
+        "$.chapter.sections[0].level: expected integer, got str",
+        "$.chapter.sections[0].content[0]: matches none of the anyOf alternatives "
+        "(first: $.chapter.sections[0].content[0]: expected string, got dict)",
+        "$.chapter.sections[0].sections[0]: missing required property 'title'",
+    ]
+
+@pytest.mark.parametrize("data", [
+    {"Normal": {"font": "B Nazanin", "size": 12}, "Heading 1": {"alignment": "CENTER (1)"}},   # styles.json
+    {"مقدمه": "متن تازه"},                                                                     # replacements
+    {"meta": {}, "sections": []},                                                               # no chapter
+])
+def test_build_schema_rejects_other_json(data):
+    assert content_spec.CHECK_BUILD(data)
+
+def test_check_styles_against_template():
+    styles = content_spec.template_styles(os.path.join(ROOT, "template", "blank-template.docx"))
+    content = {"meta": {"defaultParagraphStyle": "Normal", "listStyleMap": {"ul": "No Such List"}},
+               "chapter": {"intro": [{"style": "heading 1"}]}}
+    assert content_spec.check_styles(content, styles) == [
+        "$.meta.listStyleMap.ul: style 'No Such List' is not in the template"]
+
+def test_template_styles_follows_the_relationship(tmp_path):
+    renamed = tmp_path / "renamed.docx"
+    with zipfile.ZipFile(os.path.join(ROOT, "template", "blank-template.docx")) as zin, \
+            zipfile.ZipFile(renamed, "w") as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            if info.filename in ("word/_rels/document.xml.rels", "[Content_Types].xml"):
+                data = data.replace(b"styles.xml", b"styles-main.xml")
+            zout.writestr(info.filename.replace("word/styles.xml", "word/styles-main.xml"), data)
+    styles = content_spec.template_styles(str(renamed))
+    assert {"Normal", "heading 1", "Heading 1"} <= styles
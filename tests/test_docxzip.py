@@ -0,0 +1,78 @@
+import os
+import zipfile
+
+import pytest
+from docx import Document
+
+import docxzip
+from conftest import ROOT
+
+BLANK = os.path.join(ROOT, "template", "blank-template.docx")
+
+def test_zipwriter_members_read_back(tmp_path):
+    src = tmp_path / "src.zip"
+    with zipfile.ZipFile(src, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("a/deflated.xml", b"<x/>" * 1000)
+        z.writestr("stored.bin", os.urandom(5000), compress_type=zipfile.ZIP_STORED)
+    out = tmp_path / "out.zip"
+    with open(src, "rb") as raw, zipfile.ZipFile(src) as zin, docxzip.ZipWriter(str(out)) as zw:
+        for info in zin.infolist():
+            zw.copy_raw(raw, info)
+        zw.writestr("new.xml", b"<y>\xd9\x81</y>")
+        zw.writestr("media/image.png", b"\x89PNG" + os.urandom(100), zipfile.ZIP_STORED)
+        with zw.open("streamed.xml", zip64=True) as f:
+            for _ in range(100):
+                f.write(b"<p>chunk</p>")
+        zw.writestr("نام.txt", b"utf-8 name")
+    with zipfile.ZipFile(src) as a, zipfile.ZipFile(out) as b:
+        assert b.testzip() is None
+        for info in a.infolist():
+            assert b.read(info.filename) == a.read(info.filename)
+            assert b.getinfo(info.filename).compress_type == info.compress_type
+        assert b.read("new.xml") == b"<y>\xd9\x81</y>"
+        assert b.getinfo("media/image.png").compress_type == zipfile.ZIP_STORED
+        assert b.read("streamed.xml") == b"<p>chunk</p>" * 100
+        assert b.read("نام.txt") == b"utf-8 name"
+
+def test_zipwriter_zip64_end_records(tmp_path):
+    out = tmp_path / "many.zip"
+    with docxzip.ZipWriter(str(out), compresslevel=0) as zw:
+        for i in range(70000):
+            zw.writestr(f"{i}", b"", zipfile.ZIP_STORED)
+    with zipfile.ZipFile(out) as z:
+        assert len(z.infolist()) == 70000
+
+def test_zipwriter_rejects_duplicates(tmp_path):
+    with docxzip.ZipWriter(str(tmp_path / "d.zip")) as zw:
+        zw.writestr("a", b"1")
+        with pytest.raises(ValueError):
+            zw.writestr("a", b"2")
+
+def test_save_docx_copies_clean_parts(tmp_path):
+    doc = docxzip.open_docx(BLANK)
+    stats = docxzip.save_docx(doc, str(tmp_path / "same.docx"))
+    assert stats.written == 0 and stats.copied > 0
+    doc.add_paragraph("edited")
+    stats = docxzip.save_docx(doc, str(tmp_path / "edited.docx"))
+    assert stats.written == 1
+    assert Document(str(tmp_path / "edited.docx")).paragraphs[-1].text == "edited"
+    with zipfile.ZipFile(tmp_path / "edited.docx") as z:
+        assert z.testzip() is None
+
+def test_save_docx_in_place(tmp_path):
+    path = tmp_path / "doc.docx"
+    path.write_bytes(open(BLANK, "rb").read())
+    doc = docxzip.open_docx(str(path))
+    doc.add_paragraph("in place")
+    docxzip.save_docx(doc, str(path))
+    assert Document(str(path)).paragraphs[-1].text == "in place"
+    assert os.listdir(tmp_path) == ["doc.docx"]
+
+def test_failed_save_leaves_nothing(tmp_path, monkeypatch):
+    doc = docxzip.open_docx(BLANK)
+    def boom(part):
+        raise RuntimeError("serialize failed")
+    monkeypatch.setattr(docxzip, "_part_bytes", boom)
+    with pytest.raises(RuntimeError):
+        docxzip.save_docx(doc, str(tmp_path / "out.docx"))
+    assert os.listdir(tmp_path) == []
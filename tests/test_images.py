@@ -0,0 +1,79 @@
+from io import BytesIO
+
+import pytest
+from docx import Document
+from docx.shared import Inches
+
+import images
+
+PILImage = pytest.importorskip("PIL.Image")
+
+def png(px_width: int, px_height: int, dpi: int) -> bytes:
+    buf = BytesIO()
+    PILImage.new("RGB", (px_width, px_height), (200, 40, 40)).save(buf, "PNG", dpi=(dpi, dpi))
+    return buf.getvalue()
+
+def shown_dpi(shape, blob: bytes) -> float:
+    with PILImage.open(BytesIO(blob)) as im:
+        return im.size[0] / (shape.width / images.EMU_PER_INCH)
+
+def added(pipe, source, **size):
+    doc = Document()
+    shape = pipe.add_picture(doc.add_paragraph().add_run(), source, **size)
+    blob = doc.part.package.image_parts._image_parts[0].blob
+    return shape, blob
+
+def test_native_size_wider_than_column_keeps_target_dpi(tmp_path):
+    path = tmp_path / "wide.png"
+    path.write_bytes(png(3000, 300, 300))      # 10in at 300 dpi, wider than the text column
+    shape, blob = added(images.ImagePipeline(images.ImageSettings(target_dpi=220)), str(path))
+    assert shape.width == Inches(10)
+    assert shown_dpi(shape, blob) == pytest.approx(220, abs=1)
+
+@pytest.mark.parametrize("size", [{"width": Inches(4)}, {"height": Inches(0.5)}])
+def test_requested_size_sets_target(tmp_path, size):
+    path = tmp_path / "fig.png"
+    path.write_bytes(png(3000, 300, 300))
+    shape, blob = added(images.ImagePipeline(images.ImageSettings(target_dpi=220)), str(path), **size)
+    assert shown_dpi(shape, blob) == pytest.approx(220, abs=1)
+
+def test_prefetch_prepares_what_add_picture_uses(tmp_path):
+    path = tmp_path / "fig.png"
+    path.write_bytes(png(3000, 300, 300))
+    pipe = images.ImagePipeline(images.ImageSettings(target_dpi=220))
+    pipe.prefetch([str(path)])
+    shape, blob = added(pipe, str(path))
+    assert list(pipe._processed) == [(pipe.load(str(path))[0], 2200)]
+    assert shown_dpi(shape, blob) == pytest.approx(220, abs=1)
+
+def test_without_target_dpi_bytes_pass_through(tmp_path):
+    data = png(600, 60, 300)
+    shape, blob = added(images.ImagePipeline(), BytesIO(data))
+    assert blob == data and shape.width == Inches(2)
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_downscaled_native_size_matches_python_docx(tmp_path, cached):
+    path = tmp_path / "wide.png"
+    path.write_bytes(png(3000, 200, 96))       # 31.25in; at 42 dpi the copy's own DPI rounds off
+    settings = images.ImageSettings(target_dpi=42, cache_dir=str(tmp_path / "cache") if cached else None)
+    if cached:
+        added(images.ImagePipeline(settings), str(path))
+    shape, blob = added(images.ImagePipeline(settings), str(path))
+    plain = Document().add_picture(str(path))
+    assert (shape.width, shape.height) == (plain.width, plain.height)
+    assert shown_dpi(shape, blob) == pytest.approx(42, abs=1)
+
+def test_prefetch_shares_one_pool_until_closed(tmp_path):
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"fig{i}.png")
+        paths[-1].write_bytes(png(3000, 300 + i, 300))
+    with images.ImagePipeline(images.ImageSettings(target_dpi=220)) as pipe:
+        pools = set()
+        for p in paths:
+            pipe.prefetch([str(p)])        # one call per figure, as ir.prefetch_ahead makes them
+            pools.add(pipe._executor)
+        pool, = pools
+        for p in paths:
+            added(pipe, str(p))
+    assert pipe._executor is None and pool._shutdown
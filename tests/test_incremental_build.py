@@ -0,0 +1,128 @@
+import json
+import os
+
+import pytest
+
+import incremental_build
+from conftest import ROOT
+from incremental_build import IncrementalBuilder
+
+BLANK = os.path.join(ROOT, "template", "blank-template.docx")
+
+def chapter(i: int, words: int = 20) -> dict:
+    return {"meta": {"defaultParagraphStyle": "Normal"}, "section": {"break": "nextPage"},
+            "header": {"enabled": True, "runs": [{"text": f"فصل {i}"}]},
+            "chapter": {"title": f"فصل {i}", "intro": [{"text": "متن " * words}],
+                        "sections": [{"title": f"بخش {i}.1", "level": 2, "content": ["پاراگراف"]}]}}
+
+@pytest.fixture
+def project(tmp_path):
+    styles = tmp_path / "styles.json"
+    styles.write_text(json.dumps({"Normal": {"alignment": "justify"}}), encoding="utf-8")
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"ch{i}.json"
+        p.write_text(json.dumps(chapter(i), ensure_ascii=False), encoding="utf-8")
+        paths.append(str(p))
+    return tmp_path, str(styles), paths
+
+def test_rebuild_renders_only_edited_chapters(project):
+    tmp, styles, paths = project
+    builder = IncrementalBuilder(styles, BLANK, str(tmp / "cache"))
+    r = builder.build(paths, str(tmp / "out.docx"))
+    assert r.rendered == paths and r.reused == []
+    with open(paths[1], "w", encoding="utf-8") as f:
+        json.dump(chapter(9), f, ensure_ascii=False)
+    r = builder.build(paths, str(tmp / "out.docx"))
+    assert r.rendered == [paths[1]] and r.reused == [paths[0], paths[2]]
+    # a fresh builder finds every fragment on disk
+    r = IncrementalBuilder(styles, BLANK, str(tmp / "cache")).build(paths, str(tmp / "out2.docx"))
+    assert r.rendered == []
+
+def test_edit_with_same_stat_renders_the_bytes_it_hashes(project):
+    tmp, styles, paths = project
+    builder = IncrementalBuilder(styles, BLANK, None)
+    builder.build(paths, str(tmp / "out.docx"))
+    st = os.stat(paths[0])
+    edited = json.dumps(chapter(0), ensure_ascii=False).replace("فصل 0", "فصل X")
+    with open(paths[0], "w", encoding="utf-8") as f:
+        f.write(edited)
+    os.utime(paths[0], ns=(st.st_atime_ns, st.st_mtime_ns))      # same mtime and size
+    r = builder.build(paths, str(tmp / "out.docx"), force=True)
+    frag = builder.cache.mem[incremental_build.fragment_key(
+        incremental_build.hashlib.sha256(edited.encode()).hexdigest(), builder.session_key, False)]
+    assert "فصل X".encode() in frag.xml
+    assert r.rendered == paths
+
+def cache_size(directory) -> int:
+    return sum(p.stat().st_size for p in directory.rglob("*") if p.is_file())
+
+def test_disk_cache_is_trimmed_least_recently_used_first(project):
+    tmp, styles, paths = project
+    cache = tmp / "cache"
+    builder = IncrementalBuilder(styles, BLANK, str(cache))
+    builder.build(paths, str(tmp / "out.docx"))
+    one_build = cache_size(cache)
+    builder.cache.max_bytes = int(one_build * 1.5)
+    for n in range(1, 6):       # each edit leaves a superseded fragment behind
+        with open(paths[n % 3], "w", encoding="utf-8") as f:
+            json.dump(chapter(10 + n, words=20 + n), f, ensure_ascii=False)
+        builder.build(paths, str(tmp / "out.docx"))
+        assert cache_size(cache) <= builder.cache.max_bytes
+    # the current build's fragments survive, and every manifest still has its blobs
+    r = IncrementalBuilder(styles, BLANK, str(cache)).build(paths, str(tmp / "out2.docx"))
+    assert r.rendered == []
+    manifests = list(cache.glob("*.json"))
+    assert 3 <= len(manifests) < 6
+    for m in manifests:
+        for sha in incremental_build.FragmentCache._manifest_blobs(json.loads(m.read_text(encoding="utf-8"))):
+            assert (cache / "blobs" / sha[:2] / sha).exists()
+
+def test_pool_is_replaced_after_a_worker_dies(project, monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+    tmp, styles, paths = project
+    builder = IncrementalBuilder(styles, BLANK, None, workers=2)
+    render = incremental_build.render_fragment
+    def crash(session, data, key, fast=False):
+        if data["chapter"]["title"] == "فصل 1":
+            os._exit(1)
+        return render(session, data, key, fast)
+    try:
+        monkeypatch.setattr(incremental_build, "render_fragment", crash)     # forked workers inherit it
+        with pytest.raises(BrokenProcessPool):
+            builder.build(paths, str(tmp / "out.docx"))
+        monkeypatch.undo()
+        r = builder.build(paths, str(tmp / "out.docx"))
+        assert len(r.rendered) >= 1 and len(r.rendered) + len(r.reused) == 3
+    finally:
+        builder.close()
+
+def test_negative_workers_are_rejected(project):
+    _, styles, _ = project
+    with pytest.raises(ValueError):
+        IncrementalBuilder(styles, BLANK, None, workers=-1)
+
+class _Watcher:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_watch_survives_a_failing_first_build(project, monkeypatch, capsys):
+    tmp, styles, paths = project
+    good = open(paths[0], encoding="utf-8").read()
+    with open(paths[0], "w", encoding="utf-8") as f:
+        f.write(good[:-5])                                  # truncated JSON
+    watcher = _Watcher()
+    def debounced(w, quiet):
+        with open(paths[0], "w", encoding="utf-8") as f:
+            f.write(good)
+        yield {os.path.abspath(paths[0])}, incremental_build.time.perf_counter()
+    monkeypatch.setattr(incremental_build.watch, "make_watcher", lambda paths, **kw: watcher)
+    monkeypatch.setattr(incremental_build.watch, "debounced", debounced)
+    builder = IncrementalBuilder(styles, BLANK, None)
+    incremental_build.watch_and_rebuild(builder, paths, str(tmp / "out.docx"), force=True)
+    out = capsys.readouterr().out.splitlines()
+    assert "build failed: JSONDecodeError" in out[0]
+    assert "3 rendered, 0 cached" in out[1]
+    assert (tmp / "out.docx").exists() and watcher.closed
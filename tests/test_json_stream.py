@@ -0,0 +1,157 @@
+import base64
+import io
+import json
+import math
+import random
+
+import pytest
+
+import ir
+import json_stream
+
+CHUNKS = [1, 2, 3, 7, 64, 1 << 16]
+
+def parse(text: str, chunk: int):
+    evs = json_stream.events(io.StringIO(text), chunk)
+    value = json_stream.Reader(evs).value()
+    assert list(evs) == []      # and nothing but whitespace after it
+    return value
+
+def same(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a):
+        return math.isnan(b)
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return list(a) == list(b) and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(9 if depth < 4 else 6)
+    if kind == 0:
+        return rng.choice([True, False, None])
+    if kind == 1:
+        return rng.randint(-10**12, 10**12)
+    if kind == 2:
+        return rng.choice([0.0, -0.5, 1e-7, 3.25e21, rng.uniform(-1e6, 1e6), float("nan"), float("inf")])
+    if kind in (3, 4, 5):
+        alphabet = 'ab "\\/\n\té‌ف\U0001f600\x01'
+        return "".join(rng.choice(alphabet) for _ in range(rng.randrange(12)))
+    if kind in (6, 7):
+        return {random_value(rng, 9): random_value(rng, depth + 1) for _ in range(rng.randrange(5))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randrange(5))]
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_documents_match_json_loads(seed):
+    rng = random.Random(seed)
+    value = random_value(rng)
+    text = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 0, 2]))
+    for chunk in CHUNKS:
+        assert same(parse(text, chunk), json.loads(text)), chunk
+
+@pytest.mark.parametrize("text", [
+    '0', '-0', '1.5e-3', '1E+2', '"\\ud83d\\ude00"', '"a\\u200cb"', ' [ ] ', '{}',
+    '[1, -2.5, true, false, null, "x"]', '{"a": {"b": [{}]}}', '[NaN, Infinity, -Infinity]',
+])
+def test_scalars_and_nesting(text):
+    for chunk in CHUNKS:
+        assert same(parse(text, chunk), json.loads(text))
+
+@pytest.mark.parametrize("text", [
+    '', '[', '[1,]', '{"a" 1}', '{"a":}', '{1: 2}', '[1 2]', '"abc', '"a\\x"', '"a\x01"',
+    'tru', '[1]]', '{} {}', '01', '-', '1.', '1e', '[,1]', '{"a":1,}', '"\\u12"',
+])
+def test_invalid_documents_raise(text):
+    with pytest.raises(ValueError):
+        json.loads(text)
+    for chunk in CHUNKS:
+        with pytest.raises(ValueError):
+            parse(text, chunk)
+
+def test_error_reports_the_position():
+    with pytest.raises(ValueError, match=r"character 9\)"):
+        parse('{"a": [1 2]}', 3)
+
+# ----------------- embedded figures -----------------
+
+def binary_value(text: str, chunk: int):
+    r = json_stream.Reader(json_stream.events(io.StringIO(text), chunk, binary_keys={"image"}))
+    return r.value()
+
+@pytest.mark.parametrize("escape", [False, True])
+def test_data_uri_is_decoded_while_read(escape):
+    blob = bytes(random.Random(1).randrange(256) for _ in range(3000))
+    uri = "data:image/png;base64," + base64.encodebytes(blob).decode()     # with line breaks
+    text = json.dumps({"upload": [{"image": uri, "text": uri}]})
+    if escape:
+        text = text.replace("/", "\\/").replace("A", "\\u0041")
+    for chunk in CHUNKS:
+        item = binary_value(text, chunk)["upload"][0]
+        assert item["image"] == blob == ir.image_source(json.loads(text)["upload"][0]["image"])
+        assert item["text"] == uri
+
+@pytest.mark.parametrize("value", ["plain/path.png", "data:text/plain,hello", "data:image/png;base64,"])
+def test_other_strings_stay_strings(value):
+    text = json.dumps({"image": value})
+    for chunk in CHUNKS:
+        got = binary_value(text, chunk)["image"]
+        assert got == ir.image_source(value)
+
+@pytest.mark.parametrize("text", [
+    '{"image": "data:image/png;base64,QUJD',
+    '{"image": "data:image/png;base64,QUJDRA"}',
+    '{"image": "data:image/png;base64,QU\x01JD"}',
+])
+def test_bad_data_uri_raises(text):
+    for chunk in CHUNKS:
+        with pytest.raises(ValueError):
+            binary_value(text, chunk)
+
+# ----------------- streamed lowering -----------------
+
+def kinds(blocks):
+    return [(type(b).__name__, tuple(getattr(b, s) for s in type(b).__slots__)) for b in blocks]
+
+def test_stream_add_docx_matches_lower_add_docx():
+    uri = "data:image/png;base64," + base64.b64encode(b"\x89PNG fake").decode()
+    data = {"header": {"style": "H"}, "chapter": {"title": "T", "style": "Heading 1",
+            "intro": [{"text": "i", "style": "Normal"}],
+            "sections": [{"title": "S", "style": "Heading 2",
+                          "content": [{"text": "p", "style": "Normal"},
+                                      {"list": [{"text": "l", "style": "List"}]},
+                                      {"upload": [{"image": uri, "text": "cap", "style": "Caption"},
+                                                  {"image": "content/banzen.png"}]}],
+                          "sub_sections": [{"title": "U", "content": [{"text": "q", "style": "Normal"}]}]}]}}
+    text = json.dumps(data)
+    for chunk in CHUNKS:
+        head, blocks = json_stream.stream_add_docx(io.StringIO(text), chunk)
+        assert head == {"header": {"style": "H"}}
+        assert kinds(blocks) == kinds(ir.lower_add_docx(data))
+
+def test_stream_section_matches_lower_section():
+    data = {"meta": {"defaultParagraphStyle": "Body", "listStyleMap": {"ul": "Bullets"}},
+            "section": {"break": "nextPage"}, "header": {"text": "h"},
+            "chapter": {"title": "C", "intro": ["a", {"text": "b"}],
+                        "sections": [{"title": "S", "level": 2,
+                                      "content": ["x", {"text": "y"}, {"list": {"type": "ul", "items": ["u", {"text": "v"}]}}],
+                                      "sections": [{"title": "SS", "level": 3, "content": ["z"]}]}]}}
+    text = json.dumps(data)
+    for chunk in CHUNKS:
+        blocks = list(json_stream.stream_section(io.StringIO(text), chunk))
+        assert kinds(blocks) == kinds(ir.lower_section(data, data["meta"]))
+
+def test_stream_section_rejects_late_meta():
+    text = json.dumps({"chapter": {"title": "C"}, "meta": {}})
+    with pytest.raises(ValueError, match="'meta' comes after 'chapter'"):
+        list(json_stream.stream_section(io.StringIO(text)))
+
+def test_prefetch_ahead_keeps_order_and_starts_early():
+    blocks = [ir.Para(str(i)) for i in range(5)] + [ir.Image("a.png"), ir.Image(b"x"), ir.Image("b.png")]
+    started = []
+    it = ir.prefetch_ahead(iter(blocks), started.extend, window=5)
+    assert next(it) is blocks[0]
+    assert started == ["a.png"]
+    assert [blocks[0]] + list(it) == blocks
+    assert started == ["a.png", "b.png"]
@@ -0,0 +1,44 @@
+import json
+import os
+import zipfile
+
+import pytest
+from docx import Document
+from lxml import etree
+
+from apply_replacements import apply_replacements
+from conftest import ROOT
+from outline import build_outline, iter_nodes
+from stream_replace import stream_apply_replacements
+
+THESIS = os.path.join(ROOT, "template", "persian-thesis.docx")
+
+def c14n(path: str, part: str = "word/document.xml") -> bytes:
+    with zipfile.ZipFile(path) as z:
+        return etree.tostring(etree.fromstring(z.read(part)), method="c14n")
+
+@pytest.fixture(scope="module")
+def spec():
+    nodes = list(iter_nodes(build_outline(Document(THESIS)).roots))
+    picked = [n for n in nodes if n.level == 1][:3] + [n for n in nodes if n.level == 2][2:6] + \
+             [n for n in nodes if n.level > 2][:2]
+    spec = {n.title: f"متن تازه برای {n.title}\n\nپاراگراف دوم" for n in picked}
+    spec["no such heading"] = "ignored"
+    return spec
+
+def test_stream_matches_in_memory(tmp_path, spec):
+    spec_path = tmp_path / "spec.json"
+    spec_path.write_text(json.dumps(spec, ensure_ascii=False), encoding="utf-8")
+    a, b = str(tmp_path / "a.docx"), str(tmp_path / "b.docx")
+    apply_replacements(THESIS, str(spec_path), a)
+    stream_apply_replacements(THESIS, str(spec_path), b)
+    assert c14n(a) == c14n(b)
+    assert c14n(b) != c14n(THESIS)
+    with zipfile.ZipFile(THESIS) as src, zipfile.ZipFile(b) as out:
+        assert out.testzip() is None
+        assert out.namelist() == src.namelist()
+        for name in src.namelist():
+            if name != "word/document.xml":
+                assert out.read(name) == src.read(name), name
+    texts = [p.text for p in Document(b).paragraphs]
+    assert "پاراگراف دوم" in texts
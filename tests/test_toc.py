@@ -0,0 +1,44 @@
+import os
+import re
+
+from docx import Document
+from docx.oxml.ns import qn
+
+import toc
+from conftest import ROOT
+from outline import build_outline
+from pagination import _roman
+
+THESIS = os.path.join(ROOT, "template", "persian-thesis.docx")
+
+# Headings of the thesis that Word's stored TOC result leaves out although they carry
+# Heading1/Heading2 and their own _Toc bookmarks: the result is stale, and an update
+# in Word lists them too.
+STALE_IN_WORD = {"_Toc28770797", "_Toc28770849"}
+
+def word_anchors(doc, span):
+    """_Toc targets of the entries in a TOC field's stored result, in order."""
+    body = list(doc.element.body.iterchildren(qn("w:p")))
+    anchors = []
+    for p in body[body.index(span.begin_p):body.index(span.end_p) + 1]:
+        for h in p.iter(qn("w:hyperlink")):
+            anchors.append(h.get(qn("w:anchor")))
+        for t in p.iter(qn("w:instrText")):
+            m = re.search(r'HYPERLINK \\l "(_Toc\d+)"', t.text or "")
+            if m: anchors.append(m.group(1))
+    return [a for a in dict.fromkeys(anchors) if a]
+
+def test_entries_match_word_result():
+    doc = Document(THESIS)
+    span, = toc.find_toc_fields(doc)
+    lo, hi = toc.levels_from_instr(span.instr)
+    entries = toc.collect_entries(doc, build_outline(doc), max_level=hi, min_level=lo)
+    marks = {b.get(qn("w:name")): b.getparent() for b in doc.element.body.iter(qn("w:bookmarkStart"))}
+    stale = {marks[name] for name in STALE_IN_WORD}
+    native = [e.node.elm for e in entries]
+    assert [p for p in native if p not in stale] == [marks[a] for a in word_anchors(doc, span)]
+    assert stale <= set(native)
+
+def test_roman_shared_with_pagination():
+    assert toc._roman is _roman
+    assert [_roman(n) for n in (1, 4, 9, 14, 40, 1994)] == ["i", "iv", "ix", "xiv", "xl", "mcmxciv"]
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+import watch
+
+KINDS = ["poll"] + (["inotify"] if sys.platform.startswith("linux") else [])
+
+def make(kind, paths, patterns):
+    if kind == "poll":
+        return watch.PollWatcher(paths, interval=0.01, patterns=patterns)
+    return watch.InotifyWatcher(paths, patterns)
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_directory_reports_matching_files_only(tmp_path, kind):
+    content, template = tmp_path / "content", tmp_path / "template.docx"
+    content.mkdir()
+    template.write_bytes(b"x")
+    w = make(kind, [str(content), str(template)], ("*.json",))
+    try:
+        for name in (".ch01.json.swp", "ch01.json~", ".#ch01.json", "#ch01.json#", "notes.txt", "out.docx.tmp"):
+            (content / name).write_text("x")
+        assert w.wait(0.2) == set()
+        (content / "ch01.json").write_text("{}")
+        template.write_bytes(b"y")                      # a watched file counts whatever its name
+        changed = w.wait(0.5)
+        changed |= w.wait(0.2)
+        assert changed == {str(content / "ch01.json"), str(template)}
+    finally:
+        w.close()
+
+def test_without_patterns_any_file_but_temporaries_counts(tmp_path):
+    d = str(tmp_path)
+    assert watch._relevant(os.path.join(d, "fig.png"), {d})
+    assert not watch._relevant(os.path.join(d, "fig.png~"), {d})
+    assert not watch._relevant(os.path.join(d, ".hidden"), {d})
+    assert not watch._relevant(os.path.join(d, "sub", "a.json"), {d})
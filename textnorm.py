@@ -0,0 +1,32 @@
+# textnorm.py
+# Persian/Arabic text normalizer shared by the CLIs for title and key matching.
+#
+#   normalize_text("فصل  اول: مقدمه‌ي كار")  -> "فصل اول: مقدمهی کار"
+#
+# Steps: literal "\n" -> space, NFKC, Arabic letter variants -> Persian (ي ك ۀ أ إ ٱ),
+# drop ZWNJ / RLM / LRM, fold whitespace runs to one space, strip, casefold.
+# The translation table is built once at import; NFKC is skipped for text that is
+# already in NFKC form, and ASCII text skips the Unicode steps entirely.
+
+import functools
+import unicodedata
+
+LETTER_MAP = {"ي": "ی", "ك": "ک", "ۀ": "ه", "أ": "ا", "إ": "ا", "ٱ": "ا"}
+DROP_CHARS = "\u200c\u200f\u200e"   # ZWNJ, RLM, LRM
+
+_TABLE = str.maketrans({**LETTER_MAP, **{c: None for c in DROP_CHARS}})
+
+def normalize_text(s: str) -> str:
+    if s is None: return ""
+    if "\\n" in s:
+        s = s.replace("\\n", " ")
+    if s.isascii():
+        return " ".join(s.split()).casefold()
+    if not unicodedata.is_normalized("NFKC", s):
+        s = unicodedata.normalize("NFKC", s)
+    return " ".join(s.translate(_TABLE).split()).casefold()
+
+@functools.lru_cache(maxsize=8192)
+def normalize_cached(s: str) -> str:
+    """normalize_text memoized; for strings seen repeatedly (heading titles, JSON keys)."""
+    return normalize_text(s)
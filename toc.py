@@ -0,0 +1,402 @@
+# toc.py
+# pip install python-docx
+#
+# Native table-of-contents builder. Produces what Word's "Update table" writes for
+# a heading TOC field (TOC \o "1-N" \h ...): one `toc N` paragraph per heading, each
+# a hyperlink to a _Toc bookmark on the heading with a PAGEREF field for the page.
+# The field result is pre-rendered, so the document needs no Word round-trip.
+
+from dataclasses import dataclass
+from typing import List, Optional, Dict, Any, Callable
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from outline import Node, Outline, build_outline, iter_nodes
+from textnorm import normalize_text
+from pagination import _roman
+import re
+
+TOC_TITLE = "فهرست مطالب"
+DEFAULT_LEVELS = 3
+
+_NUM_FIX_RE = re.compile(r"(\d+(?:-\d+)+)(\s+)")
+_LEVELS_RE = re.compile(r'\\o\s+"(\d+)-(\d+)"')
+
+_W_P = qn("w:p")
+_W_PPR = qn("w:pPr")
+_W_FLDCHAR = qn("w:fldChar")
+_W_FLDCHARTYPE = qn("w:fldCharType")
+_W_INSTRTEXT = qn("w:instrText")
+_W_FLDSIMPLE = qn("w:fldSimple")
+_W_INSTR = qn("w:instr")
+_W_SECTPR = qn("w:sectPr")
+_W_BOOKMARKSTART = qn("w:bookmarkStart")
+_W_NAME = qn("w:name")
+_W_ID = qn("w:id")
+
+def fix_toc_numbering(text: str) -> str:
+    """'1-2 title' -> '1-2- title' (the fix update_toc applies after Word's update)."""
+    return _NUM_FIX_RE.sub(r"\1-\2", text)
+
+@dataclass
+class TocEntry:
+    node: Node
+    level: int
+    label: str               # heading number, e.g. "2-3-"; "" for unnumbered headings
+    text: str
+    bookmark: str = ""
+    page: Optional[str] = None     # rendered page label for the PAGEREF result
+
+@dataclass
+class FieldSpan:
+    instr: str
+    begin_p: Any
+    end_p: Any
+
+# ----------------- list numbering -----------------
+
+def _letter(n: int) -> str:
+    return chr(ord("a") + (n - 1) % 26) * ((n - 1) // 26 + 1) if n > 0 else ""
+
+_NUM_FORMATS = {
+    "decimal": str,
+    "decimalZero": lambda n: f"{n:02d}",
+    "lowerRoman": _roman,
+    "upperRoman": lambda n: _roman(n).upper(),
+    "lowerLetter": _letter,
+    "upperLetter": lambda n: _letter(n).upper(),
+}
+
+class ListNumbering:
+    """
+    Evaluates list labels (lvlText with %1..%9) the way Word renders them, so TOC
+    entries carry the same numbers as the headings. Counters are kept per
+    abstractNum; a w:num's startOverride restarts its level the first time it is used.
+    """
+    def __init__(self, doc: Document):
+        self.abstract: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.nums: Dict[str, str] = {}
+        self.overrides: Dict[str, Dict[int, int]] = {}
+        self.counters: Dict[str, Dict[int, int]] = {}
+        self._started: set = set()
+        try:
+            numbering = doc.part.numbering_part.element
+        except (KeyError, NotImplementedError):
+            return
+        for an in numbering.iterchildren(qn("w:abstractNum")):
+            levels = {}
+            for lvl in an.iterchildren(qn("w:lvl")):
+                levels[int(lvl.get(qn("w:ilvl"), "0"))] = {
+                    "start": int(self._val(lvl, "w:start") or 1),
+                    "fmt": self._val(lvl, "w:numFmt") or "decimal",
+                    "text": self._val(lvl, "w:lvlText") or "",
+                }
+            self.abstract[an.get(qn("w:abstractNumId"))] = levels
+        for num in numbering.iterchildren(qn("w:num")):
+            nid = num.get(qn("w:numId"))
+            self.nums[nid] = self._val(num, "w:abstractNumId")
+            ov = {}
+            for o in num.iterchildren(qn("w:lvlOverride")):
+                start = self._val(o, "w:startOverride")
+                if start is not None:
+                    ov[int(o.get(qn("w:ilvl"), "0"))] = int(start)
+            self.overrides[nid] = ov
+
+    @staticmethod
+    def _val(parent, tag: str) -> Optional[str]:
+        el = parent.find(qn(tag))
+        return el.get(qn("w:val")) if el is not None else None
+
+    def advance(self, num_id: str, ilvl: int) -> str:
+        """Count one paragraph of list (num_id, ilvl) and return its rendered label."""
+        aid = self.nums.get(num_id)
+        levels = self.abstract.get(aid)
+        if not levels or ilvl not in levels:
+            return ""
+        counters = self.counters.setdefault(aid, {})
+        if num_id not in self._started:
+            self._started.add(num_id)
+            for lv, start in self.overrides.get(num_id, {}).items():
+                counters[lv] = start - 1
+        lvl = levels[ilvl]
+        counters[ilvl] = counters.get(ilvl, lvl["start"] - 1) + 1
+        for k in range(ilvl):   # an unused parent level shows (and keeps) its start value
+            if k not in counters:
+                counters[k] = levels.get(k, {"start": 1})["start"]
+        for deeper in [k for k in counters if k > ilvl]:
+            del counters[deeper]
+        if lvl["fmt"] in ("bullet", "none"):
+            return ""
+
+        def sub(m):
+            k = int(m.group(1)) - 1
+            fmt = levels.get(k, {}).get("fmt", "decimal")
+            return _NUM_FORMATS.get(fmt, str)(counters.get(k, 1))
+        return re.sub(r"%([1-9])", sub, lvl["text"])
+
+# ----------------- entries -----------------
+
+_W_T = qn("w:t")
+_W_TAB = qn("w:tab")
+_W_BR = qn("w:br")
+_W_CR = qn("w:cr")
+_W_TYPE = qn("w:type")
+
+def heading_text(p_elm) -> str:
+    """Heading text as Word puts it in a TOC: line breaks become spaces, a page break ends it."""
+    parts: List[str] = []
+    for el in p_elm.iter(_W_T, _W_TAB, _W_BR, _W_CR):
+        if el.tag == _W_T:
+            parts.append(el.text or "")
+        elif el.tag == _W_BR and el.get(_W_TYPE) == "page":
+            if "".join(parts).strip():
+                break
+        else:
+            parts.append(" ")
+    return "".join(parts).strip()
+
+def collect_entries(doc: Document, outline: Outline, max_level: int = DEFAULT_LEVELS,
+                    min_level: int = 1) -> List[TocEntry]:
+    """
+    Headings in document order with their list labels. Every body paragraph is run
+    through the numbering evaluator so list counters match what Word shows.
+    """
+    styles = outline.styles
+    headings = {n.elm: n for n in iter_nodes(outline.roots) if not n.front_matter}
+    numbering = ListNumbering(doc)
+    entries: List[TocEntry] = []
+    for elm in outline.paragraphs:
+        num = styles.numbering(elm)
+        label = numbering.advance(*num) if num else ""
+        n = headings.get(elm)
+        if n is None or not (min_level <= n.level <= max_level):
+            continue
+        text = heading_text(elm)
+        if not text:
+            continue
+        if label:
+            label = fix_toc_numbering(label + "\t")[:-1]
+        entries.append(TocEntry(node=n, level=n.level, label=label, text=fix_toc_numbering(text)))
+    return entries
+
+def ensure_bookmarks(doc: Document, entries: List[TocEntry]):
+    """Give every entry's heading a _Toc bookmark, reusing one that is already there."""
+    body = doc.element.body
+    ids = [int(b.get(_W_ID)) for b in body.iter(_W_BOOKMARKSTART) if (b.get(_W_ID) or "").isdigit()]
+    names = [b.get(_W_NAME) or "" for b in body.iter(_W_BOOKMARKSTART)]
+    toc_nums = [int(n[4:]) for n in names if n.startswith("_Toc") and n[4:].isdigit()]
+    next_id = max(ids, default=0) + 1
+    next_num = max(toc_nums, default=100000000) + 1
+
+    for e in entries:
+        p = e.node.elm
+        existing = next((b.get(_W_NAME) for b in p.iterchildren(_W_BOOKMARKSTART)
+                         if (b.get(_W_NAME) or "").startswith("_Toc")), None)
+        if existing:
+            e.bookmark = existing
+            continue
+        e.bookmark = f"_Toc{next_num}"
+        start = OxmlElement("w:bookmarkStart")
+        start.set(_W_ID, str(next_id)); start.set(_W_NAME, e.bookmark)
+        end = OxmlElement("w:bookmarkEnd")
+        end.set(_W_ID, str(next_id))
+        pPr = p.find(_W_PPR)
+        if pPr is not None: pPr.addnext(start)
+        else: p.insert(0, start)
+        p.append(end)
+        next_id += 1
+        next_num += 1
+
+# ----------------- field discovery -----------------
+
+def is_heading_toc(instr: str) -> bool:
+    parts = instr.split()
+    return bool(parts) and parts[0] == "TOC" and "\\c" not in parts and "\\a" not in parts
+
+def find_toc_fields(doc: Document) -> List[FieldSpan]:
+    """Heading TOC fields in the body (complex or simple), as paragraph spans."""
+    spans: List[FieldSpan] = []
+    stack: List[Dict[str, Any]] = []
+    for p in doc.element.body.iterchildren(_W_P):
+        for el in p.iter(_W_FLDCHAR, _W_INSTRTEXT, _W_FLDSIMPLE):
+            if el.tag == _W_FLDSIMPLE:
+                instr = (el.get(_W_INSTR) or "").strip()
+                if is_heading_toc(instr):
+                    spans.append(FieldSpan(instr, p, p))
+            elif el.tag == _W_INSTRTEXT:
+                if stack and not stack[-1]["sep"]:
+                    stack[-1]["instr"].append(el.text or "")
+            else:
+                kind = el.get(_W_FLDCHARTYPE)
+                if kind == "begin":
+                    stack.append({"instr": [], "begin_p": p, "sep": False})
+                elif kind == "separate" and stack:
+                    stack[-1]["sep"] = True
+                elif kind == "end" and stack:
+                    f = stack.pop()
+                    instr = "".join(f["instr"]).strip()
+                    if is_heading_toc(instr):
+                        spans.append(FieldSpan(instr, f["begin_p"], p))
+    return spans
+
+def levels_from_instr(instr: str, default: int = DEFAULT_LEVELS):
+    m = _LEVELS_RE.search(instr)
+    return (int(m.group(1)), int(m.group(2))) if m else (1, default)
+
+# ----------------- XML builders -----------------
+
+def _run(*children, text: Optional[str] = None):
+    r = OxmlElement("w:r")
+    for c in children:
+        r.append(c)
+    if text is not None:
+        t = OxmlElement("w:t")
+        t.text = text
+        if text != text.strip():
+            t.set(qn("xml:space"), "preserve")
+        r.append(t)
+    return r
+
+def _fld_char(kind: str):
+    fc = OxmlElement("w:fldChar")
+    fc.set(_W_FLDCHARTYPE, kind)
+    return fc
+
+def _instr(text: str):
+    it = OxmlElement("w:instrText")
+    it.set(qn("xml:space"), "preserve")
+    it.text = text
+    return it
+
+def _web_hidden_rpr():
+    rPr = OxmlElement("w:rPr")
+    rPr.append(OxmlElement("w:webHidden"))
+    return rPr
+
+def field_begin_runs(instr: str) -> list:
+    return [_run(_fld_char("begin")), _run(_instr(f" {instr} ")), _run(_fld_char("separate"))]
+
+def entry_paragraph(entry: TocEntry, style_id: Optional[str], hyperlink: bool = True):
+    p = OxmlElement("w:p")
+    pPr = OxmlElement("w:pPr")
+    if style_id:
+        ps = OxmlElement("w:pStyle"); ps.set(qn("w:val"), style_id)
+        pPr.append(ps)
+    bidi = OxmlElement("w:bidi"); bidi.set(qn("w:val"), "1")
+    pPr.append(bidi)
+    p.append(pPr)
+
+    container = p
+    if hyperlink:
+        container = OxmlElement("w:hyperlink")
+        container.set(qn("w:anchor"), entry.bookmark)
+        container.set(qn("w:history"), "1")
+        p.append(container)
+    if entry.label:
+        container.append(_run(text=entry.label))
+        container.append(_run(OxmlElement("w:tab")))
+    container.append(_run(text=entry.text))
+    container.append(_run(_web_hidden_rpr(), OxmlElement("w:tab")))
+    container.append(_run(_web_hidden_rpr(), _fld_char("begin")))
+    container.append(_run(_web_hidden_rpr(), _instr(f" PAGEREF {entry.bookmark} \\h ")))
+    container.append(_run(_web_hidden_rpr(), _fld_char("separate")))
+    container.append(_run(_web_hidden_rpr(), text=entry.page or ""))
+    container.append(_run(_web_hidden_rpr(), _fld_char("end")))
+    return p
+
+# ----------------- driver -----------------
+
+def set_update_fields_on_open(doc: Document, on: bool = True):
+    """Ask Word to refresh fields (e.g. page numbers) when the file is next opened."""
+    settings = doc.settings.element
+    el = settings.find(qn("w:updateFields"))
+    if el is None:
+        el = OxmlElement("w:updateFields")
+        settings.append(el)
+    el.set(qn("w:val"), "true" if on else "false")
+
+def find_toc_title(outline: Outline):
+    want = normalize_text(TOC_TITLE)
+    for n in outline.roots:
+        if n.front_matter and normalize_text(n.title) == want:
+            return n.elm
+    return None
+
+def write_toc(doc: Document, levels: Optional[int] = None,
+              page_of: Optional[Callable[[TocEntry], Optional[str]]] = None,
+              outline: Optional[Outline] = None) -> List[TocEntry]:
+    """
+    Rebuild the first heading TOC field (or create one after the "فهرست مطالب" title)
+    from the document's headings. `levels` overrides the field's \\o range; `page_of`
+    supplies page labels for the PAGEREF results (left blank otherwise; see
+    pagination.fill_pagerefs for filling them once the TOC itself is in place).
+    """
+    outline = outline or build_outline(doc)
+    spans = find_toc_fields(doc)
+    if spans:
+        span = spans[0]
+        instr = span.instr
+    else:
+        title = find_toc_title(outline)
+        if title is None:
+            raise ValueError(f"No TOC field and no '{TOC_TITLE}' title paragraph found")
+        span = None
+        instr = f'TOC \\o "1-{levels or DEFAULT_LEVELS}" \\h \\z \\u'
+
+    lo, hi = levels_from_instr(instr)
+    if levels:
+        hi = levels
+    entries = collect_entries(doc, outline, max_level=hi, min_level=lo)
+    ensure_bookmarks(doc, entries)
+    if page_of is not None:
+        for e in entries:
+            e.page = page_of(e)
+
+    styles = outline.styles
+    style_ids = {lvl: styles.id_for_name(f"toc {lvl}") for lvl in range(1, 10)}
+    hyperlink = "\\h" in instr.split()
+    new_ps = [entry_paragraph(e, style_ids.get(e.level), hyperlink=hyperlink) for e in entries]
+    if not new_ps:
+        new_ps = [entry_paragraph(TocEntry(node=None, level=1, label="", text=""), style_ids.get(1), hyperlink=False)]
+        for r in list(new_ps[0])[1:]:
+            new_ps[0].remove(r)
+
+    first, last = new_ps[0], new_ps[-1]
+    pPr = first.find(_W_PPR)
+    for r in reversed(field_begin_runs(instr)):
+        pPr.addnext(r)
+    last.append(_run(_fld_char("end")))
+
+    if span is None:
+        anchor = find_toc_title(outline)
+        for p in new_ps:
+            anchor.addnext(p)
+            anchor = p
+        return entries
+
+    # replace the old field result paragraphs; a section break on the last one is kept
+    old = [span.begin_p]
+    cur = span.begin_p
+    while cur is not span.end_p:
+        cur = cur.getnext()
+        if cur is None:
+            break
+        old.append(cur)
+    anchor = span.begin_p.getprevious()
+    parent = span.begin_p.getparent()
+    keep_tail = None
+    end_pPr = span.end_p.find(_W_PPR)
+    if end_pPr is not None and end_pPr.find(_W_SECTPR) is not None:
+        keep_tail = span.end_p
+        for child in [c for c in keep_tail if c.tag != _W_PPR]:
+            keep_tail.remove(child)
+    for p in old:
+        if p is not keep_tail:
+            parent.remove(p)
+    for p in new_ps:
+        if anchor is None:
+            parent.insert(0, p)
+        else:
+            anchor.addnext(p)
+        anchor = p
+    return entries
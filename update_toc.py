@@ -1,9 +1,11 @@
 # update_toc_and_fields.py
 # Forces Persian digits in footer PAGE fields and updates TOC/fields.
 # Sets Word numeral shaping to Hindi (Eastern) and shapes footers to Persian/RTL.
+#
+# Default engine is native (toc.py, pure python-docx, any OS); --engine word drives
+# Microsoft Word over COM and needs Windows + pywin32.
 
 import sys, os, argparse
-import win32com.client as win32
 import re
 
 def fix_toc_numbering(doc):
@@ -20,6 +22,7 @@ def fix_toc_numbering(doc):
 
 
 def update_fields(in_path, out_path=None, levels=3, remove_numbering_in="none"):
+    import win32com.client as win32
     word = win32.DispatchEx("Word.Application")
     word.Visible = False
     try:
@@ -58,9 +61,46 @@ def update_fields(in_path, out_path=None, levels=3, remove_numbering_in="none"):
             pass
         word.Quit()
 
+def update_fields_native(in_path, out_path=None, levels=None, update_on_open=False, pages=True, compresslevel=None):
+    """
+    Rebuild the TOC from the heading outline without Word (see toc.write_toc), then
+    fill every PAGEREF (TOC, LOF, LOT) from estimated pagination. Pages are estimated
+    after the TOC is written, so its own length is accounted for.
+    """
+    import toc, pagination
+    from docxzip import open_docx, save_docx
+    doc = open_docx(in_path)
+    entries = toc.write_toc(doc, levels=levels)
+    filled = 0
+    if pages:
+        filled = pagination.fill_pagerefs(doc, pagination.estimate_pages(doc))
+    if update_on_open:
+        toc.set_update_fields_on_open(doc)
+    out = os.path.abspath(out_path or in_path)
+    save_docx(doc, out, compresslevel=compresslevel)
+    print(f"Rebuilt TOC ({len(entries)} entries, {filled} page numbers estimated) → {out}")
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Refresh TOC/fields; force Persian digits/RTL in footers; optional numbering removal.")
     ap.add_argument("input_docx")
     ap.add_argument("output_docx", nargs="?", default=None)
+    ap.add_argument("--engine", choices=("native", "word"), default="native",
+                    help="native: pure-Python TOC rebuild; word: refresh everything through Word (Windows)")
+    ap.add_argument("--levels", type=int, default=None,
+                    help="Lowest heading level in the TOC (default: the field's \\o range, else 3)")
+    ap.add_argument("--no-pages", action="store_true",
+                    help="native: leave page numbers blank instead of estimating them")
+    ap.add_argument("--update-on-open", action="store_true",
+                    help="native: also ask Word to refresh fields (page numbers) when the file is opened")
+    ap.add_argument("--compress-level", type=int, default=None, choices=range(10), metavar="0-9",
+                    help="native: zlib level for rewritten parts (unchanged parts are copied as-is)")
     args = ap.parse_args()
-    update_fields(args.input_docx, args.output_docx)
+    if args.engine == "word":
+        update_fields(args.input_docx, args.output_docx, levels=args.levels or 3)
+    else:
+        try:
+            update_fields_native(args.input_docx, args.output_docx, levels=args.levels,
+                                 update_on_open=args.update_on_open, pages=not args.no_pages,
+                                 compresslevel=args.compress_level)
+        except ValueError as e:
+            raise SystemExit(f"update_toc: {e}")
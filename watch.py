@@ -0,0 +1,189 @@
+# watch.py
+# File watching for the long-running build modes.
+#
+#   w = make_watcher(["content/", "template/blank-template.docx"], patterns=["*.json"])
+#   for changed, t_first in debounced(w, quiet=0.2):   # blocks; one set per burst of changes
+#       ...
+#
+# Linux: inotify through ctypes (no extra dependency) on the parent directories of the
+# watched paths, so editors that save by writing a temp file and renaming it over
+# the original are seen too. Elsewhere, or if inotify is unavailable: stat polling.
+
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+import ctypes, ctypes.util, fnmatch, logging, os, select, struct, sys, time
+
+log = logging.getLogger("watch")
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_ATTRIB | IN_MODIFY
+
+_EVENT = struct.Struct("iIII")   # wd, mask, cookie, len (struct inotify_event)
+
+def _watch_roots(paths: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """(directories to watch, watched paths): a file is watched through its directory."""
+    dirs, watched = set(), set()
+    for p in paths:
+        p = os.path.abspath(p)
+        watched.add(p)
+        dirs.add(p if os.path.isdir(p) else os.path.dirname(p))
+    return dirs, watched
+
+# editor swap/backup/lock files and hidden files: never a source, whatever the pattern
+_TEMP_SUFFIXES = ("~", ".swp", ".swo", ".swx", ".tmp", ".bak")
+
+def ignored(name: str) -> bool:
+    return name.startswith((".", "#")) or name.endswith(_TEMP_SUFFIXES)
+
+def _relevant(path: str, watched: Set[str], patterns: Optional[Tuple[str, ...]] = None) -> bool:
+    """
+    A watched file itself, or a file in a watched directory that is not ignored() and
+    matches one of `patterns` (None: any name).
+    """
+    if path in watched:
+        return True
+    if os.path.dirname(path) not in watched:
+        return False
+    name = os.path.basename(path)
+    return not ignored(name) and (patterns is None or any(fnmatch.fnmatch(name, pat) for pat in patterns))
+
+class PollWatcher:
+    """Compares (mtime, size) of the watched files every `interval` seconds."""
+
+    def __init__(self, paths: Iterable[str], interval: float = 0.25, patterns: Optional[Tuple[str, ...]] = None):
+        self.dirs, self.watched = _watch_roots(paths)
+        self.patterns = patterns
+        self.interval = interval
+        self.state = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        out = {}
+        for d in self.dirs:
+            try:
+                names = os.listdir(d)
+            except OSError:
+                continue
+            for name in names:
+                p = os.path.join(d, name)
+                if p in self.dirs: continue      # a watched directory changes through its files
+                if not _relevant(p, self.watched, self.patterns): continue
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out[p] = (st.st_mtime_ns, st.st_size)
+        return out
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Changed paths, or an empty set once `timeout` seconds pass without changes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = self._snapshot()
+            changed = {p for p in now.keys() | self.state.keys() if now.get(p) != self.state.get(p)}
+            self.state = now
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else min(self.interval, max(deadline - time.monotonic(), 0)))
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    def __init__(self, paths: Iterable[str], patterns: Optional[Tuple[str, ...]] = None):
+        self.dirs, self.watched = _watch_roots(paths)
+        self.patterns = patterns
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wds: Dict[int, str] = {}
+        for d in self.dirs:
+            wd = self._add_watch(self.fd, os.fsencode(d), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(err, f"inotify_add_watch failed for {d}: {os.strerror(err)}")
+            self.wds[wd] = d
+
+    def _read(self) -> Set[str]:
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            i = 0
+            while i + _EVENT.size <= len(buf):
+                wd, mask, _, n = _EVENT.unpack_from(buf, i)
+                name = buf[i + _EVENT.size:i + _EVENT.size + n].rstrip(b"\0")
+                i += _EVENT.size + n
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.watched)      # events were lost: treat everything as changed
+                    continue
+                d = self.wds.get(wd)
+                if d is None: continue
+                p = os.path.join(d, os.fsdecode(name)) if name else d
+                if _relevant(p, self.watched, self.patterns):
+                    changed.add(p)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                ready, _, _ = select.select([self.fd], [], [], left)
+            except InterruptedError:
+                continue
+            if not ready:
+                return set()
+            changed = self._read()
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def make_watcher(paths: Iterable[str], poll: bool = False, interval: float = 0.25,
+                 patterns: Optional[Iterable[str]] = None):
+    """
+    Watcher for `paths`. A watched file is reported on any change; in a watched
+    directory only files matching `patterns` (glob, e.g. "*.json") count, and
+    hidden, editor swap and backup files never do.
+    """
+    paths = list(paths)
+    patterns = tuple(patterns) if patterns is not None else None
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths, patterns)
+        except (OSError, AttributeError) as e:
+            log.warning("inotify unavailable (%s); polling every %.2fs", e, interval)
+    return PollWatcher(paths, interval, patterns)
+
+def debounced(watcher, quiet: float = 0.2) -> Iterator[Tuple[Set[str], float]]:
+    """
+    (changed paths, time.perf_counter() of the first change) per burst of changes: a
+    burst ends once `quiet` seconds pass without another event, so an editor's
+    save-rename-chmod sequence or several quick saves give one rebuild.
+    """
+    while True:
+        changed = watcher.wait()
+        first = time.perf_counter()
+        while True:
+            more = watcher.wait(quiet)
+            if not more: break
+            changed |= more
+        yield changed, first